@@ -1,17 +1,37 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import delete, exists, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError, OperationalError
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from datetime import datetime, timedelta
+from functools import wraps
 from dotenv import load_dotenv
 import os
-import uuid
-from PIL import Image
 import base64
-import io
 import tempfile
+import time
+from image_store import content_key, create_image_store
+from image_processing import (
+    DEFAULT_PROFILE_PICTURE_SIZE, IMAGE_FORMATS, PROFILE_PICTURE_SIZES,
+    ImageRejected, content_type_for, generate_variants, generate_variants_from_bytes,
+    inspect_image, pick_size, variant_key
+)
+from image_jobs import create_image_job_queue
+from like_buffer import create_like_buffer
+from password_hashing import PasswordHasherBusy, create_password_hasher
+from migrations import create_tables
+from shared_store import create_shared_store
+from identity_cache import IdentityCache
+from feed_cache import FeedCache
+from json_provider import create_json_provider
+from compression import create_response_compressor
+from identifiers import GUID, IdConverter, new_id, normalize_id
+from db_pool import pool_stats
+from replicas import RoutingSession, create_replica_router
+from instrumentation import create_instrumentation
+from metrics import create_metrics
 
 # Load environment variables
 load_dotenv()
@@ -20,16 +40,16 @@ app = Flask(__name__)
 
 # Configuration
 config_name = os.environ.get('FLASK_ENV', 'development')
-if config_name == 'production':
-    from config import ProductionConfig
-    app.config.from_object(ProductionConfig)
-else:
-    from config import DevelopmentConfig
-    app.config.from_object(DevelopmentConfig)
+from config import config
+app.config.from_object(config.get(config_name, config['default']))
+app.json = create_json_provider(app)
+app.url_map.converters['id'] = IdConverter
 
 # File upload configuration (for validation only)
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
+PROFILE_PICTURE_VERSION_LENGTH = 16  # Hex digits of the content hash used in picture URLs
+COMPACT_FEED_MIMETYPE = 'application/vnd.nonsocial.compact+json'
 
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 
@@ -37,35 +57,20 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def resize_image_to_base64(file, max_size=(300, 300)):
-    """Process uploaded image and convert to base64"""
+def encode_feed_cursor(created_at, post_id):
+    """Encode a feed position as an opaque cursor string"""
+    raw = f"{created_at.isoformat()}|{post_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_feed_cursor(cursor):
+    """Decode a cursor produced by encode_feed_cursor into (created_at, post_id)"""
     try:
-        # Open the image
-        img = Image.open(file)
-        
-        # Convert RGBA to RGB if necessary
-        if img.mode == 'RGBA':
-            background = Image.new('RGB', img.size, (255, 255, 255))
-            background.paste(img, mask=img.split()[-1])  # Use alpha channel as mask
-            img = background
-        elif img.mode != 'RGB':
-            img = img.convert('RGB')
-        
-        # Resize maintaining aspect ratio
-        img.thumbnail(max_size, Image.Resampling.LANCZOS)
-        
-        # Save to bytes buffer
-        buffer = io.BytesIO()
-        img.save(buffer, format='JPEG', quality=85, optimize=True)
-        
-        # Encode to base64
-        img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-        
-        return f"data:image/jpeg;base64,{img_base64}"
-        
-    except Exception as e:
-        print(f"Error processing image: {e}")
-        return None
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+        created_at, post_id = raw.split('|', 1)
+        return datetime.fromisoformat(created_at), normalize_id(post_id)
+    except (ValueError, UnicodeError):
+        raise ValueError('Invalid cursor')
 
 def get_base_url():
     """Get the base URL for the application"""
@@ -96,32 +101,52 @@ def ensure_upload_directory():
                 return False
         return False
 
+def hasher_busy_response():
+    """503 answer when every password hashing slot is taken"""
+    response = jsonify({'error': 'Server is busy, please retry shortly'})
+    response.headers['Retry-After'] = str(app.config['PASSWORD_HASH_RETRY_AFTER'])
+    return response, 503
+
 # Initialize extensions
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
 jwt = JWTManager(app)
 CORS(app, origins=app.config.get('CORS_ORIGINS', ['*']), supports_credentials=True)
+password_hasher = create_password_hasher(app.config)
+response_compressor = create_response_compressor(app.config)
+instrumentation = create_instrumentation(app.config)
+app.json.response = instrumentation.timed('serialize', app.json.response)
+metrics = create_metrics(app.config)
+
+@app.after_request
+def compress_response(response):
+    """gzip/brotli for JSON bodies; images and streamed feeds pass through"""
+    if not app.config['COMPRESSION_ENABLED']:
+        return response
+    return response_compressor.process(request, response)
 
 # Database Models
 class User(db.Model):
     __tablename__ = 'users'
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(GUID, primary_key=True, default=new_id)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(120), nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)
     display_name = db.Column(db.String(100), nullable=False)
     bio = db.Column(db.Text, default='Hello! I just joined this amazing social platform.')
     profile_picture = db.Column(db.Text, default='https://images.unsplash.com/photo-1535268647677-300dbf3d78d1?w=150&h=150&fit=crop&crop=face')
-    profile_picture_data = db.Column(db.Text, nullable=True)  # Base64 encoded image data
+    profile_picture_hash = db.Column(db.String(64), nullable=True, index=True)  # Key of the uploaded image in image_blobs
     followers_count = db.Column(db.Integer, default=0)
     following_count = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        with instrumentation.phase('auth'):
+            self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        with instrumentation.phase('auth'):
+            return password_hasher.verify(self.password_hash, password)
     
     def to_dict(self):
         return {
@@ -137,8 +162,8 @@ class User(db.Model):
 class Post(db.Model):
     __tablename__ = 'posts'
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+    id = db.Column(GUID, primary_key=True, default=new_id)
+    user_id = db.Column(GUID, db.ForeignKey('users.id'), nullable=False)
     content = db.Column(db.Text, nullable=False)
     likes = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -146,41 +171,421 @@ class Post(db.Model):
     # Relationship
     user = db.relationship('User', backref='posts')
     
-    def to_dict(self):
+    # Kept in step with the index migrations in migrations.py
+    __table_args__ = (
+        # Matches the feed ordering so each keyset page is a short index range scan
+        db.Index('ix_posts_created_at_id', 'created_at', 'id'),
+        db.Index('ix_posts_user_id', 'user_id'),
+    )
+    
+    def to_dict(self, is_liked=False, author=None):
+        # author is the User.to_dict() projection when the caller already has it
+        if author is None:
+            author = self.user.to_dict()
         return {
             'id': self.id,
             'author': {
-                'username': self.user.username,
-                'displayName': self.user.display_name,
-                'profilePicture': self.user.profile_picture
+                'username': author['username'],
+                'displayName': author['displayName'],
+                'profilePicture': author['profilePicture']
             },
             'content': self.content,
             'timestamp': self.created_at.isoformat() + 'Z',  # Add Z to indicate UTC
             'likes': self.likes,
-            'isLiked': False,  # This should be determined based on current user
+            'isLiked': is_liked,
             'comments': []  # Comments implementation can be added later
         }
+    
+    def to_compact_dict(self):
+        """Feed entry for the compact format; the author is sent once in a sidecar"""
+        return {
+            'id': self.id,
+            'authorId': self.user_id,
+            'content': self.content,
+            'timestamp': self.created_at.isoformat() + 'Z',
+            'likes': self.likes
+        }
 
 class PostLike(db.Model):
     __tablename__ = 'post_likes'
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
-    post_id = db.Column(db.String(36), db.ForeignKey('posts.id'), nullable=False)
+    id = db.Column(GUID, primary_key=True, default=new_id)
+    user_id = db.Column(GUID, db.ForeignKey('users.id'), nullable=False)
+    post_id = db.Column(GUID, db.ForeignKey('posts.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Ensure a user can only like a post once
-    __table_args__ = (db.UniqueConstraint('user_id', 'post_id'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'post_id'),
+        db.Index('ix_post_likes_post_id', 'post_id'),
+    )
+
+class ArchivedPost(db.Model):
+    """A post moved out of posts by archive_posts.py; its likes are kept only as a count"""
+    __tablename__ = 'archived_posts'
+    
+    id = db.Column(GUID, primary_key=True)
+    user_id = db.Column(GUID, db.ForeignKey('users.id'), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    likes = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    user = db.relationship('User')
+    
+    def to_dict(self, author=None):
+        # Same shape as Post.to_dict; who liked it isn't kept, so isLiked is always False
+        if author is None:
+            author = self.user.to_dict()
+        return {
+            'id': self.id,
+            'author': {
+                'username': author['username'],
+                'displayName': author['displayName'],
+                'profilePicture': author['profilePicture']
+            },
+            'content': self.content,
+            'timestamp': self.created_at.isoformat() + 'Z',
+            'likes': self.likes,
+            'isLiked': False,
+            'comments': [],
+            'archived': True
+        }
+
+def on_primary():
+    """bind_arguments that keep a statement off the read replicas"""
+    return {'bind': db.engine}
+
+def load_user_projections(user_ids):
+    """Identity cache loader: {user_id: User.to_dict()} in one query, from the primary"""
+    users = db.session.scalars(select(User).where(User.id.in_(user_ids)), bind_arguments=on_primary())
+    return {user.id: user.to_dict() for user in users}
+
+def toggle_post_like(user_id, post_id):
+    """
+    Flip user_id's like on post_id and return (is_liked, likes), or None when
+    the post doesn't exist. The counter moves with a single UPDATE in the same
+    transaction as the post_likes insert/delete, so concurrent toggles never
+    lose an update. Commits on success, rolls back otherwise.
+    """
+    for _ in range(3):
+        try:
+            deleted = db.session.execute(
+                delete(PostLike).where(PostLike.user_id == user_id, PostLike.post_id == post_id)
+            ).rowcount
+            if not deleted:
+                db.session.execute(insert(PostLike).values(
+                    id=new_id(), user_id=user_id, post_id=post_id, created_at=datetime.utcnow()
+                ))
+            
+            delta = -1 if deleted else 1
+            likes = db.session.execute(
+                update(Post)
+                .where(Post.id == post_id)
+                .values(likes=Post.likes + delta)
+                .returning(Post.likes)
+            ).scalar()
+            if likes is None:
+                db.session.rollback()
+                return None
+            
+            db.session.commit()
+            feed_cache.invalidate()
+            return not deleted, likes
+        except IntegrityError:
+            # A concurrent request by the same user inserted the like first;
+            # retry so this toggle removes it instead
+            db.session.rollback()
+            # PostgreSQL also gets here through the foreign key when the post is gone (archived)
+            if db.session.get(Post, post_id) is None:
+                return None
+    raise RuntimeError('Like toggle kept conflicting')
+
+def insert_ignoring_conflicts(model):
+    """INSERT that skips rows violating a unique constraint (SQLite and PostgreSQL)"""
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(model).on_conflict_do_nothing()
+
+def load_like_state(user_id, post_id):
+    """(liked, likes) for a post as stored in the database, or None if it doesn't exist"""
+    row = db.session.query(
+        Post.likes,
+        exists().where(PostLike.user_id == user_id, PostLike.post_id == Post.id)
+    ).filter(Post.id == post_id).first()
+    return (bool(row[1]), row[0]) if row else None
+
+def persist_like_states(states):
+    """
+    Write-behind flush: bring post_likes to the desired {(user_id, post_id): liked}
+    states in one transaction and move each counter by the rows actually changed,
+    so counters stay exact even if another worker wrote the same like. Likes of
+    posts deleted or archived since the toggle are dropped.
+    """
+    with app.app_context():
+        try:
+            deltas = {}
+            for (user_id, post_id), liked in sorted(states.items()):
+                if liked:
+                    # INSERT ... SELECT only while the post exists; a foreign key
+                    # error would fail the whole batch on PostgreSQL
+                    changed = db.session.execute(insert_ignoring_conflicts(PostLike).from_select(
+                        ['id', 'user_id', 'post_id', 'created_at'],
+                        select(
+                            literal(new_id(), GUID), literal(user_id, GUID),
+                            literal(post_id, GUID), literal(datetime.utcnow(), db.DateTime)
+                        ).where(exists().where(Post.id == post_id))
+                    )).rowcount
+                else:
+                    changed = -db.session.execute(
+                        delete(PostLike).where(PostLike.user_id == user_id, PostLike.post_id == post_id)
+                    ).rowcount
+                deltas[post_id] = deltas.get(post_id, 0) + changed
+            
+            # Sorted so concurrent flushes from several workers lock rows in the same order
+            for post_id, delta in sorted(deltas.items()):
+                if delta:
+                    db.session.execute(
+                        update(Post).where(Post.id == post_id).values(likes=Post.likes + delta)
+                    )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        if any(deltas.values()):
+            feed_cache.invalidate()
+        if replica_router is not None:
+            for user_id in {user_id for user_id, _ in states}:
+                replica_router.note_write(user_id)
+
+class ImageBlob(db.Model):
+    __tablename__ = 'image_blobs'
+    
+    # Content-addressed: the SHA-256 of the canonical picture, plus a size/format
+    # suffix for its other variants, so identical uploads are stored once
+    key = db.Column(db.String(80), primary_key=True)
+    content_type = db.Column(db.String(50), nullable=False, default='image/jpeg')
+    data = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+def store_profile_picture(variants):
+    """Put every variant of a picture in the image store and return the picture key"""
+    key = content_key(variants[(DEFAULT_PROFILE_PICTURE_SIZE, 'jpeg')])
+    for (size, fmt), data in variants.items():
+        image_store.put(variant_key(key, size, fmt), data, content_type_for(fmt))
+    return key
+
+def apply_profile_picture(user, variants):
+    """
+    Store processed variants and point the user at them (caller commits).
+    Returns the replaced picture key, for release_profile_picture once committed
+    """
+    old_key = user.profile_picture_hash
+    user.profile_picture_hash = store_profile_picture(variants)
+    user.profile_picture = profile_picture_url(user.id, user.profile_picture_hash)
+    return old_key if old_key != user.profile_picture_hash else None
+
+def profile_picture_url(user_id, key):
+    """Versioned URL for a user's picture; it changes whenever the image content does"""
+    return f"/api/auth/profile-picture/{user_id}?v={key[:PROFILE_PICTURE_VERSION_LENGTH]}"
+
+def release_profile_picture(key):
+    """
+    Delete a replaced picture's variants once no user references it.
+    Only called after the replacing commit: until then the row still points at
+    the old files, and the references are checked again against committed data
+    """
+    if not key:
+        return
+    try:
+        if db.session.query(User.id).filter(User.profile_picture_hash == key).first():
+            return
+        variants = {}
+        for size in PROFILE_PICTURE_SIZES:
+            for fmt in IMAGE_FORMATS:
+                store_key = variant_key(key, size, fmt)
+                data = image_store.read(store_key, content_type_for(fmt))
+                if data is not None:
+                    variants[store_key] = (data, content_type_for(fmt))
+                image_store.delete(store_key)
+        # Database-backed stores delete rows in the session
+        db.session.commit()
+        
+        # An upload of the same picture may have committed since the check; its
+        # put() found these variants and skipped them, so they go back
+        if db.session.query(User.id).filter(User.profile_picture_hash == key).first():
+            for store_key, (data, content_type) in variants.items():
+                image_store.put(store_key, data, content_type)
+            db.session.commit()
+    except Exception:
+        # The new picture is already saved; a leftover file only wastes space
+        db.session.rollback()
+        app.logger.exception(f"Error releasing profile picture {key}")
+
+def settle_profile_picture(variants, replaced_key):
+    """
+    After the commit that points a user at variants: put them again, since a
+    concurrent release of the same picture may have deleted what put() found
+    and skipped, then release the picture they replaced
+    """
+    try:
+        store_profile_picture(variants)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        app.logger.exception('Error storing profile picture')
+    release_profile_picture(replaced_key)
+
+class ImageJob(db.Model):
+    __tablename__ = 'image_jobs'
+    
+    id = db.Column(GUID, primary_key=True, default=new_id)
+    user_id = db.Column(GUID, db.ForeignKey('users.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, done, failed
+    error = db.Column(db.String(200), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (db.Index('ix_image_jobs_user_id_created_at', 'user_id', 'created_at'),)
+
+    def expire(self, timeout):
+        """Fail a job left pending past timeout seconds; True when it changed"""
+        if self.status != 'pending' or self.created_at > datetime.utcnow() - timedelta(seconds=timeout):
+            return False
+        self.status = 'failed'
+        self.error = 'Image processing timed out'
+        self.finished_at = datetime.utcnow()
+        return True
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'error': self.error,
+            'createdAt': self.created_at.isoformat() + 'Z',
+            'finishedAt': self.finished_at.isoformat() + 'Z' if self.finished_at else None
+        }
+
+def finish_image_job(job_id, future):
+    """Pool callback: store the processed picture and record the job outcome"""
+    with app.app_context():
+        try:
+            job = db.session.get(ImageJob, job_id)
+            # Already reported failed after a timeout: the client has moved on
+            if not job or job.status != 'pending':
+                return
+            applied_variants = replaced_key = None
+            try:
+                variants = future.result()
+            except Exception:
+                app.logger.exception(f"Error processing image for job {job_id}")
+                job.status = 'failed'
+                job.error = 'Failed to process image'
+            else:
+                # An older job finishing late must not overwrite a newer picture
+                newer_done = ImageJob.query.filter(
+                    ImageJob.user_id == job.user_id,
+                    ImageJob.created_at > job.created_at,
+                    ImageJob.status == 'done'
+                ).first()
+                if not newer_done:
+                    replaced_key = apply_profile_picture(db.session.get(User, job.user_id), variants)
+                    applied_variants = variants
+                job.status = 'done'
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            if applied_variants is not None:
+                settle_profile_picture(applied_variants, replaced_key)
+            if job.status == 'done':
+                identity_cache.invalidate(job.user_id)
+                feed_cache.invalidate()
+                if replica_router is not None:
+                    replica_router.note_write(job.user_id)
+        except Exception:
+            db.session.rollback()
+            app.logger.exception(f"Error finishing image job {job_id}")
 
 # Create tables and setup database
 with app.app_context():
-    db.create_all()
+    pending_migrations = create_tables(db.metadata, db.engine)
+    if pending_migrations:
+        app.logger.warning(
+            f"{len(pending_migrations)} database migration(s) pending; run migrate_database.py"
+        )
+    
+    if app.config['IMAGE_STORAGE'] == 'filesystem':
+        ensure_upload_directory()
+    image_store = create_image_store(app.config, db, ImageBlob)
+    image_job_queue = create_image_job_queue(app.config)
+    shared_store = create_shared_store(app.config)
+    identity_cache = IdentityCache(
+        shared_store,
+        max_size=app.config['IDENTITY_CACHE_SIZE'],
+        ttl=app.config['IDENTITY_CACHE_TTL']
+    )
+    feed_cache = FeedCache(shared_store, ttl=app.config['FEED_CACHE_TTL'])
+    replica_router = create_replica_router(app.config, shared_store)
+    replica_engines = replica_router.engines if replica_router is not None else []
+    instrumentation.init_app(app, [db.engine] + replica_engines)
+    metrics.init_app(app, {
+        'primary': db.engine,
+        **{f'replica-{index}': engine for index, engine in enumerate(replica_engines)}
+    })
+    like_buffer = None
+    if app.config['LIKE_WRITE_BEHIND']:
+        like_buffer = create_like_buffer(
+            app.config, load_like_state, persist_like_states,
+            # Lost connections and lock timeouts; constraint and data errors fail for good
+            transient_errors=(OperationalError,), logger=app.logger
+        )
     
     # Print configuration info for debugging
     if app.config.get('DEBUG'):
         print(f"Base URL: {get_base_url()}")
         print(f"Environment: {app.config.get('FLASK_ENV', 'unknown')}")
-        print("Using database storage for profile pictures")
+        print(f"Using {image_store.name} storage for profile pictures")
+
+def current_identity():
+    """JWT identity of the request, or None when the route didn't verify a token"""
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        return None
+
+def replica_reads(view):
+    """
+    Mark a read-only route: its queries may go to a read replica, unless the
+    caller (or the user in the URL) wrote within REPLICA_STICKY_SECONDS.
+    Goes below @jwt_required so the identity is known.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if replica_router is None:
+            return view(*args, **kwargs)
+        if not replica_router.is_sticky([current_identity(), kwargs.get('user_id')]):
+            replica = replica_router.choose()
+            if replica is not None:
+                db.session.info['replica'] = replica
+        replica_router.begin_request()
+        response = view(*args, **kwargs)
+        if replica_router.request_failed():
+            # The replica failed mid-request; read-only views are safe to run again
+            db.session.rollback()
+            db.session.info.pop('replica', None)
+            response = view(*args, **kwargs)
+        return response
+    return wrapper
+
+@app.after_request
+def note_replica_writes(response):
+    """Send a user who just wrote to the primary for their next reads"""
+    if replica_router is not None and db.session.info.get('wrote'):
+        user_id = current_identity()
+        if user_id:
+            replica_router.note_write(user_id)
+    return response
 
 # Authentication Routes
 @app.route('/api/auth/register', methods=['POST'])
@@ -228,8 +633,12 @@ def register():
             'access_token': access_token
         }), 201
         
-    except Exception as e:
+    except PasswordHasherBusy:
+        db.session.rollback()
+        return hasher_busy_response()
+    except Exception:
         db.session.rollback()
+        app.logger.exception('Error registering user')
         return jsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/auth/login', methods=['POST'])
@@ -252,6 +661,11 @@ def login():
         if not user or not user.check_password(password):
             return jsonify({'error': 'Invalid credentials'}), 401
         
+        # Upgrade hashes made with older parameters while we have the password
+        if password_hasher.needs_rehash(user.password_hash):
+            user.set_password(password)
+            db.session.commit()
+        
         # Create access token
         access_token = create_access_token(identity=user.id)
         
@@ -261,22 +675,28 @@ def login():
             'access_token': access_token
         }), 200
         
-    except Exception as e:
+    except PasswordHasherBusy:
+        db.session.rollback()
+        return hasher_busy_response()
+    except Exception:
+        app.logger.exception('Error logging in')
         return jsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/auth/profile', methods=['GET'])
 @jwt_required()
+@replica_reads
 def get_profile():
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = identity_cache.get(current_user_id, load_user_projections)
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        return jsonify({'user': user.to_dict()}), 200
+        return jsonify({'user': user}), 200
         
-    except Exception as e:
+    except Exception:
+        app.logger.exception('Error loading profile')
         return jsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/auth/profile', methods=['PUT'])
@@ -300,35 +720,246 @@ def update_profile():
             user.profile_picture = data['profilePicture']
         
         db.session.commit()
+        identity_cache.invalidate(current_user_id)
+        feed_cache.invalidate()
         
         return jsonify({
             'message': 'Profile updated successfully',
             'user': user.to_dict()
         }), 200
         
-    except Exception as e:
+    except Exception:
         db.session.rollback()
+        app.logger.exception('Error updating profile')
         return jsonify({'error': 'Internal server error'}), 500
 
 # Post Routes
+def feed_statement(cursor_position):
+    """Posts newest first, starting after cursor_position when one is given"""
+    statement = select(Post)
+    if cursor_position:
+        cursor_created_at, cursor_id = cursor_position
+        # Keyset condition: strictly after the last post of the previous page
+        statement = statement.where(
+            (Post.created_at < cursor_created_at) |
+            ((Post.created_at == cursor_created_at) & (Post.id < cursor_id))
+        )
+    return statement.order_by(Post.created_at.desc(), Post.id.desc())
+
+def feed_author(projection):
+    """The part of a user projection shown next to their posts"""
+    return {
+        'username': projection['username'],
+        'displayName': projection['displayName'],
+        'profilePicture': projection['profilePicture']
+    }
+
+def expand_feed_post(post_dict, author, is_liked):
+    """Default feed format of a compact post: author and isLiked inlined"""
+    return {
+        'id': post_dict['id'],
+        'author': author,
+        'content': post_dict['content'],
+        'timestamp': post_dict['timestamp'],
+        'likes': post_dict['likes'],
+        'isLiked': is_liked,
+        'comments': []
+    }
+
+def load_liked_post_ids(user_id, post_ids):
+    """Which of post_ids the user has liked, in one query"""
+    if not post_ids:
+        return set()
+    return {
+        post_id for (post_id,) in db.session.query(PostLike.post_id).filter(
+            PostLike.user_id == user_id,
+            PostLike.post_id.in_(post_ids)
+        )
+    }
+
+def build_feed_page(cursor_position, limit, bind_arguments=None):
+    """
+    One feed page without per-user fields, in the compact shape:
+    {'posts': [...], 'authors': {user_id: {...}}, 'next_cursor': ...}
+    """
+    # Fetch one extra row to know whether another page exists
+    posts = db.session.scalars(
+        feed_statement(cursor_position).limit(limit + 1), bind_arguments=bind_arguments
+    ).all()
+    has_more = len(posts) > limit
+    posts = posts[:limit]
+    
+    # Authors come from the identity cache; misses are loaded in one query
+    authors = identity_cache.get_many([post.user_id for post in posts], load_user_projections)
+    
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_feed_cursor(posts[-1].created_at, posts[-1].id)
+    
+    return {
+        'posts': [post.to_compact_dict() for post in posts],
+        'authors': {user_id: feed_author(author) for user_id, author in authors.items()},
+        'next_cursor': next_cursor
+    }
+
+def stream_feed(current_user_id, cursor_position, limit, compact):
+    """
+    Feed response written incrementally from a server-side cursor.
+    
+    Rows arrive FEED_STREAM_CHUNK_SIZE at a time and authors and likes are
+    resolved per chunk, so memory per request stays flat however many posts
+    are sent. limit None streams to the end of the feed.
+    """
+    statement = feed_statement(cursor_position)
+    if limit is not None:
+        statement = statement.limit(limit + 1)
+    statement = statement.execution_options(yield_per=app.config['FEED_STREAM_CHUNK_SIZE'])
+    encode = app.json.dumps_bytes
+    
+    def generate():
+        yield b'{"posts":['
+        # Compact format only: sent after the posts
+        authors = {}
+        liked_post_ids = []
+        written = 0
+        last_post = None
+        has_more = False
+        try:
+            for chunk in db.session.scalars(statement).partitions():
+                if limit is not None and written + len(chunk) > limit:
+                    chunk = chunk[:limit - written]
+                    has_more = True
+                if not chunk:
+                    break
+                
+                chunk_authors = identity_cache.get_many([post.user_id for post in chunk], load_user_projections)
+                chunk_liked = load_liked_post_ids(current_user_id, [post.id for post in chunk])
+                
+                for post in chunk:
+                    post_dict = post.to_compact_dict()
+                    is_liked = post.id in chunk_liked
+                    if like_buffer is not None:
+                        is_liked, post_dict['likes'] = like_buffer.overlay(
+                            current_user_id, post.id, is_liked, post_dict['likes']
+                        )
+                    author = feed_author(chunk_authors[post.user_id])
+                    if compact:
+                        authors[post.user_id] = author
+                        if is_liked:
+                            liked_post_ids.append(post.id)
+                    else:
+                        post_dict = expand_feed_post(post_dict, author, is_liked)
+                    yield (b',' if written else b'') + encode(post_dict)
+                    written += 1
+                last_post = chunk[-1]
+                if has_more:
+                    break
+        except Exception:
+            # Headers are already sent; the truncated body tells the client it failed
+            app.logger.exception('Error streaming feed')
+            return
+        
+        tail = {'next_cursor': encode_feed_cursor(last_post.created_at, last_post.id) if has_more else None}
+        if compact:
+            tail['authors'] = authors
+            tail['likedPostIds'] = liked_post_ids
+        # Splice the remaining keys into the outer object
+        yield b'],' + encode(tail)[1:]
+    
+    response = app.response_class(
+        stream_with_context(generate()), mimetype=COMPACT_FEED_MIMETYPE if compact else app.json.mimetype
+    )
+    # The format can come from Accept, so shared caches must key on it
+    response.vary.add('Accept')
+    return response
+
+def wants_compact_feed():
+    """Compact feed format, chosen by ?format=compact or the vendor media type"""
+    if request.args.get('format') == 'compact':
+        return True
+    return COMPACT_FEED_MIMETYPE in request.accept_mimetypes.values()
+
 @app.route('/api/posts', methods=['GET'])
 @jwt_required()
+@replica_reads
 def get_posts():
     try:
         current_user_id = get_jwt_identity()
-        posts = Post.query.order_by(Post.created_at.desc()).all()
-        
-        posts_data = []
-        for post in posts:
-            post_dict = post.to_dict()
-            # Check if current user liked this post
-            like = PostLike.query.filter_by(user_id=current_user_id, post_id=post.id).first()
-            post_dict['isLiked'] = bool(like)
-            posts_data.append(post_dict)
         
-        return jsonify({'posts': posts_data}), 200
+        limit_arg = request.args.get('limit')
+        try:
+            limit = int(limit_arg) if limit_arg is not None else app.config['FEED_PAGE_SIZE']
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
         
-    except Exception as e:
+        cursor = request.args.get('cursor')
+        cursor_position = None
+        if cursor:
+            try:
+                cursor_position = decode_feed_cursor(cursor)
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+        
+        if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+            # Streamed feeds go past FEED_MAX_PAGE_SIZE but stop at FEED_STREAM_MAX,
+            # so one request can't hold a worker for the whole table; next_cursor
+            # continues from there
+            stream_max = app.config['FEED_STREAM_MAX']
+            stream_limit = max(1, min(limit, stream_max)) if limit_arg is not None else stream_max
+            return stream_feed(current_user_id, cursor_position, stream_limit, wants_compact_feed())
+        
+        limit = max(1, min(limit, app.config['FEED_MAX_PAGE_SIZE']))
+        
+        # The user-independent part of the page comes from the shared cache
+        page = None
+        if app.config['FEED_CACHE_ENABLED']:
+            generation = feed_cache.generation()
+            page = feed_cache.get(generation, cursor, limit)
+        if page is None:
+            # Pages that go into the shared cache are read from the primary
+            page = build_feed_page(
+                cursor_position, limit, on_primary() if app.config['FEED_CACHE_ENABLED'] else None
+            )
+            if app.config['FEED_CACHE_ENABLED']:
+                feed_cache.set(generation, cursor, limit, page)
+        posts_data = page['posts']
+        
+        # Resolve the current user's likes for the whole page in one query
+        liked_post_ids = load_liked_post_ids(current_user_id, [post_dict['id'] for post_dict in posts_data])
+        
+        if like_buffer is not None:
+            # Show this worker's not yet flushed toggles
+            for post_dict in posts_data:
+                is_liked, post_dict['likes'] = like_buffer.overlay(
+                    current_user_id, post_dict['id'], post_dict['id'] in liked_post_ids, post_dict['likes']
+                )
+                if is_liked:
+                    liked_post_ids.add(post_dict['id'])
+                else:
+                    liked_post_ids.discard(post_dict['id'])
+        
+        if wants_compact_feed():
+            response = jsonify({
+                'posts': posts_data,
+                'authors': page['authors'],
+                'likedPostIds': [post_dict['id'] for post_dict in posts_data if post_dict['id'] in liked_post_ids],
+                'next_cursor': page['next_cursor']
+            })
+            response.mimetype = COMPACT_FEED_MIMETYPE
+        else:
+            # Default format: author and isLiked inlined in every post
+            posts_data = [
+                expand_feed_post(post_dict, page['authors'][post_dict['authorId']], post_dict['id'] in liked_post_ids)
+                for post_dict in posts_data
+            ]
+            response = jsonify({'posts': posts_data, 'next_cursor': page['next_cursor']})
+        
+        # The format can come from Accept, so shared caches must key on it
+        response.vary.add('Accept')
+        return response, 200
+        
+    except Exception:
+        app.logger.exception('Error loading feed')
         return jsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/posts', methods=['POST'])
@@ -349,56 +980,79 @@ def create_post():
         
         db.session.add(post)
         db.session.commit()
+        feed_cache.invalidate()
         
         return jsonify({
             'message': 'Post created successfully',
             'post': post.to_dict()
         }), 201
         
-    except Exception as e:
+    except Exception:
         db.session.rollback()
+        app.logger.exception('Error creating post')
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/api/posts/<post_id>/like', methods=['POST'])
+@app.route('/api/posts/<id:post_id>', methods=['GET'])
 @jwt_required()
-def toggle_like(post_id):
+@replica_reads
+def get_post(post_id):
     try:
         current_user_id = get_jwt_identity()
+        post = db.session.get(Post, post_id)
         
-        post = Post.query.get(post_id)
-        if not post:
-            return jsonify({'error': 'Post not found'}), 404
+        if post is None:
+            # Old posts are only reachable by id once archived
+            archived = db.session.get(ArchivedPost, post_id)
+            if archived is None:
+                return jsonify({'error': 'Post not found'}), 404
+            author = identity_cache.get(archived.user_id, load_user_projections)
+            return jsonify({'post': archived.to_dict(author=author)}), 200
         
-        # Check if user already liked the post
-        existing_like = PostLike.query.filter_by(user_id=current_user_id, post_id=post_id).first()
+        is_liked = post.id in load_liked_post_ids(current_user_id, [post.id])
+        likes = post.likes
+        if like_buffer is not None:
+            is_liked, likes = like_buffer.overlay(current_user_id, post.id, is_liked, likes)
         
-        if existing_like:
-            # Unlike the post
-            db.session.delete(existing_like)
-            post.likes = max(0, post.likes - 1)
-            is_liked = False
-        else:
-            # Like the post
-            like = PostLike(user_id=current_user_id, post_id=post_id)
-            db.session.add(like)
-            post.likes += 1
-            is_liked = True
+        post_data = post.to_dict(is_liked=is_liked, author=identity_cache.get(post.user_id, load_user_projections))
+        post_data['likes'] = likes
+        post_data['archived'] = False
         
-        db.session.commit()
+        return jsonify({'post': post_data}), 200
+        
+    except Exception:
+        app.logger.exception('Error loading post')
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/posts/<id:post_id>/like', methods=['POST'])
+@jwt_required()
+def toggle_like(post_id):
+    try:
+        current_user_id = get_jwt_identity()
+        
+        if like_buffer is not None:
+            # Write-behind: answer from the buffer, persist in the next batch
+            result = like_buffer.toggle(current_user_id, post_id)
+        else:
+            result = toggle_post_like(current_user_id, post_id)
+        if result is None:
+            return jsonify({'error': 'Post not found'}), 404
+        is_liked, likes = result
         
         return jsonify({
             'message': 'Like toggled successfully',
-            'likes': post.likes,
+            'likes': likes,
             'isLiked': is_liked
         }), 200
         
-    except Exception as e:
+    except Exception:
         db.session.rollback()
+        app.logger.exception('Error toggling like')
         return jsonify({'error': 'Internal server error'}), 500
 
 # User Routes
 @app.route('/api/users/<username>', methods=['GET'])
 @jwt_required()
+@replica_reads
 def get_user_by_username(username):
     try:
         user = User.query.filter_by(username=username.lower()).first()
@@ -408,7 +1062,8 @@ def get_user_by_username(username):
         
         return jsonify({'user': user.to_dict()}), 200
         
-    except Exception as e:
+    except Exception:
+        app.logger.exception('Error loading user')
         return jsonify({'error': 'Internal server error'}), 500
 
 # File Upload Route
@@ -433,76 +1088,197 @@ def upload_profile_picture():
         if not allowed_file(file.filename):
             return jsonify({'error': 'File type not allowed'}), 400
         
-        # Process image and convert to base64
-        base64_image = resize_image_to_base64(file)
+        # Reject bombs, animations and disguised formats from the header alone
+        extension = file.filename.rsplit('.', 1)[1].lower()
+        max_pixels = app.config['IMAGE_MAX_PIXELS']
+        try:
+            with instrumentation.phase('image'):
+                inspect_image(file, extension, max_pixels)
+        except ImageRejected as e:
+            return jsonify({'error': str(e)}), 400
+        file.seek(0)
+        
+        if app.config['IMAGE_PROCESSING_MODE'] == 'async':
+            return enqueue_profile_picture(user, file, extension)
         
-        if not base64_image:
+        # Process image into every size/format variant
+        try:
+            with instrumentation.phase('image'), metrics.image_timer('sync'):
+                variants = generate_variants(file, extension, max_pixels)
+        except Exception:
+            app.logger.exception('Error processing image')
             return jsonify({'error': 'Failed to process image'}), 400
         
-        # Store the base64 data in database
-        user.profile_picture_data = base64_image
-        user.profile_picture = f"/api/auth/profile-picture/{current_user_id}"
+        # Store the bytes in the image store; the users row only keeps the key
+        replaced_key = apply_profile_picture(user, variants)
         
         db.session.commit()
+        settle_profile_picture(variants, replaced_key)
+        identity_cache.invalidate(current_user_id)
+        feed_cache.invalidate()
         
         return jsonify({
             'message': 'Profile picture uploaded successfully',
             'user': user.to_dict()
         }), 200
         
-    except Exception as e:
+    except Exception:
         db.session.rollback()
-        print(f"Error uploading profile picture: {e}")
+        app.logger.exception('Error uploading profile picture')
+        return jsonify({'error': 'Internal server error'}), 500
+
+def enqueue_profile_picture(user, file, extension):
+    """Hand an upload to the background pool and answer 202 with the job id"""
+    if not image_job_queue.reserve():
+        # Back-pressure: this worker already has a full queue of images
+        response = jsonify({'error': 'Image processing is busy, please retry shortly'})
+        response.headers['Retry-After'] = str(app.config['IMAGE_RETRY_AFTER'])
+        return response, 503
+    
+    try:
+        data = file.read()
+        job = ImageJob(user_id=user.id)
+        db.session.add(job)
+        db.session.commit()
+    except Exception:
+        image_job_queue.release()
+        raise
+    
+    job_id = job.id
+    submitted = time.perf_counter()
+    
+    def on_done(future):
+        # Includes the wait for a free pool process
+        metrics.observe_image('async', time.perf_counter() - submitted)
+        finish_image_job(job_id, future)
+    
+    try:
+        image_job_queue.submit(generate_variants_from_bytes,
+                               (data, extension, app.config['IMAGE_MAX_PIXELS']),
+                               on_done)
+    except Exception:
+        job.status = 'failed'
+        job.error = 'Failed to process image'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        raise
+    
+    return jsonify({
+        'message': 'Profile picture is being processed',
+        'jobId': job_id,
+        'statusUrl': f"/api/auth/profile-picture/jobs/{job_id}"
+    }), 202
+
+@app.route('/api/auth/profile-picture/jobs/<id:job_id>', methods=['GET'])
+@jwt_required()
+def get_profile_picture_job(job_id):
+    try:
+        current_user_id = get_jwt_identity()
+        job = db.session.get(ImageJob, job_id)
+        
+        if not job or job.user_id != current_user_id:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        if job.expire(app.config['IMAGE_JOB_TIMEOUT']):
+            db.session.commit()
+        
+        result = {'job': job.to_dict()}
+        if job.status == 'done':
+            result['user'] = db.session.get(User, current_user_id).to_dict()
+        
+        return jsonify(result), 200
+        
+    except Exception:
+        app.logger.exception('Error loading image job')
         return jsonify({'error': 'Internal server error'}), 500
 
 # Serve profile pictures from database
-@app.route('/api/auth/profile-picture/<user_id>', methods=['GET'])
+@app.route('/api/auth/profile-picture/<id:user_id>', methods=['GET'])
+@replica_reads
 def get_profile_picture(user_id):
     try:
-        user = User.query.get(user_id)
+        # Only the key column is read from users; the bytes live in image_blobs
+        key = db.session.query(User.profile_picture_hash).filter_by(id=user_id).scalar()
         
-        if not user or not user.profile_picture_data:
+        if not key:
             # Return default image or 404
             return jsonify({'error': 'Profile picture not found'}), 404
         
-        # Extract base64 data (remove data:image/jpeg;base64, prefix)
-        if user.profile_picture_data.startswith('data:image/jpeg;base64,'):
-            base64_data = user.profile_picture_data.split(',')[1]
-        else:
-            base64_data = user.profile_picture_data
-        
-        # Decode base64 to bytes
         try:
-            image_data = base64.b64decode(base64_data)
-        except Exception as e:
-            print(f"Error decoding base64: {e}")
-            return jsonify({'error': 'Invalid image data'}), 400
+            requested_size = int(request.args.get('size', DEFAULT_PROFILE_PICTURE_SIZE))
+        except ValueError:
+            return jsonify({'error': 'size must be an integer'}), 400
+        size = pick_size(requested_size)
+        accepts_webp = any(value == 'image/webp' and quality > 0
+                           for value, quality in request.accept_mimetypes)
+        
+        # Preferred variant first; pictures uploaded before variants existed
+        # only have the canonical JPEG
+        candidates = []
+        if accepts_webp:
+            candidates.append((variant_key(key, size, 'webp'), 'image/webp'))
+        candidates.append((variant_key(key, size, 'jpeg'), 'image/jpeg'))
+        if candidates[-1][0] != key:
+            candidates.append((key, 'image/jpeg'))
         
-        # Create response with image data
         from flask import Response
-        response = Response(image_data, mimetype='image/jpeg')
+        
+        # Revalidation only needs the key, so the image is never loaded for a 304
+        matched = next((c for c in candidates if request.if_none_match.contains(c[0])), None)
+        if matched:
+            response = Response(status=304)
+            etag = matched[0]
+        else:
+            for etag, content_type in candidates:
+                response = image_store.response(etag, content_type)
+                if response is not None:
+                    break
+            else:
+                return jsonify({'error': 'Profile picture not found'}), 404
+        
+        response.set_etag(etag)
+        response.vary.add('Accept')
         
         # Add CORS headers
         response.headers['Access-Control-Allow-Origin'] = '*'
         response.headers['Access-Control-Allow-Methods'] = 'GET'
-        response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
-        response.headers['Cache-Control'] = 'public, max-age=3600'  # Cache for 1 hour
+        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, If-None-Match'
+        
+        version = request.args.get('v')
+        if version and version == key[:PROFILE_PICTURE_VERSION_LENGTH]:
+            # The URL names this exact content, so it can be cached forever
+            response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        else:
+            # Unversioned or outdated URL: clients must revalidate with the ETag
+            response.headers['Cache-Control'] = 'public, no-cache'
         
         return response
         
-    except Exception as e:
-        print(f"Error serving profile picture: {e}")
+    except Exception:
+        app.logger.exception('Error serving profile picture')
         return jsonify({'error': 'Internal server error'}), 500
 
 # Health check endpoint
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({
+    health = {
         'status': 'healthy', 
         'timestamp': datetime.utcnow().isoformat(),
-        'storage_type': 'database',
+        'storage_type': image_store.name,
         'base_url': get_base_url()
-    }), 200
+    }
+    
+    # Detailed mode: per-worker cache statistics
+    if request.args.get('detail', '').lower() in ('1', 'true', 'yes'):
+        health['worker_pid'] = os.getpid()
+        health['identity_cache'] = identity_cache.stats()
+        health['feed_cache'] = feed_cache.stats()
+        health['json_encoder'] = app.json.name
+        health['compression'] = response_compressor.stats()
+        health['db_pool'] = pool_stats(db.engine)
+        health['replicas'] = replica_router.stats() if replica_router is not None else None
+    
+    return jsonify(health), 200
 
 # Debug endpoint (development only)
 @app.route('/api/debug/config', methods=['GET'])
@@ -514,7 +1290,7 @@ def debug_config():
         'flask_env': app.config.get('FLASK_ENV'),
         'base_url': get_base_url(),
         'max_content_length': app.config.get('MAX_CONTENT_LENGTH'),
-        'storage_type': 'database'
+        'storage_type': image_store.name
     }), 200
 
 # Error handlers
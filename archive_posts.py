@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Moves posts older than POST_ARCHIVE_AFTER_DAYS out of the posts and
+post_likes tables into archived_posts, which keeps one row per post with its
+likes collapsed into a count. The feed then only ever touches recent rows,
+and the hot tables and their indexes stop growing with the site's age.
+
+Archived posts drop out of the feed but can still be read with
+GET /api/posts/<post_id>.
+
+Usage:
+    python archive_posts.py                 # archive posts older than POST_ARCHIVE_AFTER_DAYS
+    python archive_posts.py --days 180      # use another age
+    python archive_posts.py --dry-run       # only count what would be archived
+
+Each chunk of POST_ARCHIVE_CHUNK_SIZE posts is copied and deleted in its own
+short transaction, so the job can run next to live traffic and be stopped
+and rerun at any point. Don't run it during a transfer_data.py export.
+
+With LIKE_WRITE_BEHIND, toggles still buffered in the app workers for a post
+archived meanwhile are dropped when they are flushed, like any toggle of an
+archived post.
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import delete, func, insert, select
+
+from app import app, db, feed_cache, ArchivedPost, Post, PostLike
+
+
+def archive_chunk(cutoff, chunk_size):
+    """Archive the oldest chunk of posts created before cutoff; returns (posts, likes) moved"""
+    try:
+        # Oldest first along ix_posts_created_at_id. On PostgreSQL the rows are
+        # locked, so a concurrent like waits for this chunk and then finds the post gone
+        posts = db.session.execute(
+            select(Post.id, Post.user_id, Post.content, Post.created_at)
+            .where(Post.created_at < cutoff)
+            .order_by(Post.created_at, Post.id)
+            .limit(chunk_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not posts:
+            db.session.rollback()
+            return 0, 0
+
+        post_ids = [post.id for post in posts]
+        like_counts = dict(db.session.execute(
+            select(PostLike.post_id, func.count())
+            .where(PostLike.post_id.in_(post_ids))
+            .group_by(PostLike.post_id)
+        ).all())
+
+        archived_at = datetime.utcnow()
+        db.session.execute(insert(ArchivedPost), [
+            {
+                'id': post.id,
+                'user_id': post.user_id,
+                'content': post.content,
+                'likes': like_counts.get(post.id, 0),
+                'created_at': post.created_at,
+                'archived_at': archived_at,
+            }
+            for post in posts
+        ])
+        db.session.execute(delete(PostLike).where(PostLike.post_id.in_(post_ids)))
+        db.session.execute(delete(Post).where(Post.id.in_(post_ids)))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    # Cached feed pages may still list these posts
+    feed_cache.invalidate()
+    return len(posts), sum(like_counts.values())
+
+
+def archive_posts(cutoff, chunk_size, pause=0.0):
+    """Archive every post created before cutoff; returns (posts, likes) moved"""
+    total_posts = total_likes = 0
+    while True:
+        posts, likes = archive_chunk(cutoff, chunk_size)
+        if not posts:
+            return total_posts, total_likes
+        total_posts += posts
+        total_likes += likes
+        print(f"  archived {total_posts} posts, {total_likes} likes")
+        if pause:
+            # Lets replicas and autovacuum keep up on large backlogs
+            time.sleep(pause)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Move old posts and their likes into archived_posts')
+    parser.add_argument('--days', type=int, default=None,
+                        help='Archive posts older than this many days (default: POST_ARCHIVE_AFTER_DAYS)')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='Posts per transaction (default: POST_ARCHIVE_CHUNK_SIZE)')
+    parser.add_argument('--pause', type=float, default=0.0, help='Seconds to wait between chunks')
+    parser.add_argument('--dry-run', action='store_true', help='Count the posts that would be archived')
+    args = parser.parse_args()
+
+    with app.app_context():
+        days = args.days if args.days is not None else app.config['POST_ARCHIVE_AFTER_DAYS']
+        chunk_size = args.chunk_size or app.config['POST_ARCHIVE_CHUNK_SIZE']
+        cutoff = datetime.utcnow() - timedelta(days=days)
+
+        if args.dry_run:
+            count = db.session.scalar(select(func.count()).select_from(Post).where(Post.created_at < cutoff))
+            print(f"{count} posts are older than {days} days (before {cutoff.isoformat()})")
+            sys.exit(0)
+
+        try:
+            print(f"🔧 Archiving posts older than {days} days (before {cutoff.isoformat()})...")
+            posts, likes = archive_posts(cutoff, chunk_size, args.pause)
+            print(f"✅ Archived {posts} posts and {likes} likes")
+        except Exception as e:
+            print(f"❌ Archiving failed: {e}")
+            sys.exit(1)
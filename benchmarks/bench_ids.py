@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark primary key formats: insert rate and index size.
+
+Inserts the same number of post-like rows (id primary key, indexed user_id,
+(created_at, id) index) with three id schemes:
+
+    uuid4-text   VARCHAR(36) holding random uuid4 strings (the old schema)
+    uuid4-guid   GUID column (16 bytes / native UUID) with random uuid4 values
+    uuid7-guid   GUID column with time-ordered UUIDv7 values (the new schema)
+
+The default database is a throwaway SQLite file; pass --database-url to run
+against PostgreSQL. Index sizes come from dbstat on SQLite and
+pg_relation_size on PostgreSQL.
+
+    python benchmarks/bench_ids.py [--rows 200000] [--batch 1000] [--database-url URL] [--json]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import Column, DateTime, Index, MetaData, String, Table, Text, create_engine, text  # noqa: E402
+
+from identifiers import GUID, uuid7  # noqa: E402
+
+SCHEMES = {
+    'uuid4-text': (lambda: String(36), lambda: str(uuid.uuid4())),
+    'uuid4-guid': (lambda: GUID(), lambda: str(uuid.uuid4())),
+    'uuid7-guid': (lambda: GUID(), lambda: str(uuid7())),
+}
+
+
+def make_table(metadata, scheme):
+    id_type, _ = SCHEMES[scheme]
+    name = 'bench_' + scheme.replace('-', '_')
+    table = Table(
+        name, metadata,
+        Column('id', id_type(), primary_key=True),
+        Column('user_id', id_type(), nullable=False),
+        Column('content', Text, nullable=False),
+        Column('created_at', DateTime, nullable=False),
+    )
+    Index(f'ix_{name}_user_id', table.c.user_id)
+    Index(f'ix_{name}_created_at_id', table.c.created_at, table.c.id)
+    return table
+
+
+def index_sizes(engine, table):
+    """{index name: bytes} for the table's primary key and secondary indexes"""
+    with engine.connect() as conn:
+        if engine.dialect.name == 'postgresql':
+            rows = conn.execute(text(
+                "SELECT indexrelid::regclass::text, pg_relation_size(indexrelid) "
+                "FROM pg_index WHERE indrelid = CAST(:table AS regclass)"
+            ), {'table': table.name}).fetchall()
+        else:
+            rows = conn.execute(text(
+                "SELECT name, SUM(pgsize) FROM dbstat "
+                "WHERE name IN (SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table) "
+                "GROUP BY name"
+            ), {'table': table.name}).fetchall()
+    return {name: int(size) for name, size in rows}
+
+
+def run_scheme(engine, scheme, rows, batch):
+    metadata = MetaData()
+    table = make_table(metadata, scheme)
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+    _, make_id = SCHEMES[scheme]
+    users = [make_id() for _ in range(1000)]
+    rng = random.Random(42)
+    start_time = datetime.utcnow()
+
+    elapsed = 0.0
+    for offset in range(0, rows, batch):
+        values = [
+            {
+                'id': make_id(),
+                'user_id': rng.choice(users),
+                'content': 'benchmark post',
+                'created_at': start_time + timedelta(milliseconds=offset + i),
+            }
+            for i in range(min(batch, rows - offset))
+        ]
+        # Only the database work is timed, not building the rows
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            conn.execute(table.insert(), values)
+        elapsed += time.perf_counter() - started
+
+    sizes = index_sizes(engine, table)
+    metadata.drop_all(engine)
+    return {
+        'scheme': scheme,
+        'rows': rows,
+        'inserts_per_s': round(rows / elapsed),
+        'index_bytes': sum(sizes.values()),
+        'indexes': sizes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Primary key format benchmark')
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--batch', type=int, default=1000, help='rows per insert transaction')
+    parser.add_argument('--database-url', default=None, help='defaults to a temporary SQLite file')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench-ids-'), 'bench.db')}"
+    engine = create_engine(url)
+    results = [run_scheme(engine, scheme, args.rows, args.batch) for scheme in SCHEMES]
+    engine.dispose()
+
+    if args.json:
+        print(json.dumps({'database': engine.dialect.name, 'results': results}, indent=2))
+        return
+
+    print(f"{engine.dialect.name}, {args.rows} rows in batches of {args.batch}")
+    print(f"{'scheme':<12} {'inserts/s':>10} {'index MB':>9}")
+    for result in results:
+        print(f"{result['scheme']:<12} {result['inserts_per_s']:>10} {result['index_bytes'] / 1e6:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
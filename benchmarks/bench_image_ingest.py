@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Benchmark profile picture ingestion: peak memory and latency per upload.
+
+Compares the previous pipeline (full-resolution decode, convert, then
+thumbnail) with image_processing.generate_variants (header checks, JPEG DCT
+scaling, shrink before convert). Each measurement runs in a fresh process
+so peak RSS is attributable to a single upload.
+
+    python benchmarks/bench_image_ingest.py [--runs 5] [--json]
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from PIL import Image
+
+import image_processing
+
+# (label, width, height) of the synthetic camera photos
+CASES = [
+    ('3MP', 2000, 1500),
+    ('12MP', 4000, 3000),
+    ('24MP', 6000, 4000),
+]
+
+
+def make_photo(width, height):
+    """JPEG with photo-like entropy so it compresses like a real upload"""
+    noise = Image.effect_noise((width // 4, height // 4), 64).resize((width, height))
+    gradient = Image.linear_gradient('L').resize((width, height))
+    img = Image.merge('RGB', (noise, gradient, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def legacy_generate_variants(file):
+    """The pipeline before reduced-scale decoding, kept as the baseline"""
+    img = Image.open(file)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    else:
+        # Force the full-resolution decode the old code got from convert()
+        img.load()
+    variants = {}
+    current = img
+    for size in sorted(image_processing.PROFILE_PICTURE_SIZES, reverse=True):
+        current = current.copy()
+        current.thumbnail((size, size), Image.Resampling.LANCZOS)
+        for fmt in image_processing.IMAGE_FORMATS:
+            variants[(size, fmt)] = image_processing._encode(current, fmt)
+    return variants
+
+
+PIPELINES = {
+    'before': legacy_generate_variants,
+    'after': image_processing.generate_variants,
+}
+
+
+def peak_rss_kb():
+    """High-water RSS of this process in KB"""
+    # VmHWM starts fresh at exec; ru_maxrss on Linux carries the parent's peak over
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _measure(pipeline, path, result_queue):
+    # Baseline before the upload is read, so the peak covers everything one
+    # request holds: the upload bytes, decoded bitmaps and encoded variants
+    baseline_kb = peak_rss_kb()
+    start = time.perf_counter()
+    with open(path, 'rb') as f:
+        data = f.read()
+    PIPELINES[pipeline](io.BytesIO(data))
+    elapsed = time.perf_counter() - start
+    peak_kb = peak_rss_kb()
+    result_queue.put((elapsed, peak_kb - baseline_kb))
+
+
+def measure(pipeline, path, runs):
+    ctx = multiprocessing.get_context('spawn')
+    timings, peaks = [], []
+    for _ in range(runs):
+        result_queue = ctx.Queue()
+        process = ctx.Process(target=_measure, args=(pipeline, path, result_queue))
+        process.start()
+        elapsed, peak_kb = result_queue.get()
+        process.join()
+        timings.append(elapsed)
+        peaks.append(peak_kb)
+    return {
+        'latency_ms_median': round(statistics.median(timings) * 1000, 1),
+        'peak_rss_mb_median': round(statistics.median(peaks) / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Profile picture ingestion benchmark')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, width, height in CASES:
+            data = make_photo(width, height)
+            path = os.path.join(tmp, f'{label}.jpg')
+            with open(path, 'wb') as f:
+                f.write(data)
+            del data
+            for pipeline in PIPELINES:
+                result = {'case': label, 'upload_kb': os.path.getsize(path) // 1024, 'pipeline': pipeline}
+                result.update(measure(pipeline, path, args.runs))
+                results.append(result)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'case':<6} {'upload':>8} {'pipeline':<8} {'latency':>10} {'peak RSS':>10}")
+    for r in results:
+        print(f"{r['case']:<6} {r['upload_kb']:>6}KB {r['pipeline']:<8} "
+              f"{r['latency_ms_median']:>8}ms {r['peak_rss_mb_median']:>8}MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark login throughput at several concurrency levels.
+
+Runs the app in-process against a throwaway SQLite database with the
+configured PASSWORD_HASH_* settings and drives POST /api/auth/login from N
+client threads. Reports throughput, latency percentiles and how many requests
+were turned away with 503 because every hashing slot was taken.
+
+The client threads stand in for the GUNICORN_THREADS of a single gunicorn
+worker; with several workers each one has its own slots, so multiply the
+sustainable concurrency by the worker count.
+
+    python benchmarks/bench_login.py [--levels 1,2,4,8,16] [--requests 64] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+_db_dir = tempfile.mkdtemp(prefix='bench-login-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+os.environ.setdefault('FLASK_ENV', 'production')
+os.environ.setdefault('SECRET_KEY', 'bench-secret-key-for-local-runs-only')
+os.environ.setdefault('JWT_SECRET_KEY', 'bench-jwt-secret-key-for-local-runs-only')
+
+from app import app, db, User  # noqa: E402
+
+USERNAME = 'bench'
+PASSWORD = 'bench-password'
+
+
+def seed():
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(username=USERNAME, email='bench@example.com', display_name='Bench')
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.commit()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_level(concurrency, total_requests):
+    def one_login(_):
+        client = app.test_client()
+        start = time.perf_counter()
+        response = client.post('/api/auth/login', json={'username': USERNAME, 'password': PASSWORD})
+        return response.status_code, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one_login, range(total_requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for status, latency in results if status == 200]
+    busy = sum(1 for status, _ in results if status == 503)
+    return {
+        'concurrency': concurrency,
+        'requests': total_requests,
+        'ok': len(latencies),
+        'busy_503': busy,
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 1) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Login throughput benchmark')
+    parser.add_argument('--levels', default='1,2,4,8,16')
+    parser.add_argument('--requests', type=int, default=64, help='logins per concurrency level')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    seed()
+    results = [run_level(int(level), args.requests) for level in args.levels.split(',')]
+
+    if args.json:
+        print(json.dumps({
+            'hash_method': app.config['PASSWORD_HASH_METHOD'],
+            'hash_workers': app.config['PASSWORD_HASH_WORKERS'],
+            'hash_queue': app.config['PASSWORD_HASH_QUEUE'],
+            'results': results,
+        }, indent=2))
+        return
+
+    print(f"method={app.config['PASSWORD_HASH_METHOD']} workers={app.config['PASSWORD_HASH_WORKERS']} "
+          f"queue={app.config['PASSWORD_HASH_QUEUE']}")
+    print(f"{'clients':>7} {'ok':>5} {'503':>5} {'req/s':>8} {'p50':>9} {'p95':>9}")
+    for r in results:
+        print(f"{r['concurrency']:>7} {r['ok']:>5} {r['busy_503']:>5} {r['throughput_rps']:>8} "
+              f"{r['p50_ms']:>7}ms {r['p95_ms']:>7}ms")
+
+
+if __name__ == '__main__':
+    main()
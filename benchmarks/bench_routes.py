@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Load benchmark for the main API routes.
+
+Seeds a throwaway database at the requested scale, then drives each route
+from concurrent in-process clients and reports latency percentiles,
+throughput and SQL statements per request. Output is JSON so runs on two
+commits can be diffed:
+
+    python benchmarks/bench_routes.py --json --output before.json
+    git checkout other-branch
+    python benchmarks/bench_routes.py --json --output after.json
+
+Options:
+    --users/--posts/--likes   seed scale (default 200 / 5000 / 20000)
+    --clients                 concurrent clients per route (default 8)
+    --requests                requests per route (default 200)
+    --routes                  comma separated subset of ROUTES
+    --hash-method             PASSWORD_HASH_METHOD for the run; login and
+                              register cost is mostly hashing
+    --database-url            run against another database instead of a
+                              temporary SQLite file (it is dropped and seeded)
+"""
+import argparse
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+ROUTES = [
+    'register',
+    'login',
+    'get_posts',
+    'toggle_like',
+    'create_post',
+    'upload_profile_picture',
+    'get_profile_picture',
+]
+
+PASSWORD = 'bench-password'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='API route load benchmark')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--posts', type=int, default=5000)
+    parser.add_argument('--likes', type=int, default=20000)
+    parser.add_argument('--pictures', type=int, default=20, help='seeded users with a profile picture')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    parser.add_argument('--routes', default=','.join(ROUTES))
+    parser.add_argument('--hash-method', default=None)
+    parser.add_argument('--database-url', default=None)
+    parser.add_argument('--seed', type=int, default=1, help='random seed for data and request mix')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    parser.add_argument('--output', default=None, help='also write the JSON results to this file')
+    return parser.parse_args()
+
+
+args = parse_args()
+
+# The app reads its configuration at import time
+_db_dir = tempfile.mkdtemp(prefix='bench-routes-')
+os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+os.environ.setdefault('FLASK_ENV', 'production')
+os.environ.setdefault('SECRET_KEY', 'bench-secret-key-for-local-runs-only')
+os.environ.setdefault('JWT_SECRET_KEY', 'bench-jwt-secret-key-for-local-runs-only')
+os.environ.setdefault('SHARED_CACHE_PATH', os.path.join(_db_dir, 'shared-cache.sqlite3'))
+if args.hash_method:
+    os.environ['PASSWORD_HASH_METHOD'] = args.hash_method
+
+from flask_jwt_extended import create_access_token  # noqa: E402
+from PIL import Image  # noqa: E402
+from sqlalchemy import event, insert, update  # noqa: E402
+
+from app import app, db, identity_cache, password_hasher, shared_store, Post, PostLike, User  # noqa: E402
+from identifiers import new_id  # noqa: E402
+
+
+def image_bytes(rng, size=512):
+    """A JPEG with some detail, so encoding costs something"""
+    img = Image.new('RGB', (size, size))
+    img.putdata([(rng.randrange(256), (x * 7) % 256, (x * 13) % 256) for x in range(size * size)])
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def seed(rng):
+    """Bulk insert users, posts and likes; returns what the request mix needs"""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        shared_store.clear()
+        identity_cache.clear()
+
+        password_hash = password_hasher.hash(PASSWORD)
+        users = [
+            {'id': new_id(), 'username': f'user{i}', 'email': f'user{i}@example.com',
+             'password_hash': password_hash, 'display_name': f'User {i}'}
+            for i in range(args.users)
+        ]
+        db.session.execute(insert(User), users)
+
+        now = datetime.utcnow()
+        posts = [
+            {'id': new_id(), 'user_id': rng.choice(users)['id'], 'content': f'Seeded post {i} ' * 4,
+             'likes': 0, 'created_at': now - timedelta(seconds=args.posts - i)}
+            for i in range(args.posts)
+        ]
+        db.session.execute(insert(Post), posts)
+
+        pairs = set()
+        limit = min(args.likes, args.users * args.posts)
+        while len(pairs) < limit:
+            pairs.add((rng.randrange(args.users), rng.randrange(args.posts)))
+        likes = [
+            {'id': new_id(), 'user_id': users[u]['id'], 'post_id': posts[p]['id'], 'created_at': now}
+            for u, p in pairs
+        ]
+        for start in range(0, len(likes), 5000):
+            db.session.execute(insert(PostLike), likes[start:start + 5000])
+
+        counts = {}
+        for _, p in pairs:
+            counts[posts[p]['id']] = counts.get(posts[p]['id'], 0) + 1
+        db.session.execute(update(Post), [{'id': post_id, 'likes': n} for post_id, n in counts.items()])
+        db.session.commit()
+
+        tokens = {user['id']: create_access_token(identity=user['id']) for user in users}
+
+    state = {
+        'users': users,
+        'post_ids': [post['id'] for post in posts],
+        'tokens': tokens,
+        'image': image_bytes(rng),
+        'pictures': [],
+        'register_counter': 0,
+        'lock': threading.Lock(),
+    }
+
+    client = app.test_client()
+    for user in users[:args.pictures]:
+        response = upload(client, state, user)
+        if response.status_code == 200:
+            state['pictures'].append(response.get_json()['user']['profilePicture'])
+    return state
+
+
+def auth(state, user):
+    return {'Authorization': f"Bearer {state['tokens'][user['id']]}"}
+
+
+def upload(client, state, user):
+    return client.post(
+        '/api/auth/profile-picture',
+        headers=auth(state, user),
+        data={'file': (io.BytesIO(state['image']), 'avatar.jpg')},
+        content_type='multipart/form-data'
+    )
+
+
+def do_register(client, rng, state):
+    with state['lock']:
+        state['register_counter'] += 1
+        n = state['register_counter']
+    return client.post('/api/auth/register', json={
+        'username': f'newuser{n}', 'email': f'newuser{n}@example.com',
+        'password': PASSWORD, 'displayName': f'New User {n}'
+    })
+
+
+def do_login(client, rng, state):
+    user = rng.choice(state['users'])
+    return client.post('/api/auth/login', json={'username': user['username'], 'password': PASSWORD})
+
+
+def do_get_posts(client, rng, state):
+    headers = auth(state, rng.choice(state['users']))
+    response = client.get('/api/posts', headers=headers)
+    # Half the requests also read the second page
+    if response.status_code == 200 and rng.random() < 0.5:
+        cursor = response.get_json().get('next_cursor')
+        if cursor:
+            return client.get(f'/api/posts?cursor={cursor}', headers=headers)
+    return response
+
+
+def do_toggle_like(client, rng, state):
+    post_id = rng.choice(state['post_ids'])
+    return client.post(f'/api/posts/{post_id}/like', headers=auth(state, rng.choice(state['users'])))
+
+
+def do_create_post(client, rng, state):
+    return client.post('/api/posts', json={'content': 'Benchmark post ' * 5},
+                       headers=auth(state, rng.choice(state['users'])))
+
+
+def do_upload_profile_picture(client, rng, state):
+    return upload(client, state, rng.choice(state['users']))
+
+
+def do_get_profile_picture(client, rng, state):
+    url = rng.choice(state['pictures'])
+    size = rng.choice(['48', '150', '300'])
+    accept = rng.choice(['image/webp,image/*', 'image/*'])
+    separator = '&' if '?' in url else '?'
+    return client.get(f"{url}{separator}size={size}", headers={'Accept': accept})
+
+
+OPERATIONS = {name: globals()[f'do_{name}'] for name in ROUTES}
+
+
+class QueryCounter:
+    """Counts SQL statements per thread, so each request's count is a delta"""
+
+    def __init__(self, engine):
+        self._local = threading.local()
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *_):
+        self._local.count = getattr(self._local, 'count', 0) + 1
+
+    def current(self):
+        return getattr(self._local, 'count', 0)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_route(name, state, counter):
+    operation = OPERATIONS[name]
+
+    def one_request(index):
+        rng = random.Random(f'{args.seed}-{name}-{index}')
+        client = app.test_client()
+        queries_before = counter.current()
+        start = time.perf_counter()
+        response = operation(client, rng, state)
+        # Reading the body finishes streamed responses inside the timing
+        response.get_data()
+        return response.status_code, time.perf_counter() - start, counter.current() - queries_before
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        results = list(pool.map(one_request, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for status, latency, _ in results if status < 400]
+    queries = [count for _, _, count in results]
+    statuses = {}
+    for status, _, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    def ms(value):
+        return round(value * 1000, 2)
+
+    return {
+        'requests': len(results),
+        'errors': len(results) - len(latencies),
+        'statuses': statuses,
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': ms(statistics.median(latencies)) if latencies else None,
+        'p95_ms': ms(percentile(latencies, 95)) if latencies else None,
+        'p99_ms': ms(percentile(latencies, 99)) if latencies else None,
+        'queries_per_request': round(statistics.mean(queries), 2),
+        'max_queries': max(queries),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    routes = [name.strip() for name in args.routes.split(',') if name.strip()]
+    unknown = set(routes) - set(OPERATIONS)
+    if unknown:
+        sys.exit(f"Unknown routes: {', '.join(sorted(unknown))}")
+
+    rng = random.Random(args.seed)
+    seed_started = time.perf_counter()
+    state = seed(rng)
+    seed_seconds = time.perf_counter() - seed_started
+    if 'get_profile_picture' in routes and not state['pictures']:
+        sys.exit('No profile pictures were seeded; get_profile_picture needs --pictures > 0 '
+                 'and IMAGE_PROCESSING_MODE=sync')
+
+    with app.app_context():
+        counter = QueryCounter(db.engine)
+        database = db.engine.dialect.name
+    results = {name: run_route(name, state, counter) for name in routes}
+
+    report = {
+        'commit': git_commit(),
+        'database': database,
+        'scale': {'users': args.users, 'posts': args.posts, 'likes': args.likes, 'pictures': args.pictures},
+        'clients': args.clients,
+        'requests_per_route': args.requests,
+        'hash_method': app.config['PASSWORD_HASH_METHOD'],
+        'feed_cache': app.config['FEED_CACHE_ENABLED'],
+        'seed_seconds': round(seed_seconds, 2),
+        'routes': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{database}, {args.users} users / {args.posts} posts / {args.likes} likes, "
+          f"{args.clients} clients x {args.requests} requests per route")
+    print(f"{'route':<24} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'queries':>8} {'errors':>7}")
+    for name, r in results.items():
+        print(f"{name:<24} {r['throughput_rps']:>8} {r['p50_ms']:>7}ms {r['p95_ms']:>7}ms "
+              f"{r['p99_ms']:>7}ms {r['queries_per_request']:>8} {r['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Compression of JSON responses.
+
+Bodies above COMPRESSION_MIN_SIZE are compressed with brotli when the client
+accepts it and the brotli package is installed, and with gzip otherwise.
+Images are left alone; JPEG and WebP don't shrink any further.
+
+Compressed bodies of GET responses are kept in a per-worker LRU keyed by a
+hash of the uncompressed body, so a feed page served again costs a hash
+instead of a recompression.
+"""
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+
+class ResponseCompressor:
+    def __init__(self, min_size=1024, gzip_level=6, brotli_level=4, cache_size=1024):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_level = brotli_level
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def encodings(self):
+        """Supported encodings, best first"""
+        return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+    def _compress(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.brotli_level)
+        # mtime=0 keeps the output identical for identical bodies
+        return gzip.compress(data, compresslevel=self.gzip_level, mtime=0)
+
+    def _compressed(self, data, encoding, cacheable):
+        if not cacheable or not self.cache_size:
+            return self._compress(data, encoding)
+        key = (encoding, hashlib.blake2b(data, digest_size=16).digest())
+        with self._lock:
+            body = self._cache.get(key)
+            if body is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return body
+            self.misses += 1
+        body = self._compress(data, encoding)
+        with self._lock:
+            self._cache[key] = body
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return body
+
+    def process(self, request, response):
+        """after_request hook: compress eligible JSON responses in place"""
+        if not response.is_json or response.direct_passthrough or response.is_streamed:
+            return response
+        # The representation depends on Accept-Encoding even when this one isn't compressed
+        response.vary.add('Accept-Encoding')
+        if response.status_code < 200 or response.status_code in (204, 304):
+            return response
+        if 'Content-Encoding' in response.headers:
+            return response
+
+        encoding = next(
+            (name for name in self.encodings() if request.accept_encodings[name]),
+            None
+        )
+        if encoding is None:
+            return response
+
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        body = self._compressed(data, encoding, cacheable=request.method == 'GET')
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'encodings': list(self.encodings()),
+                'cached': len(self._cache),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None
+            }
+
+
+def create_response_compressor(config):
+    return ResponseCompressor(
+        min_size=config.get('COMPRESSION_MIN_SIZE', 1024),
+        gzip_level=config.get('COMPRESSION_GZIP_LEVEL', 6),
+        brotli_level=config.get('COMPRESSION_BROTLI_LEVEL', 4),
+        cache_size=config.get('COMPRESSION_CACHE_SIZE', 1024)
+    )
@@ -4,21 +4,137 @@ Development configuration for the Flask application
 import os
 from datetime import timedelta
 
+from db_pool import engine_options
+
+
+def pool_options(database_uri, pool_size, max_overflow):
+    """Engine options from the DB_* environment variables, with per-class pool defaults"""
+    return engine_options(
+        database_uri,
+        pool_size=int(os.environ.get('DB_POOL_SIZE', pool_size)),
+        max_overflow=int(os.environ.get('DB_MAX_OVERFLOW', max_overflow)),
+        pool_timeout=float(os.environ.get('DB_POOL_TIMEOUT', 10)),  # Seconds to wait for a free connection
+        pool_recycle=int(os.environ.get('DB_POOL_RECYCLE', 1800)),  # Seconds before a connection is replaced
+        # DATABASE_URL points at PgBouncer in transaction pooling mode
+        pgbouncer=os.environ.get('DB_PGBOUNCER', '').lower() in ('1', 'true', 'yes')
+    )
+
 class Config:
     """Base configuration"""
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///social_app.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Connection pool per gunicorn worker (PostgreSQL only)
+    SQLALCHEMY_ENGINE_OPTIONS = pool_options(SQLALCHEMY_DATABASE_URI, pool_size=5, max_overflow=5)
+    
+    # Read replicas for read-only routes, comma separated; empty means primary only
+    DATABASE_REPLICA_URLS = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    # Seconds a user who wrote keeps reading from the primary; keep above the replication lag
+    REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+    # Seconds a replica that failed is skipped
+    REPLICA_RETRY_AFTER = int(os.environ.get('REPLICA_RETRY_AFTER', 30))
     
     # JWT Configuration
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key-change-in-production'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(days=7)
     JWT_ALGORITHM = 'HS256'
     
+    # Password hashing (werkzeug method string); stored hashes made with
+    # other parameters are upgraded on the next successful login
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'pbkdf2:sha256:600000'
+    PASSWORD_SALT_LENGTH = int(os.environ.get('PASSWORD_SALT_LENGTH', 16))
+    # Per gunicorn worker: hashes computed at once, extra requests allowed to
+    # wait, and how long they wait (seconds) before getting a 503. Keep the
+    # first two below GUNICORN_THREADS so logins never hold every thread
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 4))
+    PASSWORD_HASH_WAIT = float(os.environ.get('PASSWORD_HASH_WAIT', 2.0))
+    PASSWORD_HASH_RETRY_AFTER = 1  # Seconds, sent with 503 when hashing is saturated
+    
     # File Upload Configuration
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or os.path.join(os.path.dirname(__file__), 'uploads', 'profile_pictures')
     MAX_CONTENT_LENGTH = 5 * 1024 * 1024  # 5MB
     
+    # Image storage backend: 'database' (image_blobs table) or 'filesystem' (UPLOAD_FOLDER)
+    IMAGE_STORAGE = os.environ.get('IMAGE_STORAGE') or 'database'
+    # Filesystem backend only: '' (send_file), 'x-sendfile' or 'x-accel-redirect'
+    IMAGE_SENDFILE_MODE = os.environ.get('IMAGE_SENDFILE_MODE') or ''
+    # nginx internal location that maps onto UPLOAD_FOLDER for X-Accel-Redirect
+    IMAGE_ACCEL_REDIRECT_PREFIX = os.environ.get('IMAGE_ACCEL_REDIRECT_PREFIX') or '/protected-images'
+    
+    # Uploads claiming more pixels than this are rejected before decoding
+    IMAGE_MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS', 40_000_000))
+    
+    # Profile picture processing: 'sync' (in the request) or 'async' (background pool, 202 + job id)
+    IMAGE_PROCESSING_MODE = os.environ.get('IMAGE_PROCESSING_MODE') or 'sync'
+    # Async mode, per gunicorn worker: pool processes, max jobs queued or running, and their nice level
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 1))
+    IMAGE_QUEUE_SIZE = int(os.environ.get('IMAGE_QUEUE_SIZE', 4))
+    IMAGE_WORKER_NICE = int(os.environ.get('IMAGE_WORKER_NICE', 10))
+    IMAGE_RETRY_AFTER = 5  # Seconds, sent with 503 when the queue is full
+    # Seconds after which a job still pending is reported failed (its pool process
+    # died or the worker restarted); keep it above the slowest queue wait plus resize
+    IMAGE_JOB_TIMEOUT = int(os.environ.get('IMAGE_JOB_TIMEOUT', 300))
+    
+    # Feed pagination
+    FEED_PAGE_SIZE = int(os.environ.get('FEED_PAGE_SIZE', 20))
+    FEED_MAX_PAGE_SIZE = int(os.environ.get('FEED_MAX_PAGE_SIZE', 100))
+    # Rows fetched per round trip when the feed is streamed (?stream=1)
+    FEED_STREAM_CHUNK_SIZE = int(os.environ.get('FEED_STREAM_CHUNK_SIZE', 500))
+    # Most posts one streamed response sends, with or without limit
+    FEED_STREAM_MAX = int(os.environ.get('FEED_STREAM_MAX', 5000))
+    
+    # JSON encoder for responses: 'auto' (orjson when installed), 'orjson' or 'stdlib'
+    JSON_ENCODER = os.environ.get('JSON_ENCODER', 'auto')
+    
+    # Response compression: JSON bodies of at least COMPRESSION_MIN_SIZE bytes,
+    # brotli when installed and accepted, else gzip
+    COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+    COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+    COMPRESSION_BROTLI_LEVEL = int(os.environ.get('COMPRESSION_BROTLI_LEVEL', 4))
+    # Compressed GET bodies remembered per worker
+    COMPRESSION_CACHE_SIZE = int(os.environ.get('COMPRESSION_CACHE_SIZE', 1024))
+    
+    # Per-request SQL and phase timings (see instrumentation.py); off by default
+    INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION_ENABLED', '').lower() in ('1', 'true', 'yes')
+    # Send the timings to clients in a Server-Timing header (implies INSTRUMENTATION_ENABLED)
+    SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', '').lower() in ('1', 'true', 'yes')
+    # Log requests and SQL statements slower than these (milliseconds, 0 = off)
+    SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 500))
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+    
+    # Prometheus metrics at /metrics (needs prometheus_client). Only served with
+    # METRICS_TOKEN set, which scrapes send as a bearer token, or with
+    # METRICS_PUBLIC on for a port that only the scraper can reach
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+    METRICS_PUBLIC = os.environ.get('METRICS_PUBLIC', '').lower() in ('1', 'true', 'yes')
+    
+    # Likes: buffer toggles in memory and write them in batches (write-behind)
+    LIKE_WRITE_BEHIND = os.environ.get('LIKE_WRITE_BEHIND', '').lower() in ('1', 'true', 'yes')
+    # Durability window: unflushed toggles older than this are written out
+    LIKE_FLUSH_INTERVAL = float(os.environ.get('LIKE_FLUSH_INTERVAL', 0.5))
+    LIKE_BUFFER_MAX_PENDING = int(os.environ.get('LIKE_BUFFER_MAX_PENDING', 1000))
+    
+    # Key-value store shared by the gunicorn workers on this host: a SQLite
+    # file path, or 'memory' for a single process. Defaults to a file in the temp
+    # dir named after the database, so instances on other databases don't share it.
+    SHARED_CACHE_PATH = os.environ.get('SHARED_CACHE_PATH') or None
+    
+    # Per-worker cache of user projections for authenticated requests and post authors
+    IDENTITY_CACHE_SIZE = int(os.environ.get('IDENTITY_CACHE_SIZE', 10000))
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL', 60))  # Seconds
+    
+    # Shared cache of the user-independent part of feed pages
+    FEED_CACHE_ENABLED = os.environ.get('FEED_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    FEED_CACHE_TTL = int(os.environ.get('FEED_CACHE_TTL', 30))  # Seconds
+    
+    # archive_posts.py moves posts older than this out of posts/post_likes
+    POST_ARCHIVE_AFTER_DAYS = int(os.environ.get('POST_ARCHIVE_AFTER_DAYS', 365))
+    # Posts moved per transaction, to keep locks and replication lag short
+    POST_ARCHIVE_CHUNK_SIZE = int(os.environ.get('POST_ARCHIVE_CHUNK_SIZE', 500))
+    
     # Base URL for file serving
     BASE_URL = os.environ.get('BASE_URL') or 'http://localhost:5000'
     
@@ -38,6 +154,7 @@ class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
     FLASK_ENV = 'development'
+    SQLALCHEMY_ENGINE_OPTIONS = pool_options(Config.SQLALCHEMY_DATABASE_URI, pool_size=2, max_overflow=3)
 
 class ProductionConfig(Config):
     """Production configuration"""
@@ -47,6 +164,8 @@ class ProductionConfig(Config):
     SECRET_KEY = os.environ.get('SECRET_KEY')
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY')
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
+    # 4 gunicorn workers x (5 + 5 overflow) stays well below the server's max_connections
+    SQLALCHEMY_ENGINE_OPTIONS = pool_options(SQLALCHEMY_DATABASE_URI, pool_size=5, max_overflow=5)
     
     # Railway-specific configuration
     # Railway provides PORT environment variable
@@ -61,8 +180,13 @@ class ProductionConfig(Config):
 class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL') or 'sqlite:///:memory:'
+    SQLALCHEMY_ENGINE_OPTIONS = pool_options(SQLALCHEMY_DATABASE_URI, pool_size=2, max_overflow=3)
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=5)
+    # Keep registrations in tests fast
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+    SHARED_CACHE_PATH = 'memory'
+    METRICS_PUBLIC = True
 
 config = {
     'development': DevelopmentConfig,
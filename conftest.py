@@ -0,0 +1,53 @@
+"""
+Pytest fixtures for the in-process API tests
+"""
+import os
+import tempfile
+
+# Must be set before app is imported so TestingConfig is used instead of the
+# DATABASE_URL from .env. A file database (rather than :memory:) gives each
+# thread its own connection, which the concurrency tests rely on; they also
+# queue on SQLite's single writer lock for longer than its default 5s timeout.
+os.environ['FLASK_ENV'] = 'testing'
+_test_db_dir = tempfile.mkdtemp(prefix='nonsocial-tests-')
+os.environ.setdefault('TEST_DATABASE_URL', f"sqlite:///{os.path.join(_test_db_dir, 'test.db')}?timeout=60")
+
+import pytest
+
+# Smoke script that needs a running server, not a pytest module
+collect_ignore = ['test_image_upload.py']
+
+
+@pytest.fixture
+def app():
+    from app import app as flask_app, db, identity_cache, shared_store
+    
+    identity_cache.clear()
+    shared_store.clear()
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+    yield flask_app
+    with flask_app.app_context():
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def register_user(client):
+    """Register a user and return (user dict, auth headers)"""
+    def _register(username='alice'):
+        response = client.post('/api/auth/register', json={
+            'username': username,
+            'email': f'{username}@example.com',
+            'password': 'password123',
+            'displayName': username.title()
+        })
+        assert response.status_code == 201
+        data = response.get_json()
+        return data['user'], {'Authorization': f"Bearer {data['access_token']}"}
+    return _register
@@ -0,0 +1,115 @@
+"""
+Database connection pool settings and statistics.
+
+engine_options() turns the DB_POOL_* settings into SQLALCHEMY_ENGINE_OPTIONS
+for the configured database:
+
+- PostgreSQL: a QueuePool with pre-ping and recycling, so connections the
+  server or a proxy closed while idle are replaced instead of failing the
+  next request.
+- PostgreSQL behind PgBouncer in transaction pooling mode: no pool in the
+  app (NullPool), because PgBouncer already pools and hands out a different
+  server connection per transaction. Server-side prepared statements are
+  turned off for drivers that use them, since they would be prepared on one
+  server connection and executed on another.
+- SQLite: the Flask-SQLAlchemy defaults.
+
+TimedQueuePool records how long checkouts wait for a free connection, which
+pool_stats() reports next to the pool's own counters.
+"""
+import threading
+import time
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import ArgumentError
+from sqlalchemy.pool import NullPool, QueuePool
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that measures the time each checkout spends getting a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._in_get = threading.local()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        # QueuePool._do_get retries by calling itself; time only the outer call
+        if getattr(self._in_get, 'active', False):
+            return super()._do_get()
+        self._in_get.active = True
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            self._in_get.active = False
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+    def wait_stats(self):
+        with self._stats_lock:
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'wait_avg_ms': round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else None,
+                'wait_max_ms': round(self.wait_max * 1000, 3),
+            }
+
+
+def engine_options(database_uri, pool_size=5, max_overflow=5, pool_timeout=10,
+                   pool_recycle=1800, pgbouncer=False):
+    """SQLALCHEMY_ENGINE_OPTIONS for database_uri"""
+    try:
+        url = make_url(database_uri)
+    except ArgumentError:
+        # Every config class is built at import; only the selected one's URL must be valid
+        return {}
+    if url.get_backend_name() != 'postgresql':
+        return {}
+
+    if pgbouncer:
+        options = {'poolclass': NullPool}
+        if url.get_driver_name() == 'psycopg':
+            # psycopg 3 prepares statements server-side after a few executions
+            options['connect_args'] = {'prepare_threshold': None}
+        elif url.get_driver_name() == 'asyncpg':
+            options['connect_args'] = {'statement_cache_size': 0}
+        return options
+
+    return {
+        'poolclass': TimedQueuePool,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': pool_timeout,
+        'pool_recycle': pool_recycle,
+        'pool_pre_ping': True,
+        # Reusing the most recent connection lets the rest idle out server-side
+        'pool_use_lifo': True,
+    }
+
+
+def pool_stats(engine):
+    """Counters of the engine's pool for the detailed health check"""
+    pool = engine.pool
+    stats = {'class': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': pool.overflow(),
+        })
+    if isinstance(pool, TimedQueuePool):
+        stats.update(pool.wait_stats())
+    return stats
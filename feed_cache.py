@@ -0,0 +1,57 @@
+"""
+Cache of feed pages shared by every gunicorn worker on the host.
+
+Only the user-independent part of a page is cached, in the compact shape
+(posts with authorId and like count, an authors map and next_cursor); each
+request adds its own liked state and, for the default format, inlines the
+authors.
+Pages live in the shared store under a generation number. Any write that
+changes what a page shows bumps the generation, which orphans every cached
+page at once; orphans expire through their TTL.
+"""
+import json
+import threading
+
+GENERATION_KEY = 'feed-generation'
+
+
+class FeedCache:
+    def __init__(self, store, ttl=30):
+        self.store = store
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def generation(self):
+        """Read before building a page so a concurrent write can't be cached over"""
+        return int(self.store.get(GENERATION_KEY) or 0)
+
+    @staticmethod
+    def _key(generation, cursor, limit):
+        # The version segment changes whenever the cached page shape does
+        return f"feed:v2:{generation}:{limit}:{cursor or ''}"
+
+    def get(self, generation, cursor, limit):
+        value = self.store.get(self._key(generation, cursor, limit))
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(value)
+
+    def set(self, generation, cursor, limit, page):
+        self.store.set(self._key(generation, cursor, limit), json.dumps(page), ttl=self.ttl)
+
+    def invalidate(self):
+        self.store.incr(GENERATION_KEY)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None
+            }
@@ -0,0 +1,38 @@
+"""
+Gunicorn settings used by the Procfile.
+
+Each worker serves GUNICORN_THREADS requests at once (gthread workers). The
+per-worker caps in the app (password hashing slots, image jobs, the
+connection pool) are sized below that, so a burst of logins or uploads gets
+a 503 instead of taking every thread and stalling the rest of the API.
+
+The workers share /metrics samples through files in PROMETHEUS_MULTIPROC_DIR
+(see metrics.py). The directory is emptied when the server starts, and the
+files of a worker that exits are marked dead so its in-flight and pool
+gauges stop counting.
+"""
+import os
+import shutil
+import tempfile
+
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+# Set before the workers import the app, which picks the storage at import
+multiprocess_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'nonsocial-metrics')
+)
+
+
+def on_starting(server):
+    # Samples left by a previous run would be added to this one's
+    shutil.rmtree(multiprocess_dir, ignore_errors=True)
+    os.makedirs(multiprocess_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid, multiprocess_dir)
@@ -0,0 +1,105 @@
+"""
+Time-ordered UUID primary keys.
+
+New rows get UUIDv7 ids: a 48-bit millisecond timestamp followed by a
+counter and random bits, so ids created close together sort together and
+inserts append to the right edge of every primary key and foreign key index
+instead of landing on random pages.
+
+In the database ids are native UUID columns on PostgreSQL and 16-byte blobs
+elsewhere. Everywhere else, including the API, JWT identities and caches,
+they stay the canonical 36-character string.
+"""
+import os
+import re
+import threading
+import time
+import uuid
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.types import LargeBinary, TypeDecorator
+from werkzeug.routing import BaseConverter
+
+ID_PATTERN = r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}'
+_ID_RE = re.compile(ID_PATTERN)
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def uuid7():
+    """
+    UUIDv7 that is monotonic within this process.
+
+    Ids made in the same millisecond take consecutive values of the 12-bit
+    counter; when it runs out the timestamp is borrowed from the next
+    millisecond, as RFC 9562 allows.
+    """
+    global _last_ms, _counter
+    with _lock:
+        ms = time.time_ns() // 1_000_000
+        if ms > _last_ms:
+            # Random start leaves room for the rest of the millisecond
+            _counter = int.from_bytes(os.urandom(2), 'big') & 0x7FF
+        else:
+            # Same millisecond, or the clock stepped back
+            ms = _last_ms
+            _counter += 1
+            if _counter > 0xFFF:
+                ms += 1
+                _counter = 0
+        _last_ms = ms
+        counter = _counter
+    rand_b = int.from_bytes(os.urandom(8), 'big') & ((1 << 62) - 1)
+    return uuid.UUID(int=(ms << 80) | (0x7 << 76) | (counter << 64) | (0b10 << 62) | rand_b)
+
+
+def new_id():
+    """Default for primary key columns"""
+    return str(uuid7())
+
+
+def is_valid_id(value):
+    return isinstance(value, str) and _ID_RE.fullmatch(value) is not None
+
+
+def normalize_id(value):
+    """Canonical lowercase string form; raises ValueError for anything that isn't a UUID"""
+    if not is_valid_id(value):
+        raise ValueError('Invalid id')
+    return value.lower()
+
+
+class GUID(TypeDecorator):
+    """UUID column: native on PostgreSQL, 16 raw bytes elsewhere, str in Python"""
+    impl = LargeBinary(16)
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(postgresql.UUID(as_uuid=False))
+        return dialect.type_descriptor(LargeBinary(16))
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        value = value if isinstance(value, uuid.UUID) else uuid.UUID(value)
+        if dialect.name == 'postgresql':
+            return str(value)
+        return value.bytes
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if dialect.name == 'postgresql':
+            return str(value)
+        return str(uuid.UUID(bytes=bytes(value)))
+
+
+class IdConverter(BaseConverter):
+    """<id:...> URL segment: a UUID string, normalized; anything else doesn't match the route"""
+    regex = ID_PATTERN
+
+    def to_python(self, value):
+        return value.lower()
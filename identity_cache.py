@@ -0,0 +1,93 @@
+"""
+Per-worker cache of user projections (the dict returned by User.to_dict()).
+
+Entries are bounded by count (LRU) and age (TTL). Each user also has a
+version counter in the shared store; invalidating a user bumps it, so every
+gunicorn worker notices on its next lookup that its copy is stale.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class IdentityCache:
+    def __init__(self, store, max_size=10000, ttl=60):
+        self.store = store
+        self.max_size = max_size
+        self.ttl = ttl
+        # user_id -> (projection, version, expires_at)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _version_key(user_id):
+        return f"identity-version:{user_id}"
+
+    def get_many(self, user_ids, load_many):
+        """
+        Projections for user_ids as {user_id: projection}. Missing or stale
+        entries are fetched together with load_many(ids) -> {user_id: projection};
+        unknown users are left out.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return {}
+        versions = self.store.get_many([self._version_key(user_id) for user_id in user_ids])
+        now = time.time()
+
+        found, missing = {}, []
+        with self._lock:
+            for user_id in user_ids:
+                version = int(versions.get(self._version_key(user_id), 0))
+                entry = self._entries.get(user_id)
+                if entry and entry[1] == version and entry[2] > now:
+                    self._entries.move_to_end(user_id)
+                    found[user_id] = entry[0]
+                    self.hits += 1
+                else:
+                    missing.append((user_id, version))
+                    self.misses += 1
+
+        if missing:
+            loaded = load_many([user_id for user_id, _ in missing])
+            with self._lock:
+                for user_id, version in missing:
+                    if user_id not in loaded:
+                        self._entries.pop(user_id, None)
+                        continue
+                    # Stored with the version read before loading, so a concurrent
+                    # invalidation makes this entry stale rather than hiding it
+                    self._entries[user_id] = (loaded[user_id], version, now + self.ttl)
+                    self._entries.move_to_end(user_id)
+                    found[user_id] = loaded[user_id]
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return found
+
+    def get(self, user_id, load_many):
+        return self.get_many([user_id], load_many).get(user_id)
+
+    def invalidate(self, user_id):
+        """Drop a user here and, through the version bump, in every other worker"""
+        self.store.incr(self._version_key(user_id))
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None
+            }
@@ -0,0 +1,109 @@
+"""
+Bounded background pool for CPU-bound image processing.
+
+Each gunicorn worker gets its own small process pool, created lazily so it is
+never shared across a fork. The number of jobs a worker accepts at once is
+capped; when the cap is reached callers are told to back off instead of
+queueing more work behind the API requests.
+
+Pool processes are started by a forkserver rather than forked from the worker:
+the worker already runs threads (the password hasher pool, the like buffer
+flusher), and a fork taken while one of them holds a lock can deadlock the child.
+
+If a pool process dies (killed for memory, a crash in a decoder) the pool is
+broken: its jobs fail with BrokenProcessPool and the next job starts a new one.
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+def _lower_priority(niceness):
+    # Runs in each pool process so request handling wins the CPU under load
+    if niceness:
+        os.nice(niceness)
+
+
+class ImageJobQueue:
+    def __init__(self, max_workers=1, max_pending=4, niceness=10):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.niceness = niceness
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('forkserver'),
+                    initializer=_lower_priority,
+                    initargs=(self.niceness,)
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def _drop_executor(self, executor):
+        # Only the broken pool is dropped; another thread may have replaced it already
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def reserve(self):
+        """Claim a slot for one job; False when the queue is full"""
+        return self._slots.acquire(blocking=False)
+
+    def release(self):
+        """Give back a slot claimed with reserve() that won't be submitted"""
+        self._slots.release()
+
+    def submit(self, fn, args, on_done):
+        """
+        Run fn(*args) in the pool using a slot claimed with reserve().
+        on_done(future) is called in a background thread of this process.
+        """
+        def done(future):
+            try:
+                if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+                    self._drop_executor(executor)
+                on_done(future)
+            finally:
+                self._slots.release()
+
+        try:
+            executor = self._get_executor()
+            try:
+                future = executor.submit(fn, *args)
+            except BrokenProcessPool:
+                # Broken before its callbacks ran: start over once with a new pool
+                self._drop_executor(executor)
+                executor = self._get_executor()
+                future = executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(done)
+        return future
+
+    def shutdown(self):
+        """Let running jobs finish; called at interpreter exit"""
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+def create_image_job_queue(config):
+    queue = ImageJobQueue(
+        max_workers=config.get('IMAGE_WORKERS', 1),
+        max_pending=config.get('IMAGE_QUEUE_SIZE', 4),
+        niceness=config.get('IMAGE_WORKER_NICE', 10)
+    )
+    atexit.register(queue.shutdown)
+    return queue
@@ -0,0 +1,162 @@
+"""
+Image processing for profile picture uploads.
+
+Every upload is turned into a fixed set of square-bounded sizes in JPEG and
+WebP so clients can fetch the smallest variant that fits the avatar slot.
+"""
+import io
+
+from PIL import Image
+
+# Bounding box sizes in pixels; the largest is the canonical picture
+PROFILE_PICTURE_SIZES = (48, 150, 300)
+DEFAULT_PROFILE_PICTURE_SIZE = max(PROFILE_PICTURE_SIZES)
+
+# Output formats: name -> (Pillow format, content type, save options)
+IMAGE_FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg', {'quality': 85, 'optimize': True}),
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+}
+
+
+# Upper bound on decoded size; a small compressed file can claim huge dimensions
+MAX_IMAGE_PIXELS = 40_000_000
+
+# Pillow format reported for each allowed upload extension
+EXTENSION_FORMATS = {
+    'jpg': 'JPEG',
+    'jpeg': 'JPEG',
+    'png': 'PNG',
+    'gif': 'GIF',
+    'webp': 'WEBP',
+}
+
+class ImageRejected(ValueError):
+    """Upload refused from its header, before any pixel data is decoded"""
+
+
+def content_type_for(fmt):
+    return IMAGE_FORMATS[fmt][1]
+
+
+def variant_key(key, size, fmt):
+    """
+    Store key of one variant of a picture.
+
+    key is the content hash of the canonical (largest JPEG) variant, which is
+    stored under the key itself so pictures uploaded before variants existed
+    keep working.
+    """
+    if size == DEFAULT_PROFILE_PICTURE_SIZE and fmt == 'jpeg':
+        return key
+    return f"{key}-{size}-{fmt}"
+
+
+def pick_size(requested):
+    """Smallest generated size that is at least the requested one"""
+    for size in sorted(PROFILE_PICTURE_SIZES):
+        if size >= requested:
+            return size
+    return DEFAULT_PROFILE_PICTURE_SIZE
+
+
+def base_format(img):
+    """
+    Pillow format of an opened image, with multi-picture JPEGs (MPO: HDR and
+    gain-map photos from phones, many camera files) reported as the JPEG they
+    start with; only that first picture is used
+    """
+    return 'JPEG' if img.format == 'MPO' else img.format
+
+
+def inspect_image(file, extension=None, max_pixels=MAX_IMAGE_PIXELS):
+    """
+    Open an upload and validate it from the header alone.
+
+    Raises ImageRejected when the real format doesn't match the extension,
+    the image is animated, or its dimensions exceed max_pixels. Returns the
+    lazily opened image; nothing has been decoded yet.
+    """
+    if Image.MAX_IMAGE_PIXELS is not None and max_pixels > Image.MAX_IMAGE_PIXELS:
+        # Pillow's decompression-bomb guard would refuse images the configuration
+        # allows; it is raised to the configured cap, never switched off
+        Image.MAX_IMAGE_PIXELS = max_pixels
+    try:
+        img = Image.open(file)
+    except Image.DecompressionBombError:
+        raise ImageRejected('Image dimensions are too large')
+    except Exception:
+        raise ImageRejected('File is not a supported image')
+
+    image_format = base_format(img)
+    if image_format not in set(EXTENSION_FORMATS.values()):
+        raise ImageRejected('File is not a supported image')
+    if extension and EXTENSION_FORMATS.get(extension.lower()) != image_format:
+        raise ImageRejected('File contents do not match its extension')
+
+    width, height = img.size
+    if width * height > max_pixels:
+        raise ImageRejected('Image dimensions are too large')
+
+    # The extra pictures of an MPO are other views of the photo, not animation
+    if img.format != 'MPO' and getattr(img, 'is_animated', False):
+        raise ImageRejected('Animated images are not supported')
+
+    return img
+
+
+def _to_rgb(img):
+    # Flatten transparency onto white; JPEG has no alpha channel
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[-1])
+        return background
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+
+def _encode(img, fmt):
+    pil_format, _, options = IMAGE_FORMATS[fmt]
+    buffer = io.BytesIO()
+    img.save(buffer, format=pil_format, **options)
+    return buffer.getvalue()
+
+
+def generate_variants(file, extension=None, max_pixels=MAX_IMAGE_PIXELS):
+    """
+    Decode an uploaded image and encode every size/format variant.
+
+    Returns {(size, fmt): bytes}. JPEGs are decoded with DCT scaling straight
+    to the smallest power-of-two reduction that still covers the largest
+    variant, and other formats are shrunk before any colour conversion, so the
+    full-resolution bitmap is never materialised in RGB. Smaller sizes are
+    downscaled from the largest one.
+    """
+    img = inspect_image(file, extension, max_pixels)
+    largest = DEFAULT_PROFILE_PICTURE_SIZE
+
+    if base_format(img) == 'JPEG':
+        img.draft('RGB', (largest, largest))
+
+    # Palette and 1-bit images must be expanded before resampling, which works
+    # on real colours. Picking pixels (NEAREST) works on them directly, so they
+    # are first cut down to twice the largest variant, which LANCZOS then smooths
+    if img.mode in ('P', '1'):
+        img.thumbnail((2 * largest, 2 * largest), Image.Resampling.NEAREST)
+        img = _to_rgb(img)
+
+    variants = {}
+    for size in sorted(PROFILE_PICTURE_SIZES, reverse=True):
+        # Each size is encoded before the next, smaller one is made in place
+        img.thumbnail((size, size), Image.Resampling.LANCZOS)
+        img = _to_rgb(img)
+        for fmt in IMAGE_FORMATS:
+            variants[(size, fmt)] = _encode(img, fmt)
+    return variants
+
+
+def generate_variants_from_bytes(data, extension=None, max_pixels=MAX_IMAGE_PIXELS):
+    """generate_variants for raw upload bytes; picklable entry point for the process pool"""
+    return generate_variants(io.BytesIO(data), extension, max_pixels)
@@ -0,0 +1,143 @@
+"""
+Storage backends for uploaded images.
+
+Images are content-addressed: the key is the SHA-256 of the bytes, so the same
+image uploaded twice is stored once. The backend is selected with the
+IMAGE_STORAGE config value ('database' or 'filesystem').
+"""
+import hashlib
+import os
+import tempfile
+
+from flask import Response, send_file
+
+# File extension used on disk for each content type we store
+EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/webp': '.webp',
+}
+
+
+def content_key(data):
+    """Content address of an image"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class DatabaseImageStore:
+    """Keeps image bytes in the image_blobs table"""
+    name = 'database'
+
+    def __init__(self, db, model):
+        self.db = db
+        self.model = model
+
+    def put(self, key, data, content_type='image/jpeg'):
+        if not self.exists(key, content_type):
+            self.db.session.add(self.model(key=key, content_type=content_type, data=data))
+
+    def exists(self, key, content_type='image/jpeg'):
+        return self.db.session.query(self.model.key).filter_by(key=key).first() is not None
+
+    def delete(self, key):
+        self.model.query.filter_by(key=key).delete()
+
+    def read(self, key, content_type='image/jpeg'):
+        blob = self.db.session.get(self.model, key)
+        return blob.data if blob else None
+
+    def response(self, key, content_type='image/jpeg'):
+        blob = self.db.session.get(self.model, key)
+        if not blob:
+            return None
+        return Response(blob.data, mimetype=blob.content_type)
+
+
+class FilesystemImageStore:
+    """
+    Keeps image bytes in a content-addressed file tree under root:
+    root/ab/cd/abcd....jpg
+
+    Responses are served without reading the file in Python: by default through
+    send_file (which gunicorn turns into sendfile(2)), or by handing the path to
+    the front-end server with X-Sendfile (Apache/lighttpd) or
+    X-Accel-Redirect (nginx).
+    """
+    name = 'filesystem'
+
+    def __init__(self, root, sendfile_mode='', accel_redirect_prefix='/protected-images'):
+        self.root = root
+        self.sendfile_mode = (sendfile_mode or '').lower()
+        self.accel_redirect_prefix = accel_redirect_prefix.rstrip('/')
+
+    def relative_path(self, key, content_type='image/jpeg'):
+        return os.path.join(key[:2], key[2:4], key + EXTENSIONS.get(content_type, ''))
+
+    def path(self, key, content_type='image/jpeg'):
+        return os.path.join(self.root, self.relative_path(key, content_type))
+
+    def put(self, key, data, content_type='image/jpeg'):
+        path = self.path(key, content_type)
+        if os.path.exists(path):
+            return
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Write to a temp file and rename so readers never see a partial image
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def exists(self, key, content_type='image/jpeg'):
+        return os.path.exists(self.path(key, content_type))
+
+    def delete(self, key):
+        for content_type in EXTENSIONS:
+            path = self.path(key, content_type)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def read(self, key, content_type='image/jpeg'):
+        try:
+            with open(self.path(key, content_type), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def response(self, key, content_type='image/jpeg'):
+        path = self.path(key, content_type)
+        if not os.path.exists(path):
+            return None
+
+        if self.sendfile_mode == 'x-accel-redirect':
+            response = Response(mimetype=content_type)
+            relative = self.relative_path(key, content_type).replace(os.sep, '/')
+            response.headers['X-Accel-Redirect'] = f"{self.accel_redirect_prefix}/{relative}"
+            return response
+
+        if self.sendfile_mode == 'x-sendfile':
+            response = Response(mimetype=content_type)
+            response.headers['X-Sendfile'] = os.path.abspath(path)
+            return response
+
+        # Caching headers are set by the caller from the content key
+        return send_file(path, mimetype=content_type, conditional=False, etag=False,
+                         max_age=None)
+
+
+def create_image_store(config, db, model):
+    """Build the backend named by config['IMAGE_STORAGE']"""
+    storage = config.get('IMAGE_STORAGE', 'database')
+    if storage == 'filesystem':
+        return FilesystemImageStore(
+            config['UPLOAD_FOLDER'],
+            sendfile_mode=config.get('IMAGE_SENDFILE_MODE', ''),
+            accel_redirect_prefix=config.get('IMAGE_ACCEL_REDIRECT_PREFIX', '/protected-images')
+        )
+    if storage == 'database':
+        return DatabaseImageStore(db, model)
+    raise ValueError(f"Unknown IMAGE_STORAGE: {storage}")
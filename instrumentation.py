@@ -0,0 +1,171 @@
+"""
+Per-request timing instrumentation.
+
+When enabled, every request records:
+
+- how many SQL statements it ran and how long they took, from SQLAlchemy's
+  cursor events on the primary and replica engines
+- time spent in named phases: 'auth' (password hashing), 'image' (checking
+  and resizing uploads) and 'serialize' (encoding JSON responses)
+
+With SERVER_TIMING_ENABLED the numbers are sent in a Server-Timing header,
+which browser dev tools show next to the request. Requests slower than
+SLOW_REQUEST_MS and statements slower than SLOW_QUERY_MS are logged as
+warnings; a threshold of 0 turns that log off.
+
+Disabled, no hooks or listeners are installed, phase() hands back a shared
+no-op context manager and timed() returns the function it was given.
+"""
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+from flask import request
+from sqlalchemy import event
+
+NO_PHASE = nullcontext()
+
+
+class RequestTimings:
+    """What one request spent where; times are in seconds"""
+
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.status = None
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.phases = {}
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+class Phase:
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timings.add(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class Instrumentation:
+    def __init__(self, enabled=False, server_timing=False, slow_request_ms=500, slow_query_ms=100):
+        self.enabled = enabled
+        self.server_timing = server_timing
+        self.slow_request_ms = slow_request_ms
+        self.slow_query_ms = slow_query_ms
+        self.logger = None
+        self._local = threading.local()
+
+    def init_app(self, app, engines):
+        """Install the request hooks and SQL listeners; nothing when disabled"""
+        self.logger = app.logger
+        if not self.enabled:
+            return
+        app.before_request(self._begin_request)
+        app.after_request(self._end_response)
+        app.teardown_request(self._teardown_request)
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def current(self):
+        """Timings of the request running on this thread, or None"""
+        return getattr(self._local, 'timings', None)
+
+    def phase(self, name):
+        """Context manager adding its duration to the current request's phase"""
+        if not self.enabled:
+            return NO_PHASE
+        timings = self.current()
+        if timings is None:
+            # Background threads and scripts aren't measured
+            return NO_PHASE
+        return Phase(timings, name)
+
+    def timed(self, name, func):
+        """func wrapped in phase(name), or func itself when disabled"""
+        if not self.enabled:
+            return func
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def _begin_request(self):
+        self._local.timings = RequestTimings(request.method, request.full_path.rstrip('?'))
+
+    def _end_response(self, response):
+        timings = self.current()
+        if timings is None:
+            return response
+        timings.status = response.status_code
+        if self.server_timing:
+            response.headers['Server-Timing'] = self.server_timing_header(timings)
+        return response
+
+    def _teardown_request(self, exc):
+        # Runs after a streamed body is fully sent, so streams are timed whole
+        timings = self.current()
+        self._local.timings = None
+        if timings is None:
+            return
+        elapsed_ms = timings.elapsed() * 1000
+        if self.slow_request_ms and elapsed_ms >= self.slow_request_ms:
+            phases = ''.join(f", {name} {seconds * 1000:.1f}ms" for name, seconds in sorted(timings.phases.items()))
+            self.logger.warning(
+                'Slow request: %s %s %s %.1fms, %d queries %.1fms%s',
+                timings.method, timings.path, timings.status or 500, elapsed_ms,
+                timings.sql_count, timings.sql_time * 1000, phases
+            )
+
+    def server_timing_header(self, timings):
+        metrics = [f'db;dur={timings.sql_time * 1000:.1f};desc="{timings.sql_count} queries"']
+        metrics.extend(f'{name};dur={seconds * 1000:.1f}' for name, seconds in sorted(timings.phases.items()))
+        metrics.append(f'total;dur={timings.elapsed() * 1000:.1f}')
+        return ', '.join(metrics)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info['query_started'] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop('query_started', None)
+        if started is None:
+            return
+        seconds = time.perf_counter() - started
+        timings = self.current()
+        if timings is not None:
+            timings.sql_count += 1
+            timings.sql_time += seconds
+        if self.slow_query_ms and seconds * 1000 >= self.slow_query_ms:
+            # Parameters are left out; they can hold user data
+            self.logger.warning(
+                'Slow query (%.1fms)%s: %s', seconds * 1000,
+                f" in {timings.method} {timings.path}" if timings is not None else '',
+                ' '.join(statement.split())[:500]
+            )
+
+
+def create_instrumentation(config):
+    server_timing = config.get('SERVER_TIMING_ENABLED', False)
+    return Instrumentation(
+        # Server-Timing needs the measurements, so it turns them on too
+        enabled=config.get('INSTRUMENTATION_ENABLED', False) or server_timing,
+        server_timing=server_timing,
+        slow_request_ms=config.get('SLOW_REQUEST_MS', 500),
+        slow_query_ms=config.get('SLOW_QUERY_MS', 100)
+    )
@@ -0,0 +1,73 @@
+"""
+JSON serialization for API responses.
+
+orjson encodes straight to UTF-8 bytes several times faster than the standard
+library. It is optional: JSON_ENCODER 'auto' uses it when it is installed and
+falls back to Flask's stdlib provider otherwise. Anything orjson can't encode
+(integers beyond 64 bits, unusual dump options) goes through the stdlib path,
+so both providers accept the same values.
+"""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+class StdlibJSONProvider(DefaultJSONProvider):
+    name = 'stdlib'
+
+    def dumps_bytes(self, obj, **kwargs):
+        return self.dumps(obj, **kwargs).encode('utf-8')
+
+
+class OrjsonJSONProvider(DefaultJSONProvider):
+    name = 'orjson'
+
+    def _options(self, indent=None, separators=None, **kwargs):
+        # None when the call needs an option only the stdlib encoder has
+        if kwargs:
+            return None
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps_bytes(self, obj, **kwargs):
+        options = self._options(**kwargs)
+        if options is not None:
+            try:
+                # Datetimes are passed through so they keep Flask's HTTP date format
+                return orjson.dumps(obj, default=self.default, option=options)
+            except orjson.JSONEncodeError:
+                pass
+        return super().dumps(obj, **kwargs).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        return self.dumps_bytes(obj, **kwargs).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(
+            self.dumps_bytes(obj, indent=2 if indent else None) + b"\n",
+            mimetype=self.mimetype
+        )
+
+
+def create_json_provider(app):
+    """JSON_ENCODER is 'auto', 'orjson' or 'stdlib'"""
+    choice = app.config.get('JSON_ENCODER', 'auto')
+    if choice == 'orjson' and orjson is None:
+        raise RuntimeError("JSON_ENCODER is 'orjson' but orjson is not installed")
+    if choice in ('auto', 'orjson') and orjson is not None:
+        return OrjsonJSONProvider(app)
+    return StdlibJSONProvider(app)
@@ -0,0 +1,175 @@
+"""
+Write-behind buffer for post likes.
+
+Toggles are recorded in memory and written to the database in batches by a
+background thread every LIKE_FLUSH_INTERVAL seconds. Repeated toggles by the
+same user on the same post collapse into one desired state, and a pair that
+returns to the stored state is dropped without touching the database.
+
+The buffer is per process, so another gunicorn worker sees a toggle only
+after it has been flushed; the flush interval is the durability window.
+
+A batch that fails with one of transient_errors (a lost connection, a lock
+timeout) stays buffered and is retried at the next interval. Any other
+failure is retried once; if the batch fails again it is written row by row,
+and rows that still fail are logged and dropped rather than blocking the
+buffer for good.
+"""
+import atexit
+import logging
+import os
+import threading
+
+
+class LikeBuffer:
+    def __init__(self, load_state, persist, interval=0.5, max_pending=1000,
+                 transient_errors=(), logger=None):
+        """
+        load_state(user_id, post_id) -> (liked, likes) from the database, or None
+        when the post doesn't exist.
+        persist({(user_id, post_id): liked}) writes desired states in one
+        transaction and raises on failure.
+        """
+        self.load_state = load_state
+        self.persist = persist
+        self.interval = interval
+        self.max_pending = max_pending
+        self.transient_errors = tuple(transient_errors)
+        self.logger = logger or logging.getLogger(__name__)
+        # Set after a batch failed with a non-transient error
+        self._failed_once = False
+        # (user_id, post_id) -> desired liked state
+        self._pending = {}
+        # (user_id, post_id) -> liked state in the database when first buffered
+        self._stored = {}
+        # post_id -> like count change the pending states will cause
+        self._deltas = {}
+        # Held while reading database state and while flushing, so a toggle
+        # never combines a pre-flush read with post-flush buffer contents
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_started(self):
+        # Started lazily so each forked worker runs its own flusher
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='like-buffer-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                self.logger.exception('Error flushing like buffer')
+
+    def _contribution(self, key):
+        if key not in self._pending:
+            return 0
+        return int(self._pending[key]) - int(self._stored[key])
+
+    def toggle(self, user_id, post_id):
+        """Flip a like; returns (is_liked, likes) as callers will see them, or None"""
+        key = (user_id, post_id)
+        with self._lock:
+            self._ensure_started()
+            state = self.load_state(user_id, post_id)
+            if state is None:
+                return None
+            stored_liked, stored_likes = state
+
+            current = self._pending.get(key, stored_liked)
+            desired = not current
+
+            self._deltas[post_id] = self._deltas.get(post_id, 0) - self._contribution(key)
+            if desired == stored_liked:
+                # Back to what the database already has: nothing to write
+                self._pending.pop(key, None)
+                self._stored.pop(key, None)
+            else:
+                self._pending[key] = desired
+                self._stored[key] = stored_liked
+            self._deltas[post_id] += self._contribution(key)
+
+            likes = stored_likes + self._deltas[post_id]
+            if not self._deltas[post_id]:
+                del self._deltas[post_id]
+
+            if len(self._pending) >= self.max_pending:
+                try:
+                    self.flush()
+                except Exception:
+                    # The toggle itself is buffered; the batch is retried later
+                    self.logger.exception('Error flushing like buffer')
+
+        return desired, likes
+
+    def overlay(self, user_id, post_id, liked, likes):
+        """Adjust database values for a post with this process's unflushed toggles"""
+        with self._lock:
+            liked = self._pending.get((user_id, post_id), liked)
+            return liked, likes + self._deltas.get(post_id, 0)
+
+    def _forget(self, key):
+        post_id = key[1]
+        self._deltas[post_id] = self._deltas.get(post_id, 0) - self._contribution(key)
+        if not self._deltas[post_id]:
+            del self._deltas[post_id]
+        self._pending.pop(key, None)
+        self._stored.pop(key, None)
+
+    def _persist_each(self):
+        # Rows written before a transient error are already gone from the buffer
+        for key, liked in list(self._pending.items()):
+            try:
+                self.persist({key: liked})
+            except self.transient_errors:
+                raise
+            except Exception:
+                self.logger.exception(f"Dropping buffered like {key} that can't be written")
+            self._forget(key)
+
+    def flush(self):
+        """
+        Write every pending state in one batch; returns how many left the buffer.
+        On failure they stay buffered (see the module docstring)
+        """
+        with self._lock:
+            if not self._pending:
+                return 0
+            flushed = len(self._pending)
+            try:
+                self.persist(dict(self._pending))
+            except self.transient_errors:
+                raise
+            except Exception:
+                if not self._failed_once:
+                    self._failed_once = True
+                    raise
+                self._persist_each()
+            self._failed_once = False
+            self._pending.clear()
+            self._stored.clear()
+            self._deltas.clear()
+            return flushed
+
+    def stop(self):
+        """Stop the flusher and write whatever is still buffered"""
+        self._stop.set()
+        self.flush()
+
+
+def create_like_buffer(config, load_state, persist, transient_errors=(), logger=None):
+    buffer = LikeBuffer(
+        load_state,
+        persist,
+        interval=config.get('LIKE_FLUSH_INTERVAL', 0.5),
+        max_pending=config.get('LIKE_BUFFER_MAX_PENDING', 1000),
+        transient_errors=transient_errors,
+        logger=logger
+    )
+    atexit.register(buffer.stop)
+    return buffer
@@ -0,0 +1,167 @@
+"""
+Prometheus metrics served at /metrics.
+
+- http_requests_total{method, endpoint, status}
+- http_request_duration_seconds{method, endpoint}: histogram; streamed
+  responses are timed until their last chunk
+- http_requests_in_flight{endpoint}
+- db_pool_size / db_pool_connections_in_use{engine}: configured pool size
+  and checked out connections of the primary and each replica
+- image_processing_seconds{mode}: resizing a profile picture; for 'async'
+  the time from queueing the job to its result
+
+Under gunicorn each worker is its own process. When PROMETHEUS_MULTIPROC_DIR
+is set (gunicorn.conf.py does this) the workers write their samples to files
+in that directory and every scrape adds them all up, whichever worker answers
+it. Without it the numbers are those of the current process.
+
+The numbers show routes, latencies and pool sizes, so they aren't served to
+anyone by default: create_metrics only turns them on with a METRICS_TOKEN or
+an explicit METRICS_PUBLIC. Without that, without the prometheus_client
+package, or with METRICS_ENABLED off, there is no /metrics route and every
+hook is a no-op.
+"""
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+from flask import Response, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+    )
+except ImportError:  # pragma: no cover - optional dependency
+    CollectorRegistry = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+IMAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+
+NO_TIMER = nullcontext()
+
+
+class Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+class Metrics:
+    def __init__(self, enabled=False, token=None):
+        self.enabled = enabled
+        self.token = token
+        self._local = threading.local()
+        if not enabled:
+            return
+
+        self.multiprocess_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+        if self.multiprocess_dir:
+            os.makedirs(self.multiprocess_dir, exist_ok=True)
+        self.registry = CollectorRegistry()
+        self.requests = Counter(
+            'http_requests_total', 'HTTP requests', ['method', 'endpoint', 'status'], registry=self.registry
+        )
+        self.latency = Histogram(
+            'http_request_duration_seconds', 'HTTP request latency', ['method', 'endpoint'],
+            buckets=LATENCY_BUCKETS, registry=self.registry
+        )
+        # 'livesum' adds up the workers that are alive and drops dead ones
+        self.in_flight = Gauge(
+            'http_requests_in_flight', 'HTTP requests being handled', ['endpoint'],
+            multiprocess_mode='livesum', registry=self.registry
+        )
+        self.pool_size = Gauge(
+            'db_pool_size', 'Configured connection pool size', ['engine'],
+            multiprocess_mode='livesum', registry=self.registry
+        )
+        self.pool_in_use = Gauge(
+            'db_pool_connections_in_use', 'Checked out database connections', ['engine'],
+            multiprocess_mode='livesum', registry=self.registry
+        )
+        self.image_processing = Histogram(
+            'image_processing_seconds', 'Profile picture processing time', ['mode'],
+            buckets=IMAGE_BUCKETS, registry=self.registry
+        )
+
+    def init_app(self, app, engines):
+        """Add the request hooks and /metrics; engines maps a label to an engine"""
+        if not self.enabled:
+            return
+        app.before_request(self._begin_request)
+        app.after_request(self._end_response)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule('/metrics', 'metrics', self.view)
+        for label, engine in engines.items():
+            self._watch_pool(label, engine)
+
+    def _watch_pool(self, label, engine):
+        if isinstance(engine.pool, QueuePool):
+            self.pool_size.labels(label).set(engine.pool.size())
+        in_use = self.pool_in_use.labels(label)
+        event.listen(engine, 'checkout', lambda *args: in_use.inc())
+        event.listen(engine, 'checkin', lambda *args: in_use.dec())
+
+    def image_timer(self, mode):
+        """Context manager timing one picture's processing"""
+        if not self.enabled:
+            return NO_TIMER
+        return Timer(self.image_processing.labels(mode))
+
+    def observe_image(self, mode, seconds):
+        if self.enabled:
+            self.image_processing.labels(mode).observe(seconds)
+
+    def _begin_request(self):
+        # Unmatched URLs share one label so scanners can't add series
+        endpoint = request.endpoint or 'unmatched'
+        self._local.request = (request.method, endpoint, time.perf_counter())
+        self._local.status = None
+        self.in_flight.labels(endpoint).inc()
+
+    def _end_response(self, response):
+        self._local.status = response.status_code
+        return response
+
+    def _teardown_request(self, exc):
+        # Runs after a streamed body is fully sent
+        started = getattr(self._local, 'request', None)
+        if started is None:
+            return
+        self._local.request = None
+        method, endpoint, started_at = started
+        status = self._local.status or 500
+        self.in_flight.labels(endpoint).dec()
+        self.requests.labels(method, endpoint, str(status)).inc()
+        self.latency.labels(method, endpoint).observe(time.perf_counter() - started_at)
+
+    def render(self):
+        """Metrics in the Prometheus text format, summed over all workers"""
+        registry = self.registry
+        if self.multiprocess_dir:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry, path=self.multiprocess_dir)
+        return generate_latest(registry)
+
+    def view(self):
+        if self.token and request.headers.get('Authorization') != f'Bearer {self.token}':
+            return jsonify({'error': 'Unauthorized'}), 401
+        return Response(self.render(), headers={'Content-Type': CONTENT_TYPE_LATEST})
+
+
+def create_metrics(config):
+    token = config.get('METRICS_TOKEN') or None
+    return Metrics(
+        enabled=(config.get('METRICS_ENABLED', True) and CollectorRegistry is not None
+                 and (token is not None or config.get('METRICS_PUBLIC', False))),
+        token=token
+    )
@@ -1,88 +1,62 @@
 #!/usr/bin/env python3
 """
-Database migration script to add profile_picture_data column to users table
+Brings an existing database up to date by applying the pending versioned
+migrations from migrations.py.
+
+Usage:
+    python migrate_database.py            # apply every pending migration
+    python migrate_database.py --to 6     # apply up to version 6
+    python migrate_database.py --status   # list applied and pending migrations
 """
 
+import argparse
 import sys
 import os
 sys.path.insert(0, os.path.dirname(__file__))
 
 from app import app, db
-import sqlite3
+from migrations import MIGRATIONS, applied_versions, create_tables, run_migrations
+
+
+def print_status():
+    applied = applied_versions(db.engine)
+    for m in MIGRATIONS:
+        mark = '✓' if m.version in applied else '…'
+        print(f"{mark} {m.version:04d} {m.name}: {m.description}")
+
 
-def migrate_database():
-    """Add profile_picture_data column to existing users table"""
-    
+def migrate_database(target=None):
+    """Apply pending migrations; returns True on success"""
     with app.app_context():
         try:
-            # Check if using SQLite (local development)
-            db_uri = app.config['SQLALCHEMY_DATABASE_URI']
-            
-            if db_uri.startswith('sqlite'):
-                print("🔧 Migrating SQLite database...")
-                
-                # Get the database file path
-                db_path = db_uri.replace('sqlite:///', '')
-                
-                # Connect to SQLite directly to add column
-                conn = sqlite3.connect(db_path)
-                cursor = conn.cursor()
-                
-                # Check if column already exists
-                cursor.execute("PRAGMA table_info(users)")
-                columns = [row[1] for row in cursor.fetchall()]
-                
-                if 'profile_picture_data' not in columns:
-                    print("➕ Adding profile_picture_data column...")
-                    cursor.execute("ALTER TABLE users ADD COLUMN profile_picture_data TEXT")
-                    conn.commit()
-                    print("✓ Column added successfully")
-                else:
-                    print("✓ Column already exists")
-                
-                conn.close()
-                
+            print(f"🔧 Migrating {db.engine.dialect.name} database...")
+            applied = run_migrations(db.engine, target)
+            # Tables that had to wait for the migrations (see create_tables)
+            create_tables(db.metadata, db.engine)
+            if applied:
+                print(f"✅ Applied {len(applied)} migration(s)")
             else:
-                print("🔧 Migrating PostgreSQL database...")
-                
-                # For PostgreSQL, use SQLAlchemy text() for raw SQL
-                from sqlalchemy import text
-                
-                with db.engine.connect() as conn:
-                    # Check if column exists
-                    result = conn.execute(text("""
-                        SELECT column_name 
-                        FROM information_schema.columns 
-                        WHERE table_name = 'users' AND column_name = 'profile_picture_data'
-                    """))
-                    
-                    if not result.fetchone():
-                        print("➕ Adding profile_picture_data column...")
-                        conn.execute(text("ALTER TABLE users ADD COLUMN profile_picture_data TEXT"))
-                        conn.commit()
-                        print("✓ Column added successfully")
-                    else:
-                        print("✓ Column already exists")
-            
-            print("✅ Database migration completed successfully!")
+                print("✓ Database is already up to date")
             return True
-            
+
         except Exception as e:
             print(f"❌ Migration failed: {e}")
             import traceback
             traceback.print_exc()
             return False
 
+
 if __name__ == "__main__":
-    print("=== Database Migration: Add profile_picture_data column ===")
-    success = migrate_database()
-    
-    if success:
-        print("\n🎉 Migration successful! You can now use database storage for profile pictures.")
-        print("\nNext steps:")
-        print("1. Restart your Flask application")
-        print("2. Test profile picture upload functionality")
-        print("3. Deploy to Railway with the updated schema")
-    else:
+    parser = argparse.ArgumentParser(description='Apply versioned database migrations')
+    parser.add_argument('--to', type=int, default=None, help='Stop after this migration version')
+    parser.add_argument('--status', action='store_true', help='List migrations and exit')
+    args = parser.parse_args()
+
+    if args.status:
+        with app.app_context():
+            print_status()
+        sys.exit(0)
+
+    if not migrate_database(args.to):
         print("\n💥 Migration failed. Please check the error messages above.")
         sys.exit(1)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Move images stored in the image_blobs table (IMAGE_STORAGE=database) into the
+content-addressed file tree under UPLOAD_FOLDER (IMAGE_STORAGE=filesystem).
+
+Keys don't change, so users keep pointing at the same pictures. Safe to re-run.
+
+    python migrate_images.py                # 1. copy the blobs to disk
+    # 2. set IMAGE_STORAGE=filesystem and restart the app
+    python migrate_images.py --delete-rows  # 3. drop the rows it no longer reads
+
+The rows stay in place until step 3, because the app keeps serving pictures
+from image_blobs until it is switched over.
+"""
+import argparse
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from app import app, db, ImageBlob, ensure_upload_directory
+from image_store import FilesystemImageStore
+
+
+def migrate_images(batch_size=100, delete_rows=False):
+    """Copy every blob to disk; with delete_rows, delete each row once its file is written"""
+    with app.app_context():
+        if delete_rows and app.config['IMAGE_STORAGE'] != 'filesystem':
+            print("❌ Set IMAGE_STORAGE=filesystem before deleting rows; the app still serves them")
+            return False
+        if not ensure_upload_directory():
+            print("❌ Upload directory is not writable")
+            return False
+
+        store = FilesystemImageStore(app.config['UPLOAD_FOLDER'])
+        print(f"🔧 Moving image blobs into {store.root}...")
+
+        moved = 0
+        last_key = ''
+        while True:
+            # Walk the keys in order and load one batch of blobs at a time
+            batch = (ImageBlob.query
+                     .filter(ImageBlob.key > last_key)
+                     .order_by(ImageBlob.key)
+                     .limit(batch_size)
+                     .all())
+            if not batch:
+                break
+
+            for blob in batch:
+                store.put(blob.key, blob.data, blob.content_type)
+                if delete_rows:
+                    db.session.delete(blob)
+            last_key = batch[-1].key
+            db.session.commit()
+            db.session.expunge_all()
+
+            moved += len(batch)
+            print(f"✓ {moved} images moved")
+
+        print(f"✅ Done: {moved} images in the filesystem store")
+        return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--delete-rows', action='store_true',
+                        help='also delete the image_blobs rows; run after switching IMAGE_STORAGE')
+    args = parser.parse_args()
+
+    if not migrate_images(args.batch_size, args.delete_rows):
+        sys.exit(1)
@@ -0,0 +1,316 @@
+"""
+Versioned schema migrations for SQLite and PostgreSQL.
+
+Each migration has a version number and runs once per database; applied
+versions are recorded in the schema_migrations table. New tables come from
+create_tables() at app startup and after each migrate_database.py run, so
+migrations only change existing ones, and every migration is written to be
+harmless on a database that create_all made from the current models, or on
+one where a table they touch doesn't exist yet.
+
+Index migrations run outside a transaction so PostgreSQL can build them with
+CREATE INDEX CONCURRENTLY, which doesn't block writes to the table. A
+concurrent build that fails leaves an invalid index behind; create_index
+drops it before trying again.
+"""
+import base64
+import hashlib
+import uuid
+
+from sqlalchemy import Uuid, inspect, text
+
+# Key of the PostgreSQL advisory lock that keeps two runners from overlapping
+MIGRATION_LOCK_KEY = 727_001
+
+MIGRATIONS = []
+
+
+class Migration:
+    def __init__(self, version, name, description, apply, transactional):
+        self.version = version
+        self.name = name
+        self.description = description
+        self.apply = apply
+        self.transactional = transactional
+
+
+def migration(version, transactional=True):
+    """Register fn(conn) as migration number version"""
+    def register(fn):
+        if any(existing.version == version for existing in MIGRATIONS):
+            raise ValueError(f'Duplicate migration version {version}')
+        description = (fn.__doc__ or fn.__name__).strip().splitlines()[0]
+        MIGRATIONS.append(Migration(version, fn.__name__, description, fn, transactional))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return fn
+    return register
+
+
+def table_exists(conn, table):
+    return inspect(conn).has_table(table)
+
+
+def column_exists(conn, table, column):
+    return column in [c['name'] for c in inspect(conn).get_columns(table)]
+
+
+def create_index(conn, name, table, columns):
+    """CREATE INDEX IF NOT EXISTS, concurrently on PostgreSQL (needs an autocommit connection)"""
+    column_list = ', '.join(columns)
+    if conn.dialect.name == 'postgresql':
+        invalid = conn.execute(text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ), {'name': name}).first()
+        if invalid:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({column_list})"))
+    else:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({column_list})"))
+
+
+@migration(1)
+def add_profile_picture_hash_column(conn):
+    """Add users.profile_picture_hash, the key of the uploaded picture"""
+    if not column_exists(conn, 'users', 'profile_picture_hash'):
+        conn.execute(text("ALTER TABLE users ADD COLUMN profile_picture_hash VARCHAR(64)"))
+
+
+@migration(2)
+def widen_image_blob_key(conn):
+    """Widen image_blobs.key for the size/format suffix of variant keys"""
+    # SQLite doesn't enforce VARCHAR lengths
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text("ALTER TABLE image_blobs ALTER COLUMN key TYPE VARCHAR(80)"))
+
+
+@migration(3)
+def widen_password_hash(conn):
+    """Widen users.password_hash for longer methods such as scrypt"""
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text("ALTER TABLE users ALTER COLUMN password_hash TYPE VARCHAR(255)"))
+
+
+@migration(4)
+def move_profile_pictures_to_blobs(conn):
+    """Move legacy base64 users.profile_picture_data into image_blobs"""
+    if not column_exists(conn, 'users', 'profile_picture_data'):
+        return
+
+    rows = conn.execute(text(
+        "SELECT id, profile_picture_data FROM users WHERE profile_picture_data IS NOT NULL"
+    )).fetchall()
+    for user_id, encoded in rows:
+        if encoded.startswith('data:'):
+            encoded = encoded.split(',', 1)[1]
+        data = base64.b64decode(encoded)
+        key = hashlib.sha256(data).hexdigest()
+
+        exists = conn.execute(text("SELECT 1 FROM image_blobs WHERE key = :key"), {'key': key}).first()
+        if not exists:
+            conn.execute(
+                text("INSERT INTO image_blobs (key, content_type, data, created_at) "
+                     "VALUES (:key, 'image/jpeg', :data, CURRENT_TIMESTAMP)"),
+                {'key': key, 'data': data}
+            )
+        conn.execute(
+            text("UPDATE users SET profile_picture_hash = :key, profile_picture_data = NULL WHERE id = :id"),
+            {'key': key, 'id': user_id}
+        )
+    print(f"  moved {len(rows)} profile pictures")
+
+
+@migration(5)
+def version_profile_picture_urls(conn):
+    """Point uploaded pictures at their content-hashed URL"""
+    # Ids already converted to 16-byte blobs (migration 8) can't be concatenated;
+    # those rows were written by code that sets the URL itself
+    text_ids_only = " AND typeof(id) = 'text'" if conn.dialect.name == 'sqlite' else ""
+    conn.execute(text(
+        "UPDATE users SET profile_picture = "
+        "'/api/auth/profile-picture/' || id || '?v=' || substr(profile_picture_hash, 1, 16) "
+        "WHERE profile_picture_hash IS NOT NULL" + text_ids_only
+    ))
+
+
+@migration(6, transactional=False)
+def add_feed_index(conn):
+    """Index posts (created_at, id) for keyset pagination of the feed"""
+    create_index(conn, 'ix_posts_created_at_id', 'posts', ['created_at', 'id'])
+
+
+@migration(7, transactional=False)
+def add_lookup_indexes(conn):
+    """Index foreign keys and the columns looked up by value"""
+    # Posts by author, and the user side of deletes
+    create_index(conn, 'ix_posts_user_id', 'posts', ['user_id'])
+    # The unique (user_id, post_id) index can't serve lookups by post alone
+    create_index(conn, 'ix_post_likes_post_id', 'post_likes', ['post_id'])
+    # Whether any other user still references a picture before it is deleted
+    create_index(conn, 'ix_users_profile_picture_hash', 'users', ['profile_picture_hash'])
+    # Newer finished job check when an image job completes; a database from
+    # before image jobs gets the table, with its index, from create_tables
+    if table_exists(conn, 'image_jobs'):
+        create_index(conn, 'ix_image_jobs_user_id_created_at', 'image_jobs', ['user_id', 'created_at'])
+
+
+# Id columns converted from VARCHAR(36) to UUID storage, per table
+ID_COLUMNS = {
+    'users': ['id'],
+    'posts': ['id', 'user_id'],
+    'post_likes': ['id', 'user_id', 'post_id'],
+    'image_jobs': ['id', 'user_id'],
+}
+
+
+def _uuid_blob(value):
+    return uuid.UUID(value).bytes
+
+
+@migration(8)
+def convert_ids_to_uuid(conn):
+    """Store ids as native UUID on PostgreSQL and 16-byte blobs on SQLite"""
+    # Tables that don't exist yet are created by create_tables with uuid ids
+    id_columns = {table: columns for table, columns in ID_COLUMNS.items() if table_exists(conn, table)}
+    if conn.dialect.name == 'postgresql':
+        _convert_ids_postgresql(conn, id_columns)
+    else:
+        _convert_ids_sqlite(conn, id_columns)
+
+
+def _convert_ids_sqlite(conn, id_columns):
+    # SQLite column types are advisory: the values are rewritten in place and
+    # the declared VARCHAR(36) stays. Foreign keys aren't enforced by this app's
+    # connections, so parents and children can be rewritten in any order.
+    conn.connection.driver_connection.create_function('uuid_blob', 1, _uuid_blob, deterministic=True)
+    for table, columns in id_columns.items():
+        for column in columns:
+            conn.execute(text(
+                f"UPDATE {table} SET {column} = uuid_blob({column}) WHERE typeof({column}) = 'text'"
+            ))
+
+
+def _convert_ids_postgresql(conn, id_columns):
+    inspector = inspect(conn)
+    if all(
+        isinstance(column['type'], Uuid)
+        for table, columns in id_columns.items()
+        for column in inspector.get_columns(table) if column['name'] in columns
+    ):
+        return
+
+    # Foreign keys must be dropped while both sides change type
+    foreign_keys = [
+        (table, fk)
+        for table in id_columns
+        for fk in inspector.get_foreign_keys(table)
+        if fk['referred_table'] in id_columns
+    ]
+    for table, fk in foreign_keys:
+        conn.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT "{fk["name"]}"'))
+
+    for table, columns in id_columns.items():
+        alterations = ', '.join(
+            f"ALTER COLUMN {column} TYPE uuid USING {column}::uuid" for column in columns
+        )
+        conn.execute(text(f"ALTER TABLE {table} {alterations}"))
+
+    for table, fk in foreign_keys:
+        ondelete = fk.get('options', {}).get('ondelete')
+        conn.execute(text(
+            f'ALTER TABLE {table} ADD CONSTRAINT "{fk["name"]}" '
+            f'FOREIGN KEY ({", ".join(fk["constrained_columns"])}) '
+            f'REFERENCES {fk["referred_table"]} ({", ".join(fk["referred_columns"])})'
+            + (f' ON DELETE {ondelete}' if ondelete else '')
+        ))
+
+
+def ensure_migrations_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, "
+            "name VARCHAR(100) NOT NULL, "
+            "applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+        ))
+
+
+def applied_versions(engine):
+    ensure_migrations_table(engine)
+    with engine.connect() as conn:
+        return {version for (version,) in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def pending_migrations(engine):
+    applied = applied_versions(engine)
+    return [m for m in MIGRATIONS if m.version not in applied]
+
+
+def _record(conn, m):
+    conn.execute(
+        text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+        {'version': m.version, 'name': m.name}
+    )
+
+
+def _apply(engine, m):
+    if m.transactional:
+        # The schema change and its record commit together
+        with engine.begin() as conn:
+            m.apply(conn)
+            _record(conn, m)
+        return
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        m.apply(conn)
+        _record(conn, m)
+
+
+def run_migrations(engine, target=None):
+    """Apply pending migrations up to target (all when None); returns the applied ones"""
+    ensure_migrations_table(engine)
+    lock = None
+    if engine.dialect.name == 'postgresql':
+        # Session-level lock, held on its own connection for the whole run
+        lock = engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+        lock.execute(text("SELECT pg_advisory_lock(:key)"), {'key': MIGRATION_LOCK_KEY})
+    try:
+        applied = []
+        for m in pending_migrations(engine):
+            if target is not None and m.version > target:
+                break
+            print(f"➕ {m.version:04d} {m.name}: {m.description}")
+            _apply(engine, m)
+            applied.append(m)
+        return applied
+    finally:
+        if lock is not None:
+            lock.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': MIGRATION_LOCK_KEY})
+            lock.close()
+
+
+def create_tables(metadata, engine):
+    """
+    create_all for the current models that is safe on a database with pending
+    migrations; returns those migrations.
+
+    A new database gets every table and is recorded as fully migrated, since
+    the models already have the latest schema. On an existing database, tables
+    with foreign keys onto ids that convert_ids_to_uuid hasn't converted yet
+    are held back: they would get uuid columns, and PostgreSQL refuses a uuid
+    foreign key onto a VARCHAR id. migrate_database.py creates them once the
+    migrations have run.
+    """
+    if not inspect(engine).has_table('users'):
+        metadata.create_all(engine)
+        run_migrations(engine)
+        return []
+
+    pending = pending_migrations(engine)
+    tables = metadata.sorted_tables
+    if any(m.apply is convert_ids_to_uuid for m in pending):
+        tables = [
+            table for table in tables
+            if not any(fk.column.table.name in ID_COLUMNS for fk in table.foreign_keys)
+        ]
+    metadata.create_all(engine, tables=tables)
+    return pending
@@ -0,0 +1,69 @@
+"""
+Password hashing on a dedicated, bounded executor.
+
+Key derivation is deliberately expensive. Running it on a small thread pool
+(hashlib releases the GIL while deriving) caps how many hashes one worker
+computes at once, and callers that can't get a slot within a short wait are
+told the server is busy instead of piling up behind each other. The cap only
+bites when a worker serves several requests at once, which is why
+gunicorn.conf.py runs threaded workers.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when every hashing slot stays taken for the whole wait"""
+
+
+class PasswordHasher:
+    def __init__(self, method='pbkdf2:sha256:600000', salt_length=16,
+                 max_workers=2, max_queued=4, wait_timeout=2.0):
+        self.method = method
+        self.salt_length = salt_length
+        self.wait_timeout = wait_timeout
+        self._slots = threading.BoundedSemaphore(max_workers + max_queued)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='password-hash')
+        self._stored_method = None
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.wait_timeout):
+            raise PasswordHasherBusy()
+        try:
+            return self._executor.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def stored_method(self):
+        """
+        Method prefix werkzeug stores for self.method. Short names are expanded
+        ('scrypt' is stored as 'scrypt:32768:8:1'), so it is read off one
+        throwaway hash, made again only if method changes.
+        """
+        method, prefix = self._stored_method or (None, None)
+        if method != self.method:
+            prefix = generate_password_hash('', self.method, 1).split('$', 1)[0]
+            self._stored_method = (self.method, prefix)
+        return prefix
+
+    def needs_rehash(self, password_hash):
+        """True when a stored hash was made with different parameters than configured"""
+        return password_hash.split('$', 1)[0] != self.stored_method()
+
+
+def create_password_hasher(config):
+    return PasswordHasher(
+        method=config.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000'),
+        salt_length=config.get('PASSWORD_SALT_LENGTH', 16),
+        max_workers=config.get('PASSWORD_HASH_WORKERS', 2),
+        max_queued=config.get('PASSWORD_HASH_QUEUE', 4),
+        wait_timeout=config.get('PASSWORD_HASH_WAIT', 2.0)
+    )
@@ -0,0 +1,120 @@
+"""
+Read-replica routing.
+
+Routes marked read-only send their queries to a replica engine chosen round
+robin. A session goes back to the primary as soon as it writes, and a user
+who wrote recently reads from the primary for REPLICA_STICKY_SECONDS, so
+their own changes are visible even while replicas lag. The sticky marks live
+in the shared store, so they hold across gunicorn workers.
+
+A replica that raises a connection-level error is skipped for
+REPLICA_RETRY_AFTER seconds, and the request that hit the error is run again
+on the primary.
+
+The shared caches (identity projections, feed pages) are always filled from
+the primary. Otherwise a lagging replica could put stale rows back under a
+freshly invalidated key.
+"""
+import threading
+import time
+
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+
+
+class RoutingSession(Session):
+    """Session that reads from session.info['replica'] until its first write"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and (self._flushing or getattr(clause, 'is_dml', False)):
+            # Writes and every later read of this session use the primary
+            self.info['wrote'] = True
+            self.info.pop('replica', None)
+        replica = self.info.get('replica')
+        if bind is None and replica is not None:
+            return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaRouter:
+    def __init__(self, engines, store, sticky_seconds=5, retry_after=30):
+        self.engines = engines
+        self.store = store
+        self.sticky_seconds = sticky_seconds
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._next = 0
+        self._down_until = [0.0] * len(engines)
+        self._local = threading.local()
+        self.failovers = 0
+        for index, engine in enumerate(engines):
+            event.listen(engine, 'handle_error', self._error_handler(index))
+
+    def _error_handler(self, index):
+        def handle_error(context):
+            if context.is_disconnect or isinstance(context.sqlalchemy_exception, OperationalError):
+                self.mark_down(index)
+                self._local.failed = True
+        return handle_error
+
+    def mark_down(self, index):
+        with self._lock:
+            self._down_until[index] = time.monotonic() + self.retry_after
+            self.failovers += 1
+
+    def choose(self):
+        """Next healthy replica engine, or None when all are down"""
+        now = time.monotonic()
+        with self._lock:
+            for _ in range(len(self.engines)):
+                index = self._next
+                self._next = (self._next + 1) % len(self.engines)
+                if self._down_until[index] <= now:
+                    return self.engines[index]
+        return None
+
+    def note_write(self, user_id):
+        self.store.set(f'replica-sticky:{user_id}', b'1', ttl=self.sticky_seconds)
+
+    def is_sticky(self, user_ids):
+        keys = [f'replica-sticky:{user_id}' for user_id in user_ids if user_id]
+        return bool(keys) and bool(self.store.get_many(keys))
+
+    def begin_request(self):
+        self._local.failed = False
+
+    def request_failed(self):
+        return getattr(self._local, 'failed', False)
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                'replicas': len(self.engines),
+                'healthy': sum(1 for until in self._down_until if until <= now),
+                'failovers': self.failovers
+            }
+
+
+def create_replica_router(config, store):
+    """None unless DATABASE_REPLICA_URLS lists at least one replica"""
+    urls = config.get('DATABASE_REPLICA_URLS') or []
+    if not urls:
+        return None
+    # Replicas on the primary's backend get the same pool settings
+    primary_backend = make_url(config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+    engines = [
+        create_engine(url, **(
+            config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+            if make_url(url).get_backend_name() == primary_backend else {}
+        ))
+        for url in urls
+    ]
+    return ReplicaRouter(
+        engines,
+        store,
+        sticky_seconds=config.get('REPLICA_STICKY_SECONDS', 5),
+        retry_after=config.get('REPLICA_RETRY_AFTER', 30)
+    )
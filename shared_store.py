@@ -0,0 +1,154 @@
+"""
+Small key-value store shared by the gunicorn workers on one host.
+
+The default backend is a SQLite file in WAL mode: every worker opens it, reads
+are a local B-tree lookup, and writes are visible to the other workers as soon
+as they commit. MemorySharedStore keeps the same interface inside a single
+process for tests and single-process development servers.
+
+Values are bytes or str; counters are integers created on first increment.
+"""
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+
+class MemorySharedStore:
+    """Process-local store with the SharedStore interface"""
+    name = 'memory'
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= now:
+            del self._data[key]
+            return None
+        return value
+
+    def get(self, key):
+        with self._lock:
+            return self._live(key, time.time())
+
+    def get_many(self, keys):
+        now = time.time()
+        with self._lock:
+            return {key: value for key in keys if (value := self._live(key, now)) is not None}
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            value = int(self._live(key, time.time()) or 0) + 1
+            self._data[key] = (value, None)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SqliteSharedStore:
+    """Store in a SQLite file that every worker process on the host opens"""
+    name = 'sqlite'
+
+    # Expired rows are swept after this many writes from one process
+    PURGE_EVERY = 1000
+
+    def __init__(self, path, busy_timeout=5.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._writes = 0
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv ("
+                "key TEXT PRIMARY KEY, value BLOB, expires_at REAL)"
+            )
+
+    def _connection(self):
+        # One connection per thread, reopened after a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        placeholders = ','.join('?' * len(keys))
+        rows = self._connection().execute(
+            f"SELECT key, value FROM kv WHERE key IN ({placeholders}) "
+            "AND (expires_at IS NULL OR expires_at > ?)",
+            (*keys, time.time())
+        ).fetchall()
+        return dict(rows)
+
+    def set(self, key, value, ttl=None):
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, time.time() + ttl if ttl else None)
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+
+    def delete(self, key):
+        self._connection().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def incr(self, key):
+        # fetchall() steps the statement to completion, which commits it
+        return self._connection().execute(
+            "INSERT INTO kv (key, value, expires_at) VALUES (?, 1, NULL) "
+            "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1 "
+            "RETURNING value",
+            (key,)
+        ).fetchall()[0][0]
+
+    def clear(self):
+        self._connection().execute("DELETE FROM kv")
+
+
+def default_shared_store_path(database_uri):
+    """
+    A temp-dir file per database: app instances on one host that use different
+    databases (a dev server next to production) must not share cached feed
+    pages, identity versions or replica marks
+    """
+    digest = hashlib.sha256((database_uri or '').encode('utf-8')).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f'nonsocial-shared-cache-{digest}.sqlite3')
+
+
+def create_shared_store(config):
+    """SHARED_CACHE_PATH 'memory' selects the in-process store, anything else is a SQLite file"""
+    path = config.get('SHARED_CACHE_PATH') or default_shared_store_path(config.get('SQLALCHEMY_DATABASE_URI'))
+    if path == 'memory':
+        return MemorySharedStore()
+    return SqliteSharedStore(path)
@@ -0,0 +1,85 @@
+"""
+Tests for post archival and lookups of archived posts
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, update
+
+from app import db, ArchivedPost, Post, PostLike
+from archive_posts import archive_posts
+
+
+def create_posts(client, headers, count):
+    return [
+        client.post('/api/posts', json={'content': f'post {i}'}, headers=headers).get_json()['post']['id']
+        for i in range(count)
+    ]
+
+
+def backdate(app, post_ids, days):
+    with app.app_context():
+        db.session.execute(
+            update(Post).where(Post.id.in_(post_ids)).values(created_at=datetime.utcnow() - timedelta(days=days))
+        )
+        db.session.commit()
+
+
+def test_old_posts_move_to_the_archive(app, client, register_user):
+    _, alice = register_user('alice')
+    _, bob = register_user('bob')
+    old = create_posts(client, alice, 5)
+    recent = create_posts(client, alice, 2)
+    for post_id in old[:2] + recent[:1]:
+        client.post(f'/api/posts/{post_id}/like', headers=alice)
+        client.post(f'/api/posts/{post_id}/like', headers=bob)
+    backdate(app, old, days=400)
+    # Warm the feed cache so archival has to invalidate it
+    assert len(client.get('/api/posts', headers=alice).get_json()['posts']) == 7
+
+    with app.app_context():
+        moved = archive_posts(datetime.utcnow() - timedelta(days=365), chunk_size=2)
+        archived = {row.id: row.likes for row in db.session.scalars(select(ArchivedPost))}
+        remaining_posts = set(db.session.scalars(select(Post.id)))
+        remaining_likes = db.session.scalar(select(func.count()).select_from(PostLike))
+
+    assert moved == (5, 4)
+    assert archived == {post_id: (2 if post_id in old[:2] else 0) for post_id in old}
+    assert remaining_posts == set(recent)
+    assert remaining_likes == 2
+    feed = client.get('/api/posts', headers=alice).get_json()['posts']
+    assert [post['id'] for post in feed] == recent[::-1]
+
+    # A second run finds nothing left to move
+    with app.app_context():
+        assert archive_posts(datetime.utcnow() - timedelta(days=365), chunk_size=2) == (0, 0)
+
+
+def test_archived_posts_are_readable_by_id(app, client, register_user):
+    _, alice = register_user('alice')
+    old, live = create_posts(client, alice, 2)
+    client.post(f'/api/posts/{old}/like', headers=alice)
+    client.post(f'/api/posts/{live}/like', headers=alice)
+    backdate(app, [old], days=400)
+    with app.app_context():
+        archive_posts(datetime.utcnow() - timedelta(days=365), chunk_size=10)
+
+    archived = client.get(f'/api/posts/{old}', headers=alice)
+    current = client.get(f'/api/posts/{live}', headers=alice)
+
+    assert archived.status_code == 200
+    assert archived.get_json()['post']['archived'] is True
+    assert archived.get_json()['post']['likes'] == 1
+    assert archived.get_json()['post']['author']['username'] == 'alice'
+    assert current.get_json()['post']['archived'] is False
+    assert current.get_json()['post']['isLiked'] is True
+    assert current.get_json()['post']['likes'] == 1
+    # Likes of archived posts are frozen
+    assert client.post(f'/api/posts/{old}/like', headers=alice).status_code == 404
+
+
+def test_unknown_post_is_not_found(client, register_user):
+    _, headers = register_user()
+
+    response = client.get('/api/posts/0190a6b2-0000-7000-8000-000000000000', headers=headers)
+
+    assert response.status_code == 404
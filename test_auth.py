@@ -0,0 +1,68 @@
+"""
+Tests for registration and login
+"""
+from app import User
+
+
+def login(client, username, password='password123'):
+    return client.post('/api/auth/login', json={'username': username, 'password': password})
+
+
+def test_login_with_username_or_email(client, register_user):
+    register_user('alice')
+    
+    assert login(client, 'alice').status_code == 200
+    assert login(client, 'alice@example.com').status_code == 200
+    assert login(client, 'alice', 'wrong').status_code == 401
+
+
+def test_login_rehashes_outdated_hash(app, client, register_user, monkeypatch):
+    import app as app_module
+    
+    register_user('alice')
+    monkeypatch.setattr(app_module.password_hasher, 'method', 'pbkdf2:sha256:2000')
+    
+    assert login(client, 'alice').status_code == 200
+    with app.app_context():
+        stored = User.query.filter_by(username='alice').first().password_hash
+    assert stored.startswith('pbkdf2:sha256:2000$')
+    assert login(client, 'alice').status_code == 200
+
+
+def test_login_keeps_hash_made_with_a_short_method_name(app, client, register_user, monkeypatch):
+    import app as app_module
+    from password_hashing import PasswordHasher
+    
+    # werkzeug stores 'scrypt' as 'scrypt:32768:8:1'
+    monkeypatch.setattr(app_module, 'password_hasher', PasswordHasher(method='scrypt'))
+    register_user('alice')
+    
+    def stored_hash():
+        with app.app_context():
+            return User.query.filter_by(username='alice').first().password_hash
+    registered = stored_hash()
+    
+    assert login(client, 'alice').status_code == 200
+    assert login(client, 'alice').status_code == 200
+    assert registered.startswith('scrypt:32768:8:1$')
+    assert stored_hash() == registered
+
+
+def test_login_reports_busy_when_hashing_is_saturated(client, register_user, monkeypatch):
+    import app as app_module
+    from password_hashing import PasswordHasher
+    
+    register_user('alice')
+    hasher = PasswordHasher(method='pbkdf2:sha256:1000', max_workers=1, max_queued=0, wait_timeout=0.01)
+    monkeypatch.setattr(app_module, 'password_hasher', hasher)
+    
+    # Occupy the only slot, as a long-running hash would
+    hasher._slots.acquire()
+    try:
+        response = login(client, 'alice')
+    finally:
+        hasher._slots.release()
+    
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert login(client, 'alice').status_code == 200
@@ -0,0 +1,60 @@
+"""
+Tests for response compression
+"""
+import gzip
+import io
+import json
+
+from PIL import Image
+
+from app import response_compressor
+
+GZIP = {'Accept-Encoding': 'gzip'}
+
+
+def create_posts(client, headers, count):
+    for i in range(count):
+        client.post('/api/posts', json={'content': f'post number {i} ' * 10}, headers=headers)
+
+
+def test_large_json_is_gzipped_and_cached(client, register_user):
+    _, headers = register_user()
+    create_posts(client, headers, 20)
+    
+    plain = client.get('/api/posts', headers=headers)
+    first = client.get('/api/posts', headers={**headers, **GZIP})
+    hits_before = response_compressor.hits
+    second = client.get('/api/posts', headers={**headers, **GZIP})
+    
+    assert 'Content-Encoding' not in plain.headers
+    assert first.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in first.headers['Vary']
+    assert int(first.headers['Content-Length']) < len(plain.get_data())
+    assert json.loads(gzip.decompress(first.get_data())) == plain.get_json()
+    assert second.get_data() == first.get_data()
+    assert response_compressor.hits == hits_before + 1
+
+
+def test_small_json_is_not_compressed(client):
+    response = client.get('/api/health', headers=GZIP)
+    
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+
+def test_images_and_streams_are_not_compressed(client, register_user):
+    user, headers = register_user()
+    create_posts(client, headers, 20)
+    buffer = io.BytesIO()
+    Image.new('RGB', (400, 400), 'red').save(buffer, format='PNG')
+    buffer.seek(0)
+    client.post('/api/auth/profile-picture', headers=headers,
+                data={'file': (buffer, 'avatar.png')}, content_type='multipart/form-data')
+    
+    picture = client.get(f"/api/auth/profile-picture/{user['id']}", headers=GZIP)
+    streamed = client.get('/api/posts?stream=1', headers={**headers, **GZIP})
+    
+    assert picture.status_code == 200
+    assert 'Content-Encoding' not in picture.headers
+    assert 'Content-Encoding' not in streamed.headers
+    assert len(json.loads(streamed.get_data())['posts']) == 20
@@ -0,0 +1,64 @@
+"""
+Tests for connection pool options and statistics
+"""
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+from db_pool import TimedQueuePool, engine_options, pool_stats
+
+
+def test_postgresql_gets_a_checked_recycled_pool():
+    options = engine_options('postgresql://user:pw@db/app', pool_size=3, max_overflow=2, pool_recycle=600)
+    
+    assert options['poolclass'] is TimedQueuePool
+    assert (options['pool_size'], options['max_overflow'], options['pool_recycle']) == (3, 2, 600)
+    assert options['pool_pre_ping'] is True
+
+
+def test_pgbouncer_mode_leaves_pooling_to_pgbouncer():
+    assert engine_options('postgresql+psycopg2://user:pw@bouncer/app', pgbouncer=True) == {'poolclass': NullPool}
+    assert engine_options('postgresql+psycopg://user:pw@bouncer/app', pgbouncer=True)['connect_args'] == {
+        'prepare_threshold': None
+    }
+
+
+def test_sqlite_keeps_the_defaults():
+    assert engine_options('sqlite:///app.db') == {}
+
+
+def test_timed_pool_reports_waits(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}", poolclass=TimedQueuePool, pool_size=1, max_overflow=0
+    )
+    holding = threading.Event()
+    
+    def hold_connection():
+        with engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+            holding.set()
+            time.sleep(0.2)
+    
+    holder = threading.Thread(target=hold_connection)
+    holder.start()
+    holding.wait()
+    assert pool_stats(engine)['checked_out'] == 1
+    with engine.connect() as conn:
+        conn.execute(text('SELECT 1'))
+    holder.join()
+    
+    stats = pool_stats(engine)
+    assert stats['class'] == 'TimedQueuePool'
+    assert stats['checkouts'] == 2
+    assert stats['checked_out'] == 0
+    assert stats['wait_max_ms'] >= 100
+    engine.dispose()
+
+
+def test_health_detail_includes_pool(client):
+    pool = client.get('/api/health?detail=1').get_json()['db_pool']
+    
+    assert pool['class'] == 'QueuePool'
+    assert pool['checked_out'] >= 0
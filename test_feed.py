@@ -0,0 +1,232 @@
+"""
+Tests for GET /api/posts
+"""
+import json
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from app import db
+
+
+@contextmanager
+def count_queries(app):
+    """Count SQL statements executed against the app's engine"""
+    statements = []
+    
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def create_posts(client, headers, count):
+    ids = []
+    for i in range(count):
+        response = client.post('/api/posts', json={'content': f'post {i}'}, headers=headers)
+        assert response.status_code == 201
+        ids.append(response.get_json()['post']['id'])
+    return ids
+
+
+def test_feed_paginates_with_cursor(client, register_user):
+    _, headers = register_user()
+    create_posts(client, headers, 5)
+    
+    seen = []
+    cursor = None
+    while True:
+        url = '/api/posts?limit=2' + (f'&cursor={cursor}' if cursor else '')
+        data = client.get(url, headers=headers).get_json()
+        seen.extend(post['content'] for post in data['posts'])
+        cursor = data['next_cursor']
+        if not cursor:
+            break
+    
+    assert seen == ['post 4', 'post 3', 'post 2', 'post 1', 'post 0']
+
+
+def test_feed_rejects_invalid_cursor(client, register_user):
+    _, headers = register_user()
+    response = client.get('/api/posts?cursor=not-a-cursor', headers=headers)
+    assert response.status_code == 400
+
+
+def test_feed_marks_liked_posts(client, register_user):
+    _, alice_headers = register_user('alice')
+    _, bob_headers = register_user('bob')
+    post_ids = create_posts(client, alice_headers, 3)
+    client.post(f'/api/posts/{post_ids[1]}/like', headers=bob_headers)
+    
+    posts = client.get('/api/posts', headers=bob_headers).get_json()['posts']
+    liked = {post['id']: post['isLiked'] for post in posts}
+    
+    assert liked == {post_ids[0]: False, post_ids[1]: True, post_ids[2]: False}
+    assert all(post['author']['username'] == 'alice' for post in posts)
+
+
+def test_feed_query_count_is_independent_of_page_size(app, client, register_user):
+    _, alice_headers = register_user('alice')
+    _, bob_headers = register_user('bob')
+    post_ids = create_posts(client, alice_headers, 1)
+    client.post(f'/api/posts/{post_ids[0]}/like', headers=bob_headers)
+    
+    from app import identity_cache
+    
+    identity_cache.clear()
+    with count_queries(app) as small_page:
+        assert client.get('/api/posts', headers=bob_headers).status_code == 200
+    
+    # Add more posts by several authors, some liked by the reader
+    _, carol_headers = register_user('carol')
+    for post_id in create_posts(client, carol_headers, 10)[::2]:
+        client.post(f'/api/posts/{post_id}/like', headers=bob_headers)
+    
+    identity_cache.clear()
+    with count_queries(app) as large_page:
+        response = client.get('/api/posts', headers=bob_headers)
+        assert len(response.get_json()['posts']) == 11
+    
+    assert len(large_page) == len(small_page)
+    
+    # A warm page comes from the feed cache: only the like lookup runs
+    with count_queries(app) as warm_page:
+        client.get('/api/posts', headers=bob_headers)
+    assert len(warm_page) == 1
+
+
+def test_cached_page_overlays_each_readers_likes(client, register_user):
+    _, alice_headers = register_user('alice')
+    _, bob_headers = register_user('bob')
+    post_ids = create_posts(client, alice_headers, 2)
+    client.post(f'/api/posts/{post_ids[0]}/like', headers=bob_headers)
+    
+    # Alice's request fills the cache; Bob's is served from it
+    alice_view = client.get('/api/posts', headers=alice_headers).get_json()['posts']
+    bob_view = client.get('/api/posts', headers=bob_headers).get_json()['posts']
+    
+    assert [post['isLiked'] for post in alice_view] == [False, False]
+    assert [post['isLiked'] for post in bob_view] == [False, True]
+    assert bob_view[1]['likes'] == 1
+
+
+def test_feed_cache_is_invalidated_by_writes(client, register_user):
+    _, headers = register_user()
+    post_id = create_posts(client, headers, 1)[0]
+    client.get('/api/posts', headers=headers)
+    
+    client.post(f'/api/posts/{post_id}/like', headers=headers)
+    assert client.get('/api/posts', headers=headers).get_json()['posts'][0]['likes'] == 1
+    
+    create_posts(client, headers, 1)
+    assert len(client.get('/api/posts', headers=headers).get_json()['posts']) == 2
+    
+    client.put('/api/auth/profile', json={'displayName': 'Renamed'}, headers=headers)
+    posts = client.get('/api/posts', headers=headers).get_json()['posts']
+    assert {post['author']['displayName'] for post in posts} == {'Renamed'}
+
+
+def test_compact_feed_lists_each_author_once(client, register_user):
+    alice, alice_headers = register_user('alice')
+    bob, bob_headers = register_user('bob')
+    alice_posts = create_posts(client, alice_headers, 3)
+    create_posts(client, bob_headers, 1)
+    client.post(f'/api/posts/{alice_posts[0]}/like', headers=bob_headers)
+    
+    body = client.get('/api/posts?format=compact', headers=bob_headers).get_json()
+    
+    assert set(body['authors']) == {alice['id'], bob['id']}
+    assert body['authors'][alice['id']]['username'] == 'alice'
+    assert [post['authorId'] for post in body['posts']] == [bob['id'], alice['id'], alice['id'], alice['id']]
+    assert body['likedPostIds'] == [alice_posts[0]]
+    assert all('author' not in post and 'isLiked' not in post and 'comments' not in post
+               for post in body['posts'])
+
+
+def test_compact_feed_is_selected_by_accept_header(client, register_user):
+    _, headers = register_user()
+    create_posts(client, headers, 1)
+    
+    compact_response = client.get('/api/posts', headers={
+        **headers, 'Accept': 'application/vnd.nonsocial.compact+json'
+    })
+    default_response = client.get('/api/posts', headers={**headers, 'Accept': '*/*'})
+    compact = compact_response.get_json()
+    default = default_response.get_json()
+    
+    assert 'authors' in compact and 'authorId' in compact['posts'][0]
+    assert 'authors' not in default and 'author' in default['posts'][0]
+    # Shared caches must not hand one format to clients asking for the other
+    assert compact_response.mimetype == 'application/vnd.nonsocial.compact+json'
+    assert default_response.mimetype == 'application/json'
+    assert 'Accept' in compact_response.vary and 'Accept' in default_response.vary
+
+
+def test_streamed_feed_matches_paged_feed(app, client, register_user, monkeypatch):
+    monkeypatch.setitem(app.config, 'FEED_STREAM_CHUNK_SIZE', 2)
+    _, headers = register_user()
+    post_ids = create_posts(client, headers, 5)
+    client.post(f'/api/posts/{post_ids[2]}/like', headers=headers)
+    
+    response = client.get('/api/posts?stream=1', headers=headers, buffered=False)
+    chunks = list(response.response)
+    body = json.loads(b''.join(chunks))
+    paged = client.get('/api/posts', headers=headers).get_json()
+    
+    # Opening, one chunk per post, closing
+    assert len(chunks) == 7
+    assert body == paged
+    assert body['next_cursor'] is None
+
+
+def test_streamed_feed_honours_limit_and_cursor(app, client, register_user, monkeypatch):
+    monkeypatch.setitem(app.config, 'FEED_STREAM_CHUNK_SIZE', 2)
+    _, headers = register_user()
+    post_ids = create_posts(client, headers, 5)
+    
+    first = json.loads(client.get('/api/posts?stream=1&limit=4', headers=headers).get_data())
+    rest = json.loads(client.get(
+        f"/api/posts?stream=1&cursor={first['next_cursor']}", headers=headers
+    ).get_data())
+    
+    assert [post['id'] for post in first['posts']] == post_ids[::-1][:4]
+    assert [post['id'] for post in rest['posts']] == post_ids[:1]
+    assert rest['next_cursor'] is None
+
+
+def test_streamed_feed_stops_at_stream_max(app, client, register_user, monkeypatch):
+    monkeypatch.setitem(app.config, 'FEED_STREAM_MAX', 3)
+    _, headers = register_user()
+    post_ids = create_posts(client, headers, 5)
+    
+    unlimited = json.loads(client.get('/api/posts?stream=1', headers=headers).get_data())
+    oversized = json.loads(client.get('/api/posts?stream=1&limit=1000', headers=headers).get_data())
+    rest = json.loads(client.get(
+        f"/api/posts?stream=1&cursor={unlimited['next_cursor']}", headers=headers
+    ).get_data())
+    
+    assert [post['id'] for post in unlimited['posts']] == post_ids[::-1][:3]
+    assert oversized == unlimited
+    assert [post['id'] for post in rest['posts']] == post_ids[::-1][3:]
+    assert rest['next_cursor'] is None
+
+
+def test_streamed_compact_feed(client, register_user):
+    alice, headers = register_user()
+    post_ids = create_posts(client, headers, 2)
+    client.post(f'/api/posts/{post_ids[0]}/like', headers=headers)
+    
+    response = client.get('/api/posts?stream=1&format=compact', headers=headers)
+    body = json.loads(response.get_data())
+    
+    assert response.mimetype == 'application/vnd.nonsocial.compact+json'
+    assert 'Accept' in response.vary
+    assert list(body['authors']) == [alice['id']]
+    assert body['likedPostIds'] == [post_ids[0]]
+    assert [post['authorId'] for post in body['posts']] == [alice['id']] * 2
@@ -0,0 +1,45 @@
+"""
+Tests for UUIDv7 ids and their storage
+"""
+import uuid
+
+from sqlalchemy import text
+
+from app import db
+from identifiers import is_valid_id, normalize_id, uuid7
+
+
+def test_uuid7_is_time_ordered_and_versioned():
+    ids = [uuid7() for _ in range(5000)]
+    
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+    assert {value.version for value in ids} == {7}
+    assert {value.variant for value in ids} == {uuid.RFC_4122}
+
+
+def test_normalize_id():
+    value = str(uuid7())
+    
+    assert normalize_id(value.upper()) == value
+    assert not is_valid_id('not-an-id')
+
+
+def test_ids_are_strings_outside_and_blobs_inside(app, client, register_user):
+    user, headers = register_user()
+    post_id = client.post('/api/posts', json={'content': 'hi'}, headers=headers).get_json()['post']['id']
+    
+    assert uuid.UUID(user['id']).version == 7
+    assert client.post(f'/api/posts/{post_id.upper()}/like', headers=headers).get_json()['likes'] == 1
+    with app.app_context():
+        stored = db.session.execute(text("SELECT id, typeof(id) FROM posts")).one()
+    assert stored[1] == 'blob'
+    assert str(uuid.UUID(bytes=stored[0])) == post_id
+
+
+def test_malformed_ids_in_urls_are_not_found(client, register_user):
+    _, headers = register_user()
+    
+    assert client.post('/api/posts/not-an-id/like', headers=headers).status_code == 404
+    assert client.get('/api/auth/profile-picture/123').status_code == 404
+    assert client.get('/api/auth/profile-picture/jobs/abc', headers=headers).status_code == 404
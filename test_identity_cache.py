@@ -0,0 +1,71 @@
+"""
+Tests for the per-worker identity cache
+"""
+from identity_cache import IdentityCache
+from shared_store import SqliteSharedStore, create_shared_store
+
+
+def test_profile_is_served_from_cache_and_invalidated_on_update(client, register_user):
+    from app import identity_cache
+    
+    _, headers = register_user()
+    hits, misses = identity_cache.hits, identity_cache.misses
+    client.get('/api/auth/profile', headers=headers)
+    client.get('/api/auth/profile', headers=headers)
+    assert (identity_cache.hits - hits, identity_cache.misses - misses) == (1, 1)
+    
+    client.put('/api/auth/profile', json={'displayName': 'Renamed'}, headers=headers)
+    profile = client.get('/api/auth/profile', headers=headers).get_json()['user']
+    
+    assert profile['displayName'] == 'Renamed'
+    assert identity_cache.misses - misses == 2
+
+
+def test_health_detail_reports_cache_counters(client):
+    detail = client.get('/api/health?detail=1').get_json()
+    assert set(detail['identity_cache']) >= {'hits', 'misses', 'size'}
+    assert 'identity_cache' not in client.get('/api/health').get_json()
+
+
+def test_invalidation_reaches_other_workers(tmp_path):
+    # Two caches over one store file stand in for two gunicorn workers
+    path = str(tmp_path / 'shared.sqlite3')
+    worker_a = IdentityCache(SqliteSharedStore(path))
+    worker_b = IdentityCache(SqliteSharedStore(path))
+    names = {'u1': 'Before'}
+    
+    def load(user_ids):
+        return {user_id: {'id': user_id, 'displayName': names[user_id]} for user_id in user_ids}
+    
+    assert worker_a.get('u1', load)['displayName'] == 'Before'
+    assert worker_b.get('u1', load)['displayName'] == 'Before'
+    
+    names['u1'] = 'After'
+    worker_a.invalidate('u1')
+    
+    assert worker_b.get('u1', load)['displayName'] == 'After'
+    assert worker_b.misses == 2
+
+
+def test_cache_is_bounded(tmp_path):
+    cache = IdentityCache(SqliteSharedStore(str(tmp_path / 'shared.sqlite3')), max_size=2)
+    load = lambda user_ids: {user_id: {'id': user_id} for user_id in user_ids}
+    
+    for user_id in ('a', 'b', 'c'):
+        cache.get(user_id, load)
+    
+    assert cache.stats()['size'] == 2
+    cache.get('a', load)
+    assert cache.misses == 4
+
+
+def test_default_shared_store_is_per_database(monkeypatch, tmp_path):
+    monkeypatch.setattr('tempfile.tempdir', str(tmp_path))
+    production = create_shared_store({'SQLALCHEMY_DATABASE_URI': 'postgresql://db.example/prod'})
+    development = create_shared_store({'SQLALCHEMY_DATABASE_URI': 'sqlite:///social_app.db'})
+    production_again = create_shared_store({'SQLALCHEMY_DATABASE_URI': 'postgresql://db.example/prod'})
+    
+    production.set('feed', b'production page')
+    
+    assert development.get('feed') is None
+    assert production_again.get('feed') == b'production page'
@@ -0,0 +1,100 @@
+"""
+Tests for per-request SQL and phase timing
+"""
+import logging
+import time
+
+from flask import Flask, jsonify
+from sqlalchemy import create_engine, event, text
+
+from instrumentation import NO_PHASE, Instrumentation, create_instrumentation
+
+
+def make_app(instrumentation):
+    app = Flask(__name__)
+    engine = create_engine('sqlite://')
+
+    @app.route('/work')
+    def work():
+        with engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+            conn.execute(text('SELECT 2'))
+        with instrumentation.phase('auth'):
+            time.sleep(0.01)
+        return jsonify({'ok': True})
+
+    instrumentation.init_app(app, [engine])
+    return app, engine
+
+
+def test_server_timing_reports_queries_and_phases():
+    app, _ = make_app(Instrumentation(enabled=True, server_timing=True))
+
+    response = app.test_client().get('/work')
+    metrics = {metric.split(';')[0]: metric for metric in response.headers['Server-Timing'].split(', ')}
+
+    assert set(metrics) == {'db', 'auth', 'total'}
+    assert 'desc="2 queries"' in metrics['db']
+    assert float(metrics['auth'].split('dur=')[1]) >= 10
+
+
+def test_timings_without_header_unless_server_timing():
+    app, _ = make_app(Instrumentation(enabled=True))
+
+    assert 'Server-Timing' not in app.test_client().get('/work').headers
+
+
+def test_slow_requests_and_queries_are_logged(caplog):
+    app, _ = make_app(Instrumentation(enabled=True, slow_request_ms=5, slow_query_ms=0.0001))
+
+    with caplog.at_level(logging.WARNING):
+        app.test_client().get('/work?page=2')
+    messages = [record.getMessage() for record in caplog.records]
+
+    assert any(m.startswith('Slow request: GET /work?page=2 200') and '2 queries' in m and 'auth' in m
+               for m in messages)
+    assert any(m.startswith('Slow query') and 'SELECT 1' in m for m in messages)
+
+
+def test_disabled_installs_nothing():
+    instrumentation = Instrumentation(enabled=False, server_timing=True)
+    app, engine = make_app(instrumentation)
+
+    def handler():
+        pass
+
+    response = app.test_client().get('/work')
+
+    assert 'Server-Timing' not in response.headers
+    assert not event.contains(engine, 'before_cursor_execute', instrumentation._before_cursor_execute)
+    assert instrumentation.phase('auth') is NO_PHASE
+    assert instrumentation.timed('serialize', handler) is handler
+
+
+def test_phase_outside_a_request_is_a_no_op():
+    instrumentation = Instrumentation(enabled=True)
+
+    assert instrumentation.phase('image') is NO_PHASE
+
+
+def test_server_timing_setting_turns_measuring_on():
+    assert create_instrumentation({'SERVER_TIMING_ENABLED': True}).enabled
+    assert not create_instrumentation({}).enabled
+
+
+def test_route_errors_are_logged(client, register_user, monkeypatch, caplog):
+    import app as app_module
+
+    _, headers = register_user()
+
+    def broken(*args, **kwargs):
+        raise RuntimeError('database went away')
+
+    monkeypatch.setattr(app_module, 'load_liked_post_ids', broken)
+    with caplog.at_level(logging.ERROR):
+        response = client.get('/api/posts', headers=headers)
+
+    assert response.status_code == 500
+    assert response.get_json() == {'error': 'Internal server error'}
+    record = next(record for record in caplog.records if record.getMessage() == 'Error loading feed')
+    assert record.exc_info[0] is RuntimeError
@@ -0,0 +1,47 @@
+"""
+Tests for the pluggable JSON provider
+"""
+from datetime import datetime
+
+import pytest
+from flask import Flask
+
+from json_provider import OrjsonJSONProvider, StdlibJSONProvider, create_json_provider, orjson
+
+PROVIDERS = [StdlibJSONProvider]
+if orjson is not None:
+    PROVIDERS.append(OrjsonJSONProvider)
+
+
+@pytest.fixture(params=PROVIDERS, ids=lambda provider: provider.name)
+def provider(request):
+    app = Flask(__name__)
+    # Providers hold a weak reference to their app
+    request.node.flask_app = app
+    return request.param(app)
+
+
+def test_providers_encode_alike(provider):
+    value = {'b': [1, 2.5, None, True], 'a': 'héllo', 'when': datetime(2024, 1, 2, 3, 4, 5), 'big': 2 ** 70}
+    reference_app = Flask(__name__)
+    reference = StdlibJSONProvider(reference_app)
+    
+    assert provider.loads(provider.dumps(value)) == reference.loads(reference.dumps(value))
+    assert provider.loads(provider.dumps_bytes(value)) == reference.loads(reference.dumps(value))
+
+
+def test_response_is_json(provider):
+    with provider._app.app_context():
+        response = provider.response(posts=[], next_cursor=None)
+    
+    assert response.mimetype == 'application/json'
+    assert provider.loads(response.get_data()) == {'posts': [], 'next_cursor': None}
+
+
+def test_create_json_provider_honours_config():
+    app = Flask(__name__)
+    app.config['JSON_ENCODER'] = 'stdlib'
+    assert create_json_provider(app).name == 'stdlib'
+    
+    app.config['JSON_ENCODER'] = 'auto'
+    assert create_json_provider(app).name == ('orjson' if orjson is not None else 'stdlib')
@@ -0,0 +1,178 @@
+"""
+Tests for POST /api/posts/<post_id>/like
+"""
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from sqlalchemy import func, update
+
+from app import db, ArchivedPost, Post, PostLike
+
+
+def test_toggle_like_flips_state(client, register_user):
+    _, headers = register_user()
+    post_id = client.post('/api/posts', json={'content': 'hi'}, headers=headers).get_json()['post']['id']
+    
+    first = client.post(f'/api/posts/{post_id}/like', headers=headers).get_json()
+    second = client.post(f'/api/posts/{post_id}/like', headers=headers).get_json()
+    
+    assert (first['isLiked'], first['likes']) == (True, 1)
+    assert (second['isLiked'], second['likes']) == (False, 0)
+
+
+def test_toggle_like_unknown_post(client, register_user):
+    _, headers = register_user()
+    # Well-formed, so the request reaches the route rather than failing the URL converter
+    response = client.post('/api/posts/0190a6b2-0000-7000-8000-000000000000/like', headers=headers)
+    
+    assert response.status_code == 404
+    assert response.get_json()['error'] == 'Post not found'
+
+
+def test_concurrent_toggles_keep_counter_consistent(app, client, register_user):
+    users = [register_user(f'user{i}')[1] for i in range(20)]
+    post_ids = [
+        client.post('/api/posts', json={'content': f'post {i}'}, headers=users[0]).get_json()['post']['id']
+        for i in range(3)
+    ]
+    
+    def worker(seed):
+        rng = random.Random(seed)
+        worker_client = app.test_client()
+        statuses = []
+        for _ in range(125):
+            # Many workers share users, so the same (user, post) pair races often
+            headers = rng.choice(users)
+            post_id = rng.choice(post_ids)
+            statuses.append(worker_client.post(f'/api/posts/{post_id}/like', headers=headers).status_code)
+        return statuses
+    
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        statuses = [status for result in pool.map(worker, range(16)) for status in result]
+    
+    assert len(statuses) == 2000
+    assert set(statuses) == {200}
+    
+    with app.app_context():
+        for post_id in post_ids:
+            counter = db.session.get(Post, post_id).likes
+            actual = db.session.query(func.count(PostLike.id)).filter_by(post_id=post_id).scalar()
+            assert counter == actual
+
+
+@pytest.fixture
+def like_buffer(monkeypatch):
+    import app as app_module
+    from like_buffer import LikeBuffer
+    
+    # Long interval: the tests flush explicitly
+    buffer = LikeBuffer(app_module.load_like_state, app_module.persist_like_states, interval=3600)
+    monkeypatch.setattr(app_module, 'like_buffer', buffer)
+    yield buffer
+    buffer._stop.set()
+
+
+def stored_likes(app, post_id):
+    with app.app_context():
+        counter = db.session.get(Post, post_id).likes
+        rows = db.session.query(func.count(PostLike.id)).filter_by(post_id=post_id).scalar()
+        return counter, rows
+
+
+def test_write_behind_answers_immediately_and_flushes_later(app, client, register_user, like_buffer):
+    _, alice = register_user('alice')
+    _, bob = register_user('bob')
+    post_id = client.post('/api/posts', json={'content': 'hi'}, headers=alice).get_json()['post']['id']
+    
+    assert client.post(f'/api/posts/{post_id}/like', headers=alice).get_json()['likes'] == 1
+    response = client.post(f'/api/posts/{post_id}/like', headers=bob).get_json()
+    assert (response['isLiked'], response['likes']) == (True, 2)
+    assert stored_likes(app, post_id) == (0, 0)
+    
+    feed_post = client.get('/api/posts', headers=bob).get_json()['posts'][0]
+    assert (feed_post['isLiked'], feed_post['likes']) == (True, 2)
+    
+    assert like_buffer.flush() == 2
+    assert stored_likes(app, post_id) == (2, 2)
+
+
+def test_write_behind_coalesces_repeated_toggles(app, client, register_user, like_buffer):
+    _, headers = register_user()
+    post_id = client.post('/api/posts', json={'content': 'hi'}, headers=headers).get_json()['post']['id']
+    
+    for expected in (True, False, True, False, True):
+        assert client.post(f'/api/posts/{post_id}/like', headers=headers).get_json()['isLiked'] is expected
+    
+    assert like_buffer.flush() == 1
+    assert stored_likes(app, post_id) == (1, 1)
+    
+    # Unlike then like again returns to the stored state: nothing to write
+    client.post(f'/api/posts/{post_id}/like', headers=headers)
+    client.post(f'/api/posts/{post_id}/like', headers=headers)
+    assert like_buffer.flush() == 0
+
+
+def test_write_behind_drops_likes_of_archived_posts(app, client, register_user, like_buffer):
+    from datetime import datetime, timedelta
+    from archive_posts import archive_posts
+    
+    _, headers = register_user()
+    post_id = client.post('/api/posts', json={'content': 'hi'}, headers=headers).get_json()['post']['id']
+    client.post(f'/api/posts/{post_id}/like', headers=headers)
+    with app.app_context():
+        db.session.execute(update(Post).values(created_at=datetime.utcnow() - timedelta(days=400)))
+        db.session.commit()
+        archive_posts(datetime.utcnow() - timedelta(days=365), chunk_size=10)
+    
+    # The buffered like is written nowhere, and the batch doesn't stay pending
+    assert like_buffer.flush() == 1
+    assert like_buffer.flush() == 0
+    with app.app_context():
+        assert db.session.query(func.count(PostLike.id)).scalar() == 0
+        assert db.session.get(ArchivedPost, post_id).likes == 0
+
+
+class Disconnected(Exception):
+    pass
+
+
+def test_like_buffer_drops_rows_that_keep_failing():
+    from like_buffer import LikeBuffer
+    
+    written = {}
+    def persist(states):
+        if any(post_id == 'bad' for _, post_id in states):
+            raise ValueError('foreign key violation')
+        written.update(states)
+    buffer = LikeBuffer(lambda user_id, post_id: (False, 0), persist, interval=3600)
+    buffer.toggle('alice', 'good')
+    buffer.toggle('alice', 'bad')
+    
+    # Retried once as a batch, then row by row
+    with pytest.raises(ValueError):
+        buffer.flush()
+    assert buffer.flush() == 2
+    assert written == {('alice', 'good'): True}
+    assert buffer.flush() == 0
+    assert buffer.overlay('alice', 'bad', False, 0) == (False, 0)
+    buffer._stop.set()
+
+
+def test_like_buffer_keeps_batches_after_transient_errors():
+    from like_buffer import LikeBuffer
+    
+    def persist(states):
+        raise Disconnected()
+    buffer = LikeBuffer(lambda user_id, post_id: (False, 0), persist, interval=3600,
+                        transient_errors=(Disconnected,), max_pending=2)
+    buffer.toggle('alice', 'post')
+    # Reaching max_pending flushes; the failure doesn't fail the toggle
+    assert buffer.toggle('bob', 'post') == (True, 2)
+    
+    for _ in range(3):
+        with pytest.raises(Disconnected):
+            buffer.flush()
+    assert buffer.overlay('alice', 'post', False, 0) == (True, 2)
+    buffer._stop.set()
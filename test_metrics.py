@@ -0,0 +1,139 @@
+"""
+Tests for the Prometheus metrics endpoint
+"""
+import io
+import os
+import runpy
+import subprocess
+import sys
+import textwrap
+from types import SimpleNamespace
+
+from flask import Flask
+from PIL import Image
+from prometheus_client.parser import text_string_to_metric_families
+
+from metrics import Metrics, create_metrics
+
+
+def samples(text):
+    """{(sample name, sorted label items): value}"""
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(text)
+        for sample in family.samples
+    }
+
+
+def value(scraped, name, **labels):
+    return scraped.get((name, tuple(sorted(labels.items()))), 0)
+
+
+def scrape(client, **kwargs):
+    response = client.get('/metrics', **kwargs)
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain')
+    return samples(response.get_data(as_text=True))
+
+
+def test_requests_are_counted_per_endpoint(client, register_user):
+    _, headers = register_user()
+    before = scrape(client)
+
+    client.get('/api/posts', headers=headers)
+    client.get('/api/posts', headers=headers)
+    client.get('/no/such/page')
+    after = scrape(client)
+
+    def delta(name, **labels):
+        return value(after, name, **labels) - value(before, name, **labels)
+
+    assert delta('http_requests_total', method='GET', endpoint='get_posts', status='200') == 2
+    assert delta('http_requests_total', method='GET', endpoint='unmatched', status='404') == 1
+    assert delta('http_request_duration_seconds_count', method='GET', endpoint='get_posts') == 2
+    # Only the scrape itself is in flight
+    assert value(after, 'http_requests_in_flight', endpoint='get_posts') == 0
+    assert value(after, 'http_requests_in_flight', endpoint='metrics') == 1
+    assert value(after, 'db_pool_connections_in_use', engine='primary') >= 0
+
+
+def test_image_processing_is_timed(client, register_user):
+    _, headers = register_user()
+    before = value(scrape(client), 'image_processing_seconds_count', mode='sync')
+    buffer = io.BytesIO()
+    Image.new('RGB', (300, 300), 'blue').save(buffer, format='PNG')
+    buffer.seek(0)
+
+    response = client.post('/api/auth/profile-picture', headers=headers,
+                           data={'file': (buffer, 'avatar.png')}, content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    assert value(scrape(client), 'image_processing_seconds_count', mode='sync') == before + 1
+
+
+def test_token_protects_the_endpoint():
+    app = Flask(__name__)
+    Metrics(enabled=True, token='scrape-secret').init_app(app, {})
+    client = app.test_client()
+
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'}).status_code == 200
+
+
+def test_endpoint_needs_a_token_or_explicit_opt_in():
+    assert not create_metrics({}).enabled
+    assert create_metrics({'METRICS_TOKEN': 'scrape-secret'}).enabled
+    assert create_metrics({'METRICS_PUBLIC': True}).enabled
+    assert not create_metrics({'METRICS_PUBLIC': True, 'METRICS_ENABLED': False}).enabled
+
+
+def test_disabled_has_no_endpoint():
+    app = Flask(__name__)
+    Metrics(enabled=False).init_app(app, {})
+
+    assert app.test_client().get('/metrics').status_code == 404
+
+
+WORKER = textwrap.dedent('''
+    import sys
+    from flask import Flask
+    from metrics import Metrics, create_metrics
+
+    app = Flask(__name__)
+    metrics = Metrics(enabled=True)
+    metrics.pool_size.labels('primary').set(5)
+    app.add_url_rule('/ping', 'ping', lambda: 'pong')
+    metrics.init_app(app, {})
+    client = app.test_client()
+    for _ in range(int(sys.argv[1])):
+        client.get('/ping')
+    if len(sys.argv) > 2:
+        sys.stdout.write(metrics.render().decode())
+''')
+
+
+def test_workers_are_added_up_in_multiprocess_mode(tmp_path, monkeypatch):
+    monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(tmp_path))
+    cwd = os.path.dirname(os.path.abspath(__file__))
+
+    def run_worker(*args):
+        return subprocess.run([sys.executable, '-c', WORKER, *args], cwd=cwd,
+                              capture_output=True, text=True, check=True).stdout
+
+    run_worker('3')
+    scraped = samples(run_worker('4', 'render'))
+
+    assert value(scraped, 'http_requests_total', method='GET', endpoint='ping', status='200') == 7
+    assert value(scraped, 'http_request_duration_seconds_count', method='GET', endpoint='ping') == 7
+    # 'livesum' gauges count exited workers until they are marked dead
+    assert value(scraped, 'db_pool_size', engine='primary') == 10
+
+    # gunicorn calls child_exit for each worker that exits
+    hooks = runpy.run_path(os.path.join(cwd, 'gunicorn.conf.py'))
+    for name in os.listdir(tmp_path):
+        if name.startswith('gauge_livesum_'):
+            hooks['child_exit'](None, SimpleNamespace(pid=int(name[len('gauge_livesum_'):-len('.db')])))
+    scraped = samples(run_worker('0', 'render'))
+
+    assert value(scraped, 'db_pool_size', engine='primary') == 5
+    assert value(scraped, 'http_requests_total', method='GET', endpoint='ping', status='200') == 7
@@ -0,0 +1,155 @@
+"""
+Tests for the versioned migration runner
+"""
+import base64
+import os
+import subprocess
+import sys
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from app import db
+from migrations import MIGRATIONS, applied_versions, pending_migrations, run_migrations
+
+LEGACY_SCHEMA = [
+    "CREATE TABLE users (id VARCHAR(36) PRIMARY KEY, username VARCHAR(80) UNIQUE, "
+    "email VARCHAR(120) UNIQUE, password_hash VARCHAR(128), display_name VARCHAR(100), "
+    "profile_picture TEXT, profile_picture_data TEXT)",
+    "CREATE TABLE posts (id VARCHAR(36) PRIMARY KEY, user_id VARCHAR(36), content TEXT, "
+    "likes INTEGER, created_at DATETIME)",
+    "CREATE TABLE post_likes (id VARCHAR(36) PRIMARY KEY, user_id VARCHAR(36), "
+    "post_id VARCHAR(36), created_at DATETIME, UNIQUE (user_id, post_id))",
+    "CREATE TABLE image_blobs (key VARCHAR(64) PRIMARY KEY, content_type VARCHAR(50), "
+    "data BLOB, created_at DATETIME)",
+    "CREATE TABLE image_jobs (id VARCHAR(36) PRIMARY KEY, user_id VARCHAR(36), "
+    "status VARCHAR(20), error VARCHAR(200), created_at DATETIME, finished_at DATETIME)",
+]
+
+# Ids written by the uuid4 code before migration 8
+LEGACY_USER_ID = str(uuid.uuid4())
+LEGACY_POST_ID = str(uuid.uuid4())
+
+
+@pytest.fixture
+def legacy_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.execute(text(statement))
+        picture = base64.b64encode(b'jpeg bytes').decode('ascii')
+        conn.execute(text(
+            "INSERT INTO users (id, username, email, password_hash, display_name, profile_picture_data) "
+            "VALUES (:user_id, 'alice', 'alice@example.com', 'x', 'Alice', :picture)"
+        ), {'user_id': LEGACY_USER_ID, 'picture': f'data:image/jpeg;base64,{picture}'})
+        conn.execute(text(
+            "INSERT INTO posts (id, user_id, content, likes, created_at) "
+            "VALUES (:post_id, :user_id, 'hi', 1, CURRENT_TIMESTAMP)"
+        ), {'post_id': LEGACY_POST_ID, 'user_id': LEGACY_USER_ID})
+        conn.execute(text(
+            "INSERT INTO post_likes (id, user_id, post_id, created_at) "
+            "VALUES (:like_id, :user_id, :post_id, CURRENT_TIMESTAMP)"
+        ), {'like_id': str(uuid.uuid4()), 'user_id': LEGACY_USER_ID, 'post_id': LEGACY_POST_ID})
+    yield engine
+    engine.dispose()
+
+
+def index_names(engine):
+    with engine.connect() as conn:
+        inspector = inspect(conn)
+        return {
+            index['name']
+            for table in inspector.get_table_names()
+            for index in inspector.get_indexes(table)
+        }
+
+
+def test_legacy_database_is_brought_up_to_date(legacy_engine):
+    applied = run_migrations(legacy_engine)
+    
+    assert [m.version for m in applied] == [m.version for m in MIGRATIONS]
+    assert applied_versions(legacy_engine) == {m.version for m in MIGRATIONS}
+    assert {
+        'ix_posts_created_at_id', 'ix_posts_user_id', 'ix_post_likes_post_id',
+        'ix_users_profile_picture_hash', 'ix_image_jobs_user_id_created_at'
+    } <= index_names(legacy_engine)
+    with legacy_engine.connect() as conn:
+        user = conn.execute(text(
+            "SELECT profile_picture, profile_picture_data FROM users WHERE username = 'alice'"
+        )).one()
+        blobs = conn.execute(text("SELECT data FROM image_blobs")).scalars().all()
+    assert user.profile_picture.startswith(f'/api/auth/profile-picture/{LEGACY_USER_ID}?v=')
+    assert user.profile_picture_data is None
+    assert blobs == [b'jpeg bytes']
+
+
+def test_ids_become_16_byte_blobs_with_the_same_value(legacy_engine):
+    run_migrations(legacy_engine)
+    
+    with legacy_engine.connect() as conn:
+        post = conn.execute(text("SELECT id, user_id, typeof(id) AS kind FROM posts")).one()
+        like = conn.execute(text("SELECT user_id, post_id FROM post_likes")).one()
+        user_id = conn.execute(text("SELECT id FROM users")).scalar_one()
+    
+    assert post.kind == 'blob'
+    assert str(uuid.UUID(bytes=post.id)) == LEGACY_POST_ID
+    assert str(uuid.UUID(bytes=post.user_id)) == LEGACY_USER_ID
+    assert (like.user_id, like.post_id) == (user_id, post.id)
+
+
+def test_migrations_run_once_and_stop_at_target(legacy_engine):
+    assert [m.version for m in run_migrations(legacy_engine, target=3)] == [1, 2, 3]
+    assert [m.version for m in pending_migrations(legacy_engine)] == [m.version for m in MIGRATIONS[3:]]
+    
+    run_migrations(legacy_engine)
+    assert run_migrations(legacy_engine) == []
+
+
+def test_models_match_migrated_indexes(tmp_path):
+    # A database made by create_all has every index the migrations add
+    engine = create_engine(f"sqlite:///{tmp_path / 'created.db'}")
+    db.metadata.create_all(engine)
+    created = index_names(engine)
+    
+    assert [m.version for m in run_migrations(engine)] == [m.version for m in MIGRATIONS]
+    assert index_names(engine) == created
+    engine.dispose()
+
+
+def run_script(engine, *args):
+    """Run a Python command against engine's database, the way a deployment would"""
+    env = {**os.environ, 'FLASK_ENV': 'development', 'DATABASE_URL': str(engine.url), 'SHARED_CACHE_PATH': 'memory'}
+    return subprocess.run(
+        [sys.executable, *args], cwd=os.path.dirname(__file__), env=env, capture_output=True, text=True
+    )
+
+
+def test_app_starts_on_a_baseline_database_and_migrates(legacy_engine):
+    # The first deployed schema only had users, posts and post_likes
+    with legacy_engine.begin() as conn:
+        conn.execute(text("DROP TABLE image_jobs"))
+        conn.execute(text("DROP TABLE image_blobs"))
+    
+    started = run_script(legacy_engine, '-c', 'import app')
+    assert started.returncode == 0, started.stderr
+    assert 'migration(s) pending' in started.stderr
+    tables = set(inspect(legacy_engine).get_table_names())
+    # image_blobs is needed by the migrations; tables referencing users.id wait for its conversion
+    assert 'image_blobs' in tables
+    assert not {'image_jobs', 'archived_posts'} & tables
+    
+    migrated = run_script(legacy_engine, 'migrate_database.py')
+    assert migrated.returncode == 0, migrated.stdout + migrated.stderr
+    assert applied_versions(legacy_engine) == {m.version for m in MIGRATIONS}
+    assert {'image_jobs', 'archived_posts'} <= set(inspect(legacy_engine).get_table_names())
+    assert 'ix_image_jobs_user_id_created_at' in index_names(legacy_engine)
+    
+    restarted = run_script(legacy_engine, '-c', (
+        "from app import app, db, User\n"
+        "with app.app_context():\n"
+        "    print(db.session.query(User.username).scalar())"
+    ))
+    assert restarted.returncode == 0, restarted.stderr
+    assert restarted.stdout.splitlines()[-1] == 'alice'
+    assert 'pending' not in restarted.stderr
@@ -0,0 +1,424 @@
+"""
+Tests for profile picture upload and serving
+"""
+import io
+import time
+
+import pytest
+
+from PIL import Image
+
+from image_processing import IMAGE_FORMATS, PROFILE_PICTURE_SIZES
+
+VARIANTS_PER_PICTURE = len(PROFILE_PICTURE_SIZES) * len(IMAGE_FORMATS)
+
+
+def make_image(color='red', size=(400, 300), fmt='JPEG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color=color).save(buffer, fmt)
+    buffer.seek(0)
+    return buffer
+
+
+def upload(client, headers, image, filename='avatar.jpg'):
+    return client.post('/api/auth/profile-picture', headers=headers,
+                       data={'file': (image, filename)},
+                       content_type='multipart/form-data')
+
+
+def test_upload_and_serve_profile_picture(client, register_user):
+    user, headers = register_user()
+    
+    response = upload(client, headers, make_image())
+    assert response.status_code == 200
+    
+    served = client.get(f"/api/auth/profile-picture/{user['id']}")
+    assert served.status_code == 200
+    assert served.mimetype == 'image/jpeg'
+    assert Image.open(io.BytesIO(served.data)).size == (300, 225)
+
+
+def test_identical_uploads_share_one_blob(app, client, register_user):
+    from app import ImageBlob
+    
+    _, alice_headers = register_user('alice')
+    _, bob_headers = register_user('bob')
+    upload(client, alice_headers, make_image())
+    upload(client, bob_headers, make_image())
+    
+    with app.app_context():
+        assert ImageBlob.query.count() == VARIANTS_PER_PICTURE
+
+
+def test_replaced_picture_releases_unused_blob(app, client, register_user):
+    from app import ImageBlob
+    
+    _, headers = register_user()
+    upload(client, headers, make_image('red'))
+    upload(client, headers, make_image('blue'))
+    
+    with app.app_context():
+        assert ImageBlob.query.count() == VARIANTS_PER_PICTURE
+
+
+def test_missing_profile_picture_returns_404(client, register_user):
+    user, _ = register_user()
+    assert client.get(f"/api/auth/profile-picture/{user['id']}").status_code == 404
+
+
+def test_profile_picture_url_is_content_versioned(client, register_user):
+    user, headers = register_user()
+    
+    first = upload(client, headers, make_image('red')).get_json()['user']['profilePicture']
+    second = upload(client, headers, make_image('blue')).get_json()['user']['profilePicture']
+    
+    assert first.startswith(f"/api/auth/profile-picture/{user['id']}?v=")
+    assert first != second
+    
+    served = client.get(second)
+    assert 'immutable' in served.headers['Cache-Control']
+    
+    # Only the full version string names the content; a prefix of it doesn't
+    version = second.split('?v=')[1]
+    truncated = client.get(f"/api/auth/profile-picture/{user['id']}?v={version[:1]}")
+    assert truncated.headers['Cache-Control'] == 'public, no-cache'
+
+
+def test_profile_picture_revalidation_returns_304(client, register_user):
+    user, headers = register_user()
+    upload(client, headers, make_image())
+    
+    first = client.get(f"/api/auth/profile-picture/{user['id']}")
+    assert first.headers['Cache-Control'] == 'public, no-cache'
+    
+    revalidated = client.get(f"/api/auth/profile-picture/{user['id']}",
+                             headers={'If-None-Match': first.headers['ETag']})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+    assert revalidated.headers['ETag'] == first.headers['ETag']
+
+
+@pytest.fixture
+def filesystem_store(tmp_path, monkeypatch):
+    import app as app_module
+    from image_store import FilesystemImageStore
+    
+    store = FilesystemImageStore(str(tmp_path))
+    monkeypatch.setattr(app_module, 'image_store', store)
+    return store
+
+
+def test_filesystem_store_writes_each_picture_once(client, register_user, filesystem_store, tmp_path):
+    alice, alice_headers = register_user('alice')
+    _, bob_headers = register_user('bob')
+    upload(client, alice_headers, make_image())
+    upload(client, bob_headers, make_image())
+    
+    files = [path for path in tmp_path.rglob('*') if path.is_file()]
+    assert len(files) == VARIANTS_PER_PICTURE
+    
+    served = client.get(f"/api/auth/profile-picture/{alice['id']}")
+    assert served.status_code == 200
+    assert served.data in [path.read_bytes() for path in files]
+
+
+def test_failed_commit_keeps_the_old_picture_files(app, client, register_user, filesystem_store, tmp_path, monkeypatch):
+    import app as app_module
+    
+    alice, headers = register_user('alice')
+    upload(client, headers, make_image('red'))
+    old_files = {path for path in tmp_path.rglob('*') if path.is_file()}
+    
+    def failing_commit():
+        raise RuntimeError('database went away')
+    with monkeypatch.context() as patch:
+        patch.setattr(app_module.db.session, 'commit', failing_commit)
+        response = upload(client, headers, make_image('blue'))
+    
+    assert response.status_code == 500
+    assert all(path.exists() for path in old_files)
+    assert client.get(f"/api/auth/profile-picture/{alice['id']}").status_code == 200
+
+
+def test_replaced_picture_files_are_deleted_after_commit(client, register_user, filesystem_store, tmp_path):
+    _, headers = register_user('alice')
+    upload(client, headers, make_image('red'))
+    upload(client, headers, make_image('blue'))
+    
+    files = [path for path in tmp_path.rglob('*') if path.is_file()]
+    assert len(files) == VARIANTS_PER_PICTURE
+
+
+def test_upload_restores_files_deleted_by_a_concurrent_release(
+        client, register_user, filesystem_store, tmp_path, monkeypatch):
+    import shutil
+    import app as app_module
+    
+    _, alice_headers = register_user('alice')
+    bob, bob_headers = register_user('bob')
+    upload(client, alice_headers, make_image('red'))
+    
+    # Another worker releases the same picture right after put() skipped it
+    apply = app_module.apply_profile_picture
+    def apply_then_release(user, variants):
+        replaced_key = apply(user, variants)
+        for path in tmp_path.iterdir():
+            shutil.rmtree(path)
+        return replaced_key
+    with monkeypatch.context() as patch:
+        patch.setattr(app_module, 'apply_profile_picture', apply_then_release)
+        assert upload(client, bob_headers, make_image('red')).status_code == 200
+    
+    assert client.get(f"/api/auth/profile-picture/{bob['id']}").status_code == 200
+
+
+def test_release_puts_back_a_picture_referenced_meanwhile(
+        app, client, register_user, filesystem_store, monkeypatch):
+    import app as app_module
+    from sqlalchemy import update
+    
+    alice, alice_headers = register_user('alice')
+    bob, _ = register_user('bob')
+    upload(client, alice_headers, make_image('red'))
+    with app.app_context():
+        red_key = app_module.db.session.get(app_module.User, alice['id']).profile_picture_hash
+    
+    # Bob's upload of the same picture commits while alice's release deletes it
+    delete = filesystem_store.delete
+    def delete_while_referenced(key):
+        app_module.db.session.execute(
+            update(app_module.User).where(app_module.User.id == bob['id']).values(profile_picture_hash=red_key)
+        )
+        delete(key)
+    monkeypatch.setattr(filesystem_store, 'delete', delete_while_referenced)
+    upload(client, alice_headers, make_image('blue'))
+    
+    assert client.get(f"/api/auth/profile-picture/{bob['id']}").status_code == 200
+
+
+def test_filesystem_store_delegates_to_accel_redirect(client, register_user, filesystem_store):
+    filesystem_store.sendfile_mode = 'x-accel-redirect'
+    user, headers = register_user()
+    upload(client, headers, make_image())
+    
+    served = client.get(f"/api/auth/profile-picture/{user['id']}")
+    assert served.status_code == 200
+    assert served.data == b''
+    assert served.headers['X-Accel-Redirect'].startswith('/protected-images/')
+
+
+def test_migrate_images_moves_blobs_to_filesystem(app, client, register_user, tmp_path, monkeypatch):
+    import migrate_images
+    from app import ImageBlob
+    
+    user, headers = register_user()
+    upload(client, headers, make_image())
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    
+    assert migrate_images.migrate_images()
+    
+    # The app still reads image_blobs until IMAGE_STORAGE is switched
+    with app.app_context():
+        assert ImageBlob.query.count() == VARIANTS_PER_PICTURE
+    assert len([path for path in tmp_path.rglob('*') if path.is_file()]) == VARIANTS_PER_PICTURE
+    assert not migrate_images.migrate_images(delete_rows=True)
+    
+    monkeypatch.setitem(app.config, 'IMAGE_STORAGE', 'filesystem')
+    assert migrate_images.migrate_images(delete_rows=True)
+    
+    with app.app_context():
+        assert ImageBlob.query.count() == 0
+    assert len([path for path in tmp_path.rglob('*') if path.is_file()]) == VARIANTS_PER_PICTURE
+
+
+def test_profile_picture_variant_negotiation(client, register_user):
+    user, headers = register_user()
+    upload(client, headers, make_image())
+    url = f"/api/auth/profile-picture/{user['id']}"
+    
+    small_webp = client.get(f'{url}?size=40', headers={'Accept': 'image/webp,image/*'})
+    assert small_webp.mimetype == 'image/webp'
+    assert max(Image.open(io.BytesIO(small_webp.data)).size) == 48
+    assert 'Accept' in small_webp.headers['Vary']
+    
+    medium_jpeg = client.get(f'{url}?size=150', headers={'Accept': '*/*'})
+    assert medium_jpeg.mimetype == 'image/jpeg'
+    assert max(Image.open(io.BytesIO(medium_jpeg.data)).size) == 150
+    
+    revalidated = client.get(f'{url}?size=40', headers={
+        'Accept': 'image/webp', 'If-None-Match': small_webp.headers['ETag']
+    })
+    assert revalidated.status_code == 304
+
+
+def test_async_upload_returns_job_and_applies_picture(app, client, register_user, monkeypatch):
+    monkeypatch.setitem(app.config, 'IMAGE_PROCESSING_MODE', 'async')
+    user, headers = register_user()
+    
+    response = upload(client, headers, make_image())
+    assert response.status_code == 202
+    status_url = response.get_json()['statusUrl']
+    
+    deadline = time.time() + 30
+    while True:
+        status = client.get(status_url, headers=headers).get_json()
+        if status['job']['status'] != 'pending' or time.time() > deadline:
+            break
+        time.sleep(0.05)
+    
+    assert status['job']['status'] == 'done'
+    assert status['user']['profilePicture'].startswith(f"/api/auth/profile-picture/{user['id']}?v=")
+    assert client.get(status['user']['profilePicture']).status_code == 200
+
+
+def test_async_upload_applies_back_pressure(app, client, register_user, monkeypatch):
+    import app as app_module
+    from image_jobs import ImageJobQueue
+    
+    monkeypatch.setitem(app.config, 'IMAGE_PROCESSING_MODE', 'async')
+    monkeypatch.setattr(app_module, 'image_job_queue', ImageJobQueue(max_pending=0))
+    _, headers = register_user()
+    
+    response = upload(client, headers, make_image())
+    assert response.status_code == 503
+    assert 'Retry-After' in response.headers
+
+
+def test_pending_job_fails_after_timeout(app, client, register_user):
+    import app as app_module
+    from datetime import datetime, timedelta
+    from concurrent.futures import Future
+    
+    user, headers = register_user()
+    with app.app_context():
+        job = app_module.ImageJob(user_id=user['id'], created_at=datetime.utcnow() - timedelta(hours=1))
+        app_module.db.session.add(job)
+        app_module.db.session.commit()
+        job_id = job.id
+    
+    status = client.get(f"/api/auth/profile-picture/jobs/{job_id}", headers=headers).get_json()
+    assert (status['job']['status'], status['job']['error']) == ('failed', 'Image processing timed out')
+    
+    # A result arriving after the client was told it failed is ignored
+    late = Future()
+    late.set_result(app_module.generate_variants_from_bytes(make_image().getvalue(), 'jpg', 40_000_000))
+    app_module.finish_image_job(job_id, late)
+    status = client.get(f"/api/auth/profile-picture/jobs/{job_id}", headers=headers).get_json()
+    assert status['job']['status'] == 'failed'
+    with app.app_context():
+        assert app_module.db.session.get(app_module.User, user['id']).profile_picture_hash is None
+
+
+def test_job_queue_replaces_a_broken_pool():
+    import os
+    from concurrent.futures import Future
+    from concurrent.futures.process import BrokenProcessPool
+    from image_jobs import ImageJobQueue
+    
+    queue = ImageJobQueue(max_pending=2)
+    outcomes = []
+    try:
+        # The pool process exits mid-job
+        assert queue.reserve()
+        queue.submit(os._exit, (1,), outcomes.append).exception(timeout=30)
+        assert queue.reserve()
+        future = queue.submit(pow, (2, 10), outcomes.append)
+        assert future.result(timeout=30) == 1024
+    finally:
+        queue.shutdown()
+    
+    assert isinstance(outcomes[0].exception(), BrokenProcessPool)
+    # Both slots came back
+    assert queue.reserve() and queue.reserve()
+
+
+def test_upload_rejects_mismatched_format(client, register_user):
+    _, headers = register_user()
+    response = upload(client, headers, make_image(fmt='PNG'), filename='avatar.jpg')
+    assert response.status_code == 400
+    assert 'extension' in response.get_json()['error']
+
+
+def test_upload_rejects_animated_image(client, register_user):
+    _, headers = register_user()
+    frames = [Image.new('RGB', (50, 50), color) for color in ('red', 'blue')]
+    buffer = io.BytesIO()
+    frames[0].save(buffer, 'GIF', save_all=True, append_images=frames[1:])
+    buffer.seek(0)
+    
+    response = upload(client, headers, buffer, filename='avatar.gif')
+    assert response.status_code == 400
+    assert 'Animated' in response.get_json()['error']
+
+
+def test_multi_picture_jpeg_is_accepted(client, register_user):
+    user, headers = register_user()
+    # Phones store HDR gain maps as a second picture (MPO)
+    image = io.BytesIO()
+    Image.new('RGB', (400, 300), 'red').save(
+        image, 'MPO', save_all=True, append_images=[Image.new('L', (200, 150))]
+    )
+    image.seek(0)
+    
+    response = upload(client, headers, image, 'photo.jpg')
+    assert response.status_code == 200
+    
+    served = client.get(f"/api/auth/profile-picture/{user['id']}", headers={'Accept': 'image/jpeg'})
+    assert Image.open(io.BytesIO(served.data)).getpixel((0, 0))[0] > 200
+
+
+def test_upload_rejects_oversized_dimensions(app, client, register_user, monkeypatch):
+    monkeypatch.setitem(app.config, 'IMAGE_MAX_PIXELS', 100 * 100)
+    _, headers = register_user()
+    
+    response = upload(client, headers, make_image(size=(400, 300)))
+    assert response.status_code == 400
+    assert 'too large' in response.get_json()['error']
+
+
+def test_pixel_limit_follows_the_configured_value():
+    from image_processing import ImageRejected, inspect_image
+    
+    # Above Pillow's built-in bomb limit; 1-bit pixels keep the test image small
+    buffer = io.BytesIO()
+    Image.new('1', (10_000, 9_000)).save(buffer, 'PNG')
+    
+    buffer.seek(0)
+    assert inspect_image(buffer, 'png', max_pixels=100_000_000).size == (10_000, 9_000)
+    buffer.seek(0)
+    with pytest.raises(ImageRejected, match='too large'):
+        inspect_image(buffer, 'png', max_pixels=80_000_000)
+    # Pillow's own guard stays on for code that doesn't go through inspect_image
+    assert Image.MAX_IMAGE_PIXELS == 100_000_000
+
+
+def test_palette_image_is_shrunk_before_colour_conversion(monkeypatch):
+    import image_processing
+    
+    converted = []
+    to_rgb = image_processing._to_rgb
+    def recording_to_rgb(img):
+        converted.append(img.size)
+        return to_rgb(img)
+    monkeypatch.setattr(image_processing, '_to_rgb', recording_to_rgb)
+    buffer = io.BytesIO()
+    Image.new('P', (6000, 4000)).save(buffer, 'PNG')
+    buffer.seek(0)
+    
+    variants = image_processing.generate_variants(buffer, 'png')
+    
+    assert len(variants) == VARIANTS_PER_PICTURE
+    # Never expanded to RGB at full resolution
+    assert max(max(size) for size in converted) <= 2 * image_processing.DEFAULT_PROFILE_PICTURE_SIZE
+
+
+def test_transparent_png_is_flattened(client, register_user):
+    user, headers = register_user()
+    buffer = io.BytesIO()
+    Image.new('RGBA', (600, 600), (255, 0, 0, 0)).save(buffer, 'PNG')
+    buffer.seek(0)
+    
+    assert upload(client, headers, buffer, filename='avatar.png').status_code == 200
+    served = Image.open(io.BytesIO(client.get(f"/api/auth/profile-picture/{user['id']}").data))
+    assert served.mode == 'RGB'
+    assert served.getpixel((10, 10)) > (240, 240, 240)
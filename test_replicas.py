@@ -0,0 +1,101 @@
+"""
+Tests for read-replica routing, with a second SQLite file as the replica
+"""
+import pytest
+from sqlalchemy import create_engine, insert, select
+
+from app import db, Post, User
+from replicas import ReplicaRouter
+
+
+@pytest.fixture
+def replica_engine(app, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    db.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def use_replicas(monkeypatch, engines):
+    import app as app_module
+    
+    router = ReplicaRouter(engines, app_module.shared_store, sticky_seconds=60, retry_after=60)
+    monkeypatch.setattr(app_module, 'replica_router', router)
+    return router
+
+
+def replicate(app, replica_engine):
+    """Catch the replica up with the primary"""
+    with app.app_context():
+        source = db.engine.raw_connection()
+    target = replica_engine.raw_connection()
+    try:
+        source.driver_connection.backup(target.driver_connection)
+    finally:
+        source.close()
+        target.close()
+
+
+def test_reads_go_to_the_replica(app, client, register_user, replica_engine, monkeypatch):
+    register_user('alice')
+    _, bob = register_user('bob')
+    use_replicas(monkeypatch, [replica_engine])
+    
+    # The replica hasn't received alice yet
+    assert client.get('/api/users/alice', headers=bob).status_code == 404
+    
+    replicate(app, replica_engine)
+    assert client.get('/api/users/alice', headers=bob).status_code == 200
+
+
+def test_writers_read_their_own_writes(app, client, register_user, replica_engine, monkeypatch):
+    _, alice = register_user('alice')
+    _, bob = register_user('bob')
+    replicate(app, replica_engine)
+    use_replicas(monkeypatch, [replica_engine])
+    
+    client.put('/api/auth/profile', json={'bio': 'fresh'}, headers=alice)
+    
+    assert client.get('/api/users/alice', headers=alice).get_json()['user']['bio'] == 'fresh'
+    assert client.get('/api/users/alice', headers=bob).get_json()['user']['bio'] != 'fresh'
+
+
+def test_session_moves_to_the_primary_on_first_write(app, replica_engine):
+    with app.app_context():
+        user = User(username='carol', email='carol@example.com', display_name='Carol', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        db.session.remove()
+        
+        db.session.info['replica'] = replica_engine
+        assert db.session.get(User, user_id) is None
+        
+        db.session.execute(insert(Post).values(id='0190f3c2-0000-7000-8000-000000000001', user_id=user_id,
+                                               content='hi', likes=0))
+        assert db.session.get(User, user_id) is not None
+        assert db.session.scalars(select(Post.content)).all() == ['hi']
+        db.session.rollback()
+
+
+def test_failed_replica_fails_over_to_the_primary(app, client, register_user, tmp_path, monkeypatch):
+    register_user('alice')
+    _, bob = register_user('bob')
+    broken = create_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    router = use_replicas(monkeypatch, [broken])
+    
+    assert client.get('/api/users/alice', headers=bob).status_code == 200
+    assert router.stats() == {'replicas': 1, 'healthy': 0, 'failovers': 1}
+    
+    # Skipped while down: no second failure
+    assert client.get('/api/users/alice', headers=bob).status_code == 200
+    assert router.stats()['failovers'] == 1
+
+
+def test_replicas_are_used_round_robin(app, tmp_path):
+    engines = [create_engine(f"sqlite:///{tmp_path / f'replica{i}.db'}") for i in range(2)]
+    router = ReplicaRouter(engines, store=None)
+    
+    assert [router.choose() for _ in range(4)] == engines * 2
+    router.mark_down(0)
+    assert [router.choose() for _ in range(2)] == [engines[1]] * 2
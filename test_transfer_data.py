@@ -0,0 +1,137 @@
+"""
+Tests for the bulk NDJSON export/import tool
+"""
+import json
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, func, select
+
+from transfer_data import DEFAULT_TABLES, _copy_text, export_tables, import_tables, selected_tables
+
+
+@pytest.fixture
+def dataset(app, client, register_user):
+    """Three users with posts and likes; returns the database contents"""
+    from app import db
+
+    headers = [register_user(name)[1] for name in ('alice', 'bob', 'carol')]
+    post_ids = []
+    for i, h in enumerate(headers):
+        for j in range(3):
+            response = client.post('/api/posts', json={'content': f'post {i}-{j}\twith "tab"\nand newline'}, headers=h)
+            post_ids.append(response.get_json()['post']['id'])
+    for h in headers:
+        for post_id in post_ids[::2]:
+            client.post(f'/api/posts/{post_id}/like', headers=h)
+    with app.app_context():
+        return db.metadata, dump(db.engine, selected_tables(db.metadata, DEFAULT_TABLES))
+
+
+def dump(engine, tables):
+    with engine.connect() as conn:
+        return {
+            table.name: sorted(map(tuple, conn.execute(select(table)).all()), key=repr)
+            for table in tables
+        }
+
+
+def target_engine(tmp_path, metadata):
+    engine = create_engine(f"sqlite:///{tmp_path / 'target.db'}")
+    metadata.create_all(engine)
+    return engine
+
+
+def test_round_trip(app, dataset, tmp_path):
+    from app import db
+    metadata, contents = dataset
+    tables = selected_tables(metadata, DEFAULT_TABLES)
+
+    with app.app_context():
+        manifest = export_tables(db.engine, tables, tmp_path / 'export', chunk_size=2)
+    target = target_engine(tmp_path, metadata)
+    imported = import_tables(target, tables, tmp_path / 'export', chunk_size=4)
+
+    assert {name: state['rows'] for name, state in manifest['tables'].items()} == {
+        'users': 3, 'posts': 9, 'post_likes': 15, 'archived_posts': 0
+    }
+    assert imported == {'users': 3, 'posts': 9, 'post_likes': 15, 'archived_posts': 0}
+    assert dump(target, tables) == contents
+
+
+def test_interrupted_export_resumes(app, dataset, tmp_path):
+    from app import db
+    metadata, _ = dataset
+    tables = selected_tables(metadata, DEFAULT_TABLES)
+    directory = tmp_path / 'export'
+    with app.app_context():
+        export_tables(db.engine, tables, directory, chunk_size=2)
+    complete = (directory / 'posts.ndjson').read_bytes()
+
+    # As if the run died after the first chunk of posts, halfway through writing the second
+    lines = complete.splitlines(keepends=True)
+    manifest = json.loads((directory / 'manifest.json').read_text())
+    manifest['tables']['posts'].update(
+        rows=2, bytes=len(lines[0]) + len(lines[1]), last_key=json.loads(lines[1])['id'], done=False
+    )
+    manifest['tables']['users'].update(rows=0, bytes=0, last_key=None, done=False)
+    (directory / 'manifest.json').write_text(json.dumps(manifest))
+    (directory / 'posts.ndjson').write_bytes(lines[0] + lines[1] + lines[2][:10])
+    (directory / 'users.ndjson').unlink()
+
+    with app.app_context():
+        resumed = export_tables(db.engine, tables, directory, chunk_size=2)
+
+    assert (directory / 'posts.ndjson').read_bytes() == complete
+    assert resumed['tables']['posts']['rows'] == 9
+    assert resumed['tables']['users']['rows'] == 3
+
+
+def test_interrupted_import_resumes_without_duplicates(app, dataset, tmp_path):
+    from app import db
+    metadata, contents = dataset
+    tables = selected_tables(metadata, DEFAULT_TABLES)
+    directory = tmp_path / 'export'
+    with app.app_context():
+        export_tables(db.engine, tables, directory, chunk_size=100)
+    likes_file = directory / 'post_likes.ndjson'
+    good = likes_file.read_text()
+    lines = good.splitlines(keepends=True)
+    likes_file.write_text(''.join(lines[:8]) + '{broken\n' + ''.join(lines[9:]))
+    target = target_engine(tmp_path, metadata)
+
+    with pytest.raises(ValueError):
+        import_tables(target, tables, directory, chunk_size=4)
+    with target.connect() as conn:
+        partial = conn.execute(select(func.count()).select_from(metadata.tables['post_likes'])).scalar()
+
+    likes_file.write_text(good)
+    resumed = import_tables(target, tables, directory, chunk_size=4)
+
+    # The two chunks before the broken line were committed and are skipped
+    assert partial == 8
+    assert resumed == {'users': 0, 'posts': 0, 'post_likes': 7, 'archived_posts': 0}
+    assert dump(target, tables) == contents
+
+
+def test_import_needs_a_finished_export(app, dataset, tmp_path):
+    from app import db
+    metadata, _ = dataset
+    tables = selected_tables(metadata, DEFAULT_TABLES)
+    directory = tmp_path / 'export'
+    with app.app_context():
+        export_tables(db.engine, tables, directory)
+    manifest = json.loads((directory / 'manifest.json').read_text())
+    manifest['tables']['posts']['done'] = False
+    (directory / 'manifest.json').write_text(json.dumps(manifest))
+
+    with pytest.raises(ValueError, match='unfinished'):
+        import_tables(target_engine(tmp_path, metadata), tables, directory)
+
+
+def test_copy_text_escapes_values():
+    assert _copy_text(None) == '\\N'
+    assert _copy_text('a\tb\nc\\d') == 'a\\tb\\nc\\\\d'
+    assert _copy_text(b'\x01\xff') == '\\\\x01ff'
+    assert _copy_text(datetime(2024, 1, 2, 3, 4, 5, 6)) == '2024-01-02T03:04:05.000006'
+    assert _copy_text(7) == '7'
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Bulk export and import of users, posts, likes and archived posts as NDJSON,
+for restoring a backup or cloning a database into another one.
+
+Usage:
+    python transfer_data.py export DIR              # write DIR/<table>.ndjson
+    python transfer_data.py import DIR              # load a finished export
+    python transfer_data.py export DIR --restart    # discard a partial export
+    python transfer_data.py import DIR --tables users,posts --chunk-size 50000
+
+Both directions work in chunks of --chunk-size rows, so memory stays flat
+however large the tables are, and both pick up where an interrupted run
+stopped:
+
+- export walks each table in primary key order and records the last key and
+  the file length after every chunk in DIR/manifest.json. A rerun cuts the
+  file back to that length and continues after that key.
+- import commits each chunk in its own transaction together with the number
+  of lines done, kept in the bulk_import_progress table of the target
+  database, so a rerun skips exactly the chunks that were committed.
+
+Chunks go into PostgreSQL with COPY and into SQLite with one executemany per
+chunk. image_blobs can be added with --tables when pictures are stored in
+the database.
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import sys
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, delete, insert, select, update
+from sqlalchemy.types import DateTime, LargeBinary, TypeDecorator
+
+# In foreign key order; export runs it backwards (see export_tables)
+DEFAULT_TABLES = ['users', 'posts', 'post_likes', 'archived_posts']
+TRANSFERABLE_TABLES = DEFAULT_TABLES + ['image_blobs']
+MANIFEST = 'manifest.json'
+FORMAT_VERSION = 1
+
+progress_metadata = MetaData()
+import_progress = Table(
+    'bulk_import_progress', progress_metadata,
+    Column('table_name', String(64), primary_key=True),
+    Column('dump_id', String(36), nullable=False),
+    Column('lines', Integer, nullable=False),
+)
+
+
+def _encoder(column):
+    """Python value of column -> JSON value"""
+    if isinstance(column.type, DateTime):
+        return lambda value: value.isoformat()
+    if isinstance(column.type, LargeBinary):
+        return lambda value: base64.b64encode(value).decode('ascii')
+    return None
+
+
+def _decoder(column):
+    """JSON value -> Python value of column"""
+    if isinstance(column.type, DateTime):
+        return datetime.fromisoformat
+    if isinstance(column.type, LargeBinary):
+        return base64.b64decode
+    return None
+
+
+def _copy_text(value):
+    """A value in PostgreSQL's COPY text format"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bytes):
+        return '\\\\x' + value.hex()
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def _write_manifest(directory, manifest):
+    # Replaced atomically, so a crash leaves the previous checkpoint
+    path = os.path.join(directory, MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+
+
+def read_manifest(directory):
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def export_tables(engine, tables, directory, chunk_size=10000, restart=False):
+    """Write each table to directory/<name>.ndjson; returns the manifest"""
+    os.makedirs(directory, exist_ok=True)
+    manifest = None if restart else read_manifest(directory)
+    names = [table.name for table in tables]
+    if manifest is not None and manifest['tables'].keys() != set(names):
+        raise ValueError(f"{directory} holds an export of other tables; use --restart to replace it")
+    if manifest is None:
+        manifest = {
+            'format': FORMAT_VERSION,
+            'dump_id': str(uuid.uuid4()),
+            'database': engine.dialect.name,
+            'started_at': datetime.utcnow().isoformat(),
+            'tables': {name: {'rows': 0, 'bytes': 0, 'last_key': None, 'done': False} for name in names},
+        }
+        _write_manifest(directory, manifest)
+
+    # Children first: a like exported before its post is still matched by the
+    # post export, which runs later, so the dump has no dangling references
+    # even when the database is being written to meanwhile
+    for table in reversed(tables):
+        state = manifest['tables'][table.name]
+        if state['done']:
+            print(f"✓ {table.name}: already exported ({state['rows']} rows)")
+            continue
+
+        key = table.primary_key.columns.values()[0]
+        encoders = {column.name: _encoder(column) for column in table.columns}
+        path = os.path.join(directory, f"{table.name}.ndjson")
+        mode = 'r+b' if os.path.exists(path) else 'wb'
+        with open(path, mode) as f:
+            # Drop whatever was written after the last checkpoint
+            f.truncate(state['bytes'])
+            f.seek(state['bytes'])
+            while True:
+                statement = select(table).order_by(key).limit(chunk_size)
+                if state['last_key'] is not None:
+                    statement = statement.where(key > state['last_key'])
+                with engine.connect() as conn:
+                    rows = conn.execute(statement).mappings().all()
+                if not rows:
+                    break
+
+                lines = []
+                for row in rows:
+                    record = dict(row)
+                    for name, encode in encoders.items():
+                        if encode is not None and record[name] is not None:
+                            record[name] = encode(record[name])
+                    lines.append(json.dumps(record, separators=(',', ':'), ensure_ascii=False))
+                f.write(('\n'.join(lines) + '\n').encode('utf-8'))
+                f.flush()
+                os.fsync(f.fileno())
+
+                state['rows'] += len(rows)
+                state['bytes'] = f.tell()
+                state['last_key'] = rows[-1][key.name]
+                _write_manifest(directory, manifest)
+                print(f"  {table.name}: {state['rows']} rows")
+
+        state['done'] = True
+        _write_manifest(directory, manifest)
+        print(f"✅ {table.name}: exported {state['rows']} rows")
+    return manifest
+
+
+def _copy_rows(conn, table, rows):
+    """COPY rows (dicts of bind values) into a PostgreSQL table"""
+    columns = [column.name for column in table.columns]
+    # Custom types such as GUID convert their values; the rest are written as they are
+    decorated = {column.name: column.type for column in table.columns if isinstance(column.type, TypeDecorator)}
+    buffer = io.StringIO()
+    for row in rows:
+        values = []
+        for name in columns:
+            value = row.get(name)
+            if name in decorated and value is not None:
+                value = decorated[name].process_bind_param(value, conn.dialect)
+            values.append(_copy_text(value))
+        buffer.write('\t'.join(values) + '\n')
+
+    sql = f"COPY {table.name} ({', '.join(columns)}) FROM STDIN"
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        if hasattr(cursor, 'copy_expert'):
+            # psycopg2
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+        else:
+            # psycopg 3
+            with cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+    finally:
+        cursor.close()
+
+
+def _import_progress(conn, table, dump_id, restart):
+    """Lines of table already imported from this dump"""
+    row = conn.execute(
+        select(import_progress.c.dump_id, import_progress.c.lines)
+        .where(import_progress.c.table_name == table.name)
+    ).first()
+    if row is None or restart:
+        conn.execute(delete(import_progress).where(import_progress.c.table_name == table.name))
+        conn.execute(insert(import_progress).values(table_name=table.name, dump_id=dump_id, lines=0))
+        return 0
+    if row.dump_id != dump_id:
+        raise ValueError(
+            f"{table.name} was partly imported from another export; use --restart to import this one"
+        )
+    return row.lines
+
+
+def import_tables(engine, tables, directory, chunk_size=10000, restart=False):
+    """Load a finished export into tables; returns {table name: rows imported by this run}"""
+    manifest = read_manifest(directory)
+    if manifest is None:
+        raise ValueError(f"{directory} has no {MANIFEST}")
+    if manifest.get('format') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported export format {manifest.get('format')}")
+    missing = [table.name for table in tables if table.name not in manifest['tables']]
+    if missing:
+        raise ValueError(f"The export has no {', '.join(missing)}")
+    unfinished = [table.name for table in tables if not manifest['tables'][table.name]['done']]
+    if unfinished:
+        raise ValueError(f"The export of {', '.join(unfinished)} is unfinished; run export again to complete it")
+
+    progress_metadata.create_all(engine)
+    use_copy = engine.dialect.name == 'postgresql'
+    imported = {}
+
+    # Parents first, so foreign keys always resolve
+    for table in tables:
+        with engine.begin() as conn:
+            done = _import_progress(conn, table, manifest['dump_id'], restart)
+        total = manifest['tables'][table.name]['rows']
+        if done >= total:
+            print(f"✓ {table.name}: already imported ({total} rows)")
+            imported[table.name] = 0
+            continue
+        if done:
+            print(f"↪ {table.name}: resuming after {done} rows")
+
+        decoders = {column.name: _decoder(column) for column in table.columns}
+        lines_done = done
+
+        def flush(chunk, lines_done):
+            with engine.begin() as conn:
+                if use_copy:
+                    _copy_rows(conn, table, chunk)
+                else:
+                    conn.execute(insert(table), chunk)
+                # Committed with the rows, so a rerun never loads them twice
+                conn.execute(
+                    update(import_progress)
+                    .where(import_progress.c.table_name == table.name)
+                    .values(lines=lines_done)
+                )
+            print(f"  {table.name}: {lines_done} rows")
+
+        chunk = []
+        with open(os.path.join(directory, f"{table.name}.ndjson"), encoding='utf-8') as f:
+            for line_number, line in enumerate(f):
+                if line_number < done:
+                    continue
+                record = json.loads(line)
+                for name, decode in decoders.items():
+                    if decode is not None and record.get(name) is not None:
+                        record[name] = decode(record[name])
+                chunk.append(record)
+                if len(chunk) >= chunk_size:
+                    lines_done += len(chunk)
+                    flush(chunk, lines_done)
+                    chunk = []
+        if chunk:
+            lines_done += len(chunk)
+            flush(chunk, lines_done)
+
+        count = lines_done - done
+        imported[table.name] = count
+        print(f"✅ {table.name}: imported {count} rows")
+    return imported
+
+
+def selected_tables(metadata, names):
+    unknown = [name for name in names if name not in TRANSFERABLE_TABLES]
+    if unknown:
+        raise ValueError(f"Can't transfer {', '.join(unknown)}; choose from {', '.join(TRANSFERABLE_TABLES)}")
+    # Always in foreign key order, whatever order they were given in
+    return [metadata.tables[name] for name in TRANSFERABLE_TABLES if name in names]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bulk NDJSON export/import of users, posts, likes and archived posts')
+    parser.add_argument('command', choices=['export', 'import'])
+    parser.add_argument('directory', help='Directory holding the NDJSON files and manifest.json')
+    parser.add_argument('--tables', default=','.join(DEFAULT_TABLES),
+                        help=f"Comma separated, from {', '.join(TRANSFERABLE_TABLES)}")
+    parser.add_argument('--chunk-size', type=int, default=10000, help='Rows per query or transaction')
+    parser.add_argument('--restart', action='store_true', help='Ignore the progress of an earlier run')
+    args = parser.parse_args()
+
+    from app import app, db
+
+    with app.app_context():
+        try:
+            tables = selected_tables(db.metadata, [name.strip() for name in args.tables.split(',') if name.strip()])
+            print(f"🔧 {args.command.title()}ing {', '.join(table.name for table in tables)} "
+                  f"({db.engine.dialect.name}, {args.directory})")
+            if args.command == 'export':
+                export_tables(db.engine, tables, args.directory, args.chunk_size, args.restart)
+            else:
+                import_tables(db.engine, tables, args.directory, args.chunk_size, args.restart)
+        except Exception as e:
+            print(f"❌ {args.command.title()} failed: {e}")
+            sys.exit(1)